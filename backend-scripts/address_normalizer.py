@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Canonical street addresses for matching sales to parcels
+
+clean_address() only upper-cases and collapses whitespace, so '1234 W Grand
+Blvd.', '1234 WEST GRAND BOULEVARD' and '1234 W GRAND BLVD APT 2' are three
+different strings. The canonicalizer splits an address into parts and
+writes each one in its USPS abbreviation:
+
+    number       1234         (first number of a range like 1234-1240)
+    number_high  1240         (last number of a range, else None)
+    predir       W            (NORTH -> N, SOUTHWEST -> SW, ...)
+    name         GRAND
+    suffix       BLVD         (BOULEVARD/BOUL/BLV -> BLVD, STREET -> ST, ...)
+    postdir      None
+    unit         2            (APT 2, UNIT 2, STE 2, # 2 -> 2)
+    street       W GRAND BLVD (predir + name + suffix + postdir)
+    canonical    1234 W GRAND BLVD
+
+A directional or suffix word that is the whole street name ('123 WEST ST',
+'45 PARK') is kept as the name.
+
+Column functions work on the distinct values only, like the sales_transform
+helpers, so a 100k-row column with repeated addresses parses in well under
+a second.
+
+Usage (run from backend-scripts/):
+
+    python3 address_normalizer.py       # check the EXAMPLES below
+
+    from address_normalizer import canonical_addresses, parse_addresses
+    parts = parse_addresses(df['Street Address'])   # DataFrame of the parts
+    keys = canonical_addresses(df['Street Address'])
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# USPS Publication 28 abbreviations for the suffixes seen in Detroit data
+STREET_SUFFIXES = {
+    'ALLEY': 'ALY', 'ALY': 'ALY',
+    'AVENUE': 'AVE', 'AVE': 'AVE', 'AV': 'AVE', 'AVN': 'AVE', 'AVNUE': 'AVE',
+    'BOULEVARD': 'BLVD', 'BLVD': 'BLVD', 'BOUL': 'BLVD', 'BLV': 'BLVD',
+    'CIRCLE': 'CIR', 'CIR': 'CIR', 'CIRC': 'CIR',
+    'COURT': 'CT', 'CT': 'CT', 'CRT': 'CT',
+    'COVE': 'CV', 'CV': 'CV',
+    'CRESCENT': 'CRES', 'CRES': 'CRES',
+    'DRIVE': 'DR', 'DR': 'DR', 'DRV': 'DR',
+    'EXPRESSWAY': 'EXPY', 'EXPY': 'EXPY',
+    'FREEWAY': 'FWY', 'FWY': 'FWY',
+    'HIGHWAY': 'HWY', 'HWY': 'HWY',
+    'LANE': 'LN', 'LN': 'LN',
+    'PARKWAY': 'PKWY', 'PKWY': 'PKWY', 'PKY': 'PKWY',
+    'PLACE': 'PL', 'PL': 'PL',
+    'PLAZA': 'PLZ', 'PLZ': 'PLZ',
+    'ROAD': 'RD', 'RD': 'RD',
+    'SQUARE': 'SQ', 'SQ': 'SQ',
+    'STREET': 'ST', 'ST': 'ST', 'STR': 'ST',
+    'TERRACE': 'TER', 'TER': 'TER', 'TERR': 'TER',
+    'TRAIL': 'TRL', 'TRL': 'TRL',
+    'WAY': 'WAY',
+}
+
+DIRECTIONALS = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+    'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W', 'NE': 'NE', 'NW': 'NW', 'SE': 'SE', 'SW': 'SW',
+}
+
+PARTS = ('number', 'number_high', 'predir', 'name', 'suffix', 'postdir', 'unit', 'street', 'canonical')
+
+_NUMBER = re.compile(r'^(\d+[A-Z]?)(?:\s*-\s*(\d+[A-Z]?))?\s+(.*)$')
+# A unit keyword is a whole word ('LOTHROP' and 'FLORIDA' are streets, not
+# LOT HROP / FL ORIDA); only '#' may run straight into the unit
+_UNIT = re.compile(
+    r'^(.*?)\s+(?:(?:(?:APT|APARTMENT|UNIT|STE|SUITE|RM|ROOM|FL|FLOOR|BLDG|BUILDING|LOT|SPC|SPACE)\s+|#)'
+    r'\s*#?\s*([A-Z0-9-]+)|(LOWER|LOWR|UPPER|UPPR|REAR|FRONT|FRNT))$'
+)
+_UNIT_WORDS = {'LOWER': 'LOWR', 'UPPER': 'UPPR', 'FRONT': 'FRNT'}
+_PUNCTUATION = re.compile(r'[.,;]')
+
+
+def parse_address(address):
+    """Canonical parts of one address as a dict (all None for blanks)"""
+    parts = dict.fromkeys(PARTS)
+    if address is None or (not isinstance(address, str) and pd.isna(address)):
+        return parts
+    text = ' '.join(_PUNCTUATION.sub(' ', str(address).upper()).replace('#', ' # ').split())
+    if not text:
+        return parts
+
+    match = _NUMBER.match(text)
+    if match:
+        parts['number'] = match.group(1)
+        parts['number_high'] = match.group(2)
+        text = match.group(3)
+
+    match = _UNIT.match(text)
+    if match:
+        text = match.group(1)
+        unit = match.group(2) or match.group(3)
+        parts['unit'] = _UNIT_WORDS.get(unit, unit)
+
+    tokens = text.split()
+    # Peel directionals and the suffix off the ends, but always leave at
+    # least one word for the name
+    if len(tokens) > 1 and tokens[0] in DIRECTIONALS and not (
+            len(tokens) == 2 and tokens[1] in STREET_SUFFIXES):
+        parts['predir'] = DIRECTIONALS[tokens.pop(0)]
+    if len(tokens) > 2 and tokens[-1] in DIRECTIONALS and tokens[-2] in STREET_SUFFIXES:
+        parts['postdir'] = DIRECTIONALS[tokens.pop()]
+    if len(tokens) > 1 and tokens[-1] in STREET_SUFFIXES:
+        parts['suffix'] = STREET_SUFFIXES[tokens.pop()]
+    parts['name'] = ' '.join(tokens) or None
+
+    street = [parts[key] for key in ('predir', 'name', 'suffix', 'postdir') if parts[key]]
+    parts['street'] = ' '.join(street) or None
+    canonical = [parts['number']] if parts['number'] else []
+    canonical += street
+    parts['canonical'] = ' '.join(canonical) or None
+    return parts
+
+def canonical_address(address):
+    """'1234 West Grand Boulevard, Apt 2' -> '1234 W GRAND BLVD'"""
+    return parse_address(address)['canonical']
+
+def parse_addresses(values):
+    """parse_address() over a column; DataFrame with one column per part,
+    positionally aligned with values"""
+    series = values.reset_index(drop=True) if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = pd.DataFrame([parse_address(value) for value in uniques], columns=list(PARTS), dtype=object)
+    # Missing values get code -1; append an all-None row for them
+    parsed = pd.concat([parsed, pd.DataFrame([dict.fromkeys(PARTS)], dtype=object)], ignore_index=True)
+    codes = np.where(codes < 0, len(uniques), codes)
+    return parsed.iloc[codes].reset_index(drop=True)
+
+def canonical_addresses(values):
+    """canonical_address() over a column, as an object array"""
+    return parse_addresses(values)['canonical'].to_numpy(dtype=object)
+
+
+# address -> canonical form; Detroit streets whose names start like a unit
+# keyword (LOT, FL, STE, UNIT, RM) must keep their whole name
+EXAMPLES = {
+    '1234 West Grand Boulevard, Apt 2': '1234 W GRAND BLVD',
+    '1234 W LOTHROP': '1234 W LOTHROP',
+    '1234 W LOTHROP ST': '1234 W LOTHROP ST',
+    '5678 FLORIDA ST': '5678 FLORIDA ST',
+    '5678 FLEMING': '5678 FLEMING',
+    '910 FLANDERS ST UNIT 4': '910 FLANDERS ST',
+    '2000 STEEL ST': '2000 STEEL ST',
+    '3030 UNITY ST': '3030 UNITY ST',
+    '77 RUSSELL ST STE 300': '77 RUSSELL ST',
+    '1500 WOODWARD AVE #12B': '1500 WOODWARD AVE',
+    '1500 WOODWARD AVE APT #12B': '1500 WOODWARD AVE',
+    '45 ROSA PARKS BLVD LOT 9': '45 ROSA PARKS BLVD',
+    '1200-1210 MAIN ST UPPER': '1200 MAIN ST',
+}
+
+
+def main():
+    failed = [(address, expected, canonical_address(address)) for address, expected in EXAMPLES.items()
+              if canonical_address(address) != expected]
+    for address, expected, got in failed:
+        print(f"  {address!r}: expected {expected!r}, got {got!r}")
+    print(f"{len(EXAMPLES) - len(failed)} of {len(EXAMPLES)} examples canonicalize as expected")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Concurrent, adaptive-rate batch uploader for the sales importers
+
+The importers used to send one insert at a time followed by a fixed
+time.sleep(), so a full import was bound by round-trip latency. BatchUploader
+keeps several batches in flight on a thread pool and paces requests with an
+AIMD (additive-increase, multiplicative-decrease) rate controller: every
+successful call nudges the request rate up, and a 429/5xx or network error
+cuts it in half, like TCP congestion control.
+
+A batch that fails on its data (a constraint violation, a bad value) with
+bisect on is split in half and each half sent again, recursively, until the
+rows the server rejects are alone: the good rows still commit, and each bad
+row goes to a DeadLetterFile with the server's error. One bad row in a
+500-row batch costs about 2 * log2(500) = 18 extra requests.
+
+Usage (run from backend-scripts/):
+
+    from batch_uploader import BatchUploader
+
+    def send(records):
+        supabase.table('sales_transactions').insert(records).execute()
+
+    uploader = BatchUploader(send, max_in_flight=4)
+    for result in uploader.upload((offset, records) for offset, records in batches):
+        if not result.ok:
+            print(f"Batch error: {str(result.error)[:100]}")
+    print(uploader.stats.summary())
+
+    uploader = BatchUploader(send, bisect=True, dead_letter=DeadLetterFile('rejected.jsonl'))
+"""
+
+import collections
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from import_metrics import ImportMetrics
+
+# PostgreSQL errors that mean "try again later" rather than "bad data"
+RETRYABLE_PG_CODES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+    '53300',  # too_many_connections
+    '57014',  # query_canceled (statement timeout)
+    '57P01',  # admin_shutdown
+}
+
+DEAD_LETTER_FILE = 'upload-dead-letter.jsonl'
+
+_RETRYABLE_MESSAGES = ('Too Many Requests', 'rate limit', 'Service Unavailable',
+                       'Bad Gateway', 'Gateway Timeout')
+
+
+def status_of(exc):
+    """Best-effort HTTP status for an exception raised by a send function"""
+    for candidate in (getattr(exc, 'status_code', None),
+                      getattr(getattr(exc, 'response', None), 'status_code', None),
+                      getattr(exc, 'code', None)):
+        try:
+            if candidate is not None and 100 <= int(candidate) <= 599:
+                return int(candidate)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def is_retryable(exc):
+    """True for throttling, server-side and network errors; False for data errors"""
+    status = status_of(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if str(getattr(exc, 'code', '') or '') in RETRYABLE_PG_CODES:
+        return True
+    # httpx / urllib / socket failures (timeouts, resets, DNS) never reached
+    # the database, so they are safe to retry
+    name = type(exc).__name__
+    if any(word in name for word in ('Timeout', 'Connect', 'Network', 'Protocol', 'Remote')):
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    message = str(exc)
+    return any(text in message for text in _RETRYABLE_MESSAGES)
+
+def retry_after_of(exc):
+    """Seconds from a Retry-After header on the exception's response, if any"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def error_fields(exc):
+    """Status, code, message, details and hint of a failed request (the
+    PostgREST error body when the exception carries one)"""
+    fields = {'status': status_of(exc)}
+    for name in ('code', 'message', 'details', 'hint'):
+        value = getattr(exc, name, None)
+        fields[name] = None if value is None else str(value)
+    if fields['message'] is None:
+        fields['message'] = str(exc) or type(exc).__name__
+    return fields
+
+
+class AIMDRateController:
+    """Paces requests at an adaptive rate (requests/sec).
+
+    on_success() adds `increase` req/s per call; on_throttle() multiplies the
+    rate by `decrease`. Failures from requests sent before the last cut are
+    ignored so a burst of in-flight 429s only halves the rate once.
+    """
+
+    def __init__(self, initial_rate=10.0, min_rate=0.5, max_rate=200.0,
+                 increase=0.5, decrease=0.5):
+        self.rate = float(initial_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.throttle_events = 0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+        self._last_cut = 0.0
+        self._paused_until = 0.0
+
+    def acquire(self):
+        """Block until the next send slot; returns the send timestamp"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + 1.0 / self.rate
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return slot
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, sent_at, retry_after=None):
+        with self._lock:
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            if sent_at < self._last_cut:
+                return
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_cut = time.monotonic()
+            self.throttle_events += 1
+
+
+class BatchResult:
+    """Outcome of one batch: key is whatever the caller passed with it.
+
+    ok means every record landed. After a bisected failure, committed holds
+    the records that landed anyway and rejected the (record, error) pairs
+    the server refused on their own; the rest (unsent_rows) failed for
+    other reasons, such as retries running out, and must be sent again.
+    """
+
+    __slots__ = ('key', 'records', 'ok', 'error', 'attempts', 'seconds', 'committed', 'rejected')
+
+    def __init__(self, key, records, ok, error=None, attempts=1, seconds=0.0,
+                 committed=None, rejected=()):
+        self.key = key
+        self.records = records
+        self.ok = ok
+        self.error = error
+        self.attempts = attempts
+        self.seconds = seconds
+        self.committed = committed if committed is not None else (records if ok else [])
+        self.rejected = list(rejected)
+
+    @property
+    def rows(self):
+        return len(self.records)
+
+    @property
+    def failed_rows(self):
+        return len(self.records) - len(self.committed)
+
+    @property
+    def unsent_rows(self):
+        return len(self.records) - len(self.committed) - len(self.rejected)
+
+
+class DeadLetterFile:
+    """Rows the server rejected, each with its error.
+
+    JSON lines ({"time", "status", "code", "message", "details", "hint",
+    "record"}) are appended as rows arrive. A path ending in .csv gets one
+    row per record with error_* columns first; as records can differ in
+    their keys, CSV rows are held until close() and merged into any
+    existing file under the union of the columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.csv = path.lower().endswith('.csv')
+        self._pending = []
+        self._file = None
+
+    def write(self, record, error):
+        entry = {'time': datetime.now().isoformat(timespec='seconds'), **error_fields(error)}
+        self.rows += 1
+        if self.csv:
+            self._pending.append((entry, record))
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        entry['record'] = record
+        self._file.write(json.dumps(entry, default=str) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._pending:
+            self._write_csv()
+
+    def _write_csv(self):
+        rows = [{**{f"error_{name}": value for name, value in entry.items() if name != 'time'},
+                 'time': entry['time'], **record} for entry, record in self._pending]
+        self._pending = []
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, newline='') as f:
+                rows = list(csv.DictReader(f)) + rows
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+class UploadStats:
+    """Running totals for an upload; rows_per_sec is the achieved throughput"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+        self.bisected = 0
+        self.retries = 0
+        self.throttled = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.batches += 1
+            self.busy_seconds += result.seconds
+            self.rows += len(result.committed)
+            if not result.ok:
+                self.failed_batches += 1
+                self.failed_rows += result.failed_rows
+                self.rejected_rows += len(result.rejected)
+
+    def record_throttle(self):
+        """A retryable failure that will be retried"""
+        with self._lock:
+            self.throttled += 1
+            self.retries += 1
+
+    def record_bisect(self):
+        with self._lock:
+            self.bisected += 1
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_sec(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        line = (f"Uploaded {self.rows:,} rows in {self.batches:,} batches "
+                f"({self.elapsed:.1f}s, {self.rows_per_sec:,.0f} rows/sec) | "
+                f"failed batches: {self.failed_batches} | retries: {self.retries} | "
+                f"throttled: {self.throttled}")
+        if self.bisected:
+            line += f" | split: {self.bisected} | rejected rows: {self.rejected_rows:,}"
+        return line
+
+
+class BatchUploader:
+    """Upload batches with up to max_in_flight concurrent requests.
+
+    send(records) performs one request and raises on failure. Retryable
+    failures (see is_retryable) back the controller off and are retried up to
+    max_retries times; other failures are returned as not-ok results, or
+    with bisect=True split until the rejected rows are isolated (see the
+    module docstring) and written to dead_letter, a DeadLetterFile.
+    Per-attempt timings, retries and the in-flight window go to `metrics`
+    (an ImportMetrics, see import_metrics.py).
+    """
+
+    def __init__(self, send, max_in_flight=4, controller=None, max_retries=5, metrics=None,
+                 bisect=False, dead_letter=None):
+        self.send = send
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.controller = controller or AIMDRateController()
+        self.max_retries = max_retries
+        self.stats = UploadStats()
+        self.metrics = metrics if metrics is not None else ImportMetrics()
+        self.bisect = bisect
+        self.dead_letter = dead_letter
+
+    def _send_batch(self, key, records):
+        if not records:
+            # Nothing to send; keeps the caller's batch sequence intact
+            return BatchResult(key, records, True, attempts=0)
+        started = time.monotonic()
+        error, attempts = self._attempt(records)
+        if error is None:
+            return BatchResult(key, records, True, None, attempts, time.monotonic() - started)
+        if not self.bisect or is_retryable(error):
+            return BatchResult(key, records, False, error, attempts, time.monotonic() - started)
+        committed, rejected = [], []
+        attempts += self._isolate(records, error, committed, rejected)
+        return BatchResult(key, records, len(committed) == len(records), error, attempts,
+                           time.monotonic() - started, committed, rejected)
+
+    def _isolate(self, records, error, committed, rejected):
+        """Send the halves of a batch that failed on its data, recursing into
+        halves that fail the same way; returns the requests made. Rows
+        that fail alone go to rejected, rows in halves that fail for any
+        other reason are left out of both lists."""
+        if is_retryable(error):
+            return 0
+        if len(records) == 1:
+            rejected.append((records[0], error))
+            return 0
+        self.stats.record_bisect()
+        self.metrics.count('bisected_batches')
+        middle = len(records) // 2
+        attempts = 0
+        for half in (records[:middle], records[middle:]):
+            half_error, half_attempts = self._attempt(half)
+            attempts += half_attempts
+            if half_error is None:
+                committed.extend(half)
+            else:
+                attempts += self._isolate(half, half_error, committed, rejected)
+        return attempts
+
+    def _attempt(self, records):
+        """Send records, retrying retryable failures; (error or None, attempts)"""
+        attempts = 0
+        while True:
+            attempts += 1
+            sent_at = self.controller.acquire()
+            self.metrics.attempt_started()
+            attempt_started = time.perf_counter()
+            try:
+                self.send(records)
+            except Exception as e:
+                self.metrics.observe('request', time.perf_counter() - attempt_started)
+                self.metrics.count('errors', kind=status_of(e) or type(e).__name__)
+                if attempts <= self.max_retries and is_retryable(e):
+                    self.stats.record_throttle()
+                    self.metrics.count('retries')
+                    self.controller.on_throttle(sent_at, retry_after_of(e))
+                    continue
+                return e, attempts
+            self.metrics.observe('request', time.perf_counter() - attempt_started)
+            self.controller.on_success()
+            return None, attempts
+
+    def upload(self, batches):
+        """Upload an iterable of (key, records); yields BatchResults in input order.
+
+        At most 2 * max_in_flight batches are held in memory at once, so a
+        slow server applies back-pressure to the reader.
+        """
+        window = collections.deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                for key, records in batches:
+                    window.append(pool.submit(self._send_batch, key, records))
+                    self.metrics.gauge('upload_window', len(window))
+                    if len(window) >= 2 * self.max_in_flight:
+                        yield self._finish(window.popleft())
+                while window:
+                    yield self._finish(window.popleft())
+        finally:
+            if self.dead_letter is not None:
+                self.dead_letter.close()
+
+    def _finish(self, future):
+        result = future.result()
+        self.stats.record(result)
+        if result.attempts:
+            self.metrics.observe('batch', result.seconds)
+            self.metrics.observe_size('batch_records', result.rows)
+            self.metrics.count('batches')
+            self.metrics.count('records', len(result.committed))
+            if not result.ok:
+                self.metrics.count('failed_batches')
+                self.metrics.count('failed_records', result.failed_rows)
+        if result.rejected:
+            self.metrics.count('rejected_records', len(result.rejected))
+            if self.dead_letter is not None:
+                for record, error in result.rejected:
+                    self.dead_letter.write(record, error)
+        return result
+
+
+def add_upload_arguments(parser, dead_letter=DEAD_LETTER_FILE):
+    """Add the shared --concurrency/--max-rate/--dead-letter options to an importer's CLI"""
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='batches in flight at once (default: 4)')
+    parser.add_argument('--max-rate', type=float, default=50.0,
+                        help='ceiling for the adaptive request rate, requests/sec (default: 50)')
+    parser.add_argument('--dead-letter', default=dead_letter, metavar='FILE',
+                        help=f'rows the server rejects, with its error; .jsonl or .csv (default: {dead_letter})')
+    parser.add_argument('--no-bisect', action='store_true',
+                        help='count a batch that fails on its data as failed instead of splitting it')
+    return parser
+
+def uploader_from_args(send, args, metrics=None):
+    """BatchUploader configured from add_upload_arguments() options"""
+    controller = AIMDRateController(max_rate=args.max_rate)
+    return BatchUploader(send, max_in_flight=args.concurrency, controller=controller, metrics=metrics,
+                         bisect=not args.no_bisect, dead_letter=DeadLetterFile(args.dead_letter))
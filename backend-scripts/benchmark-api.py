@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Measure API query latency against the local PostgREST stand-in
+
+Fills postgrest_stub.py's store (memory, SQLite or a local Postgres) with a
+generated sales file, then sends the queries the site makes against
+sales_transactions through the supabase Python client and prints latency
+per query shape:
+
+  owner        ilike grantor, newest first, limit 100     (SalesAPI.getSalesByOwner)
+  property     ilike street_address, newest first         (SalesAPI.getSalesByProperty)
+  buyer        ilike grantee, newest first                (getAllTransactionsByPerson)
+  search       ilike grantor, price and date ranges       (SalesAPI.searchSales)
+  either-name  or=(grantor.ilike, grantee.ilike)          (api/market/execute-sql.js)
+  count        count=exact HEAD since a date
+  ids          sales_id=in.(...)
+  page         order=sales_id with a Range, as the paged report reads
+
+Search terms are drawn from the loaded rows with --seed, so runs with the
+same options send the same requests. The postgres backend upserts the
+fixture into the sales_transactions table of --database-url.
+
+Usage (run from backend-scripts/):
+    python3 benchmark-api.py                                    # memory store, 100k rows
+    python3 benchmark-api.py --backend sqlite --rows 200000 --repeat 50
+    python3 benchmark-api.py --backend postgres --database-url "$DATABASE_URL" --max-rows 1000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+
+from supabase import create_client
+
+from postgrest_stub import BACKENDS, load_fixture, open_store, start_stub
+
+# Any well-formed JWT works against the stub
+STUB_KEY = ('eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.'
+            'eyJyb2xlIjoiYW5vbiIsImlzcyI6InN0dWIifQ.'
+            'c3R1Yi1zaWduYXR1cmU')
+
+TABLE = 'sales_transactions'
+
+QUERIES = {
+    'owner': lambda t, p: (t.select('*').ilike('grantor', f"%{p['name']}%")
+                           .order('sale_date', desc=True).limit(100)),
+    'property': lambda t, p: (t.select('*').ilike('street_address', f"%{p['street']}%")
+                              .order('sale_date', desc=True)),
+    'buyer': lambda t, p: (t.select('*').ilike('grantee', f"%{p['name']}%")
+                           .order('sale_date', desc=True)),
+    'search': lambda t, p: (t.select('*').ilike('grantor', f"%{p['name']}%")
+                            .gte('sale_price', 20000).lte('sale_price', 500000)
+                            .gte('sale_date', p['since']).order('sale_date', desc=True).limit(200)),
+    'either-name': lambda t, p: (t.select('*').or_(f"grantor.ilike.*{p['name']}*,grantee.ilike.*{p['name']}*")
+                                 .order('sale_date', desc=True).limit(1000)),
+    'count': lambda t, p: t.select('*', count='exact', head=True).gte('sale_date', p['since']),
+    'ids': lambda t, p: t.select('*').in_('sales_id', p['ids']),
+    'page': lambda t, p: t.select('*').order('sales_id').range(p['offset'], p['offset'] + 999),
+}
+
+
+def sample_parameters(supabase, count, seed):
+    """`count` parameter sets drawn from rows already in the table"""
+    rows = (supabase.table(TABLE).select('sales_id,grantor,grantee,street_name,sale_date')
+            .order('sales_id').limit(5000).execute().data)
+    if not rows:
+        raise SystemExit(f"{TABLE} is empty; nothing to query")
+    rng = random.Random(seed)
+    # First word of each name, without the comma of 'SMITH, JOHN' (which
+    # would split an or=(...) filter)
+    names = [word for row in rows for name in (row['grantor'], row['grantee']) if name
+             for word in name.replace(',', ' ').split()[:1] if len(word) > 2]
+    streets = [row['street_name'] for row in rows if row['street_name']]
+    dates = sorted(row['sale_date'] for row in rows if row['sale_date'])
+    ids = [row['sales_id'] for row in rows]
+    return [{
+        'name': rng.choice(names),
+        'street': rng.choice(streets),
+        'since': rng.choice(dates),
+        'ids': rng.sample(ids, min(50, len(ids))),
+        'offset': rng.randrange(0, max(len(ids) - 1000, 1)),
+    } for _ in range(count)]
+
+
+def run_query(supabase, name, parameters, warmup=2):
+    """Latency figures for one query shape over every parameter set"""
+    query = QUERIES[name]
+    for p in parameters[:warmup]:
+        query(supabase.table(TABLE), p).execute()
+    seconds, rows = [], 0
+    for p in parameters:
+        started = time.perf_counter()
+        response = query(supabase.table(TABLE), p).execute()
+        seconds.append(time.perf_counter() - started)
+        rows += len(response.data or [])
+    seconds.sort()
+    return {
+        'requests': len(seconds),
+        'rows_per_request': round(rows / len(seconds), 1),
+        'p50_ms': round(statistics.median(seconds) * 1000, 2),
+        'p95_ms': round(seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)] * 1000, 2),
+        'mean_ms': round(statistics.fmean(seconds) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API query latency against the local PostgREST stand-in')
+    parser.add_argument('--backend', choices=BACKENDS, default='memory', help='stub store (default: memory)')
+    parser.add_argument('--database', '--database-url', dest='database',
+                        help='SQLite file or Postgres URL for the store')
+    parser.add_argument('--rows', type=int, default=100000, help='fixture rows to load (default: 100000)')
+    parser.add_argument('--seed', type=int, default=42, help='fixture and parameter seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=30, help='requests per query (default: 30)')
+    parser.add_argument('--queries', nargs='+', choices=sorted(QUERIES), default=list(QUERIES),
+                        help='query shapes to run (default: all)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stub latency per request')
+    parser.add_argument('--max-rows', type=int, help='stub row cap per response (db-max-rows)')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.database)
+    started = time.monotonic()
+    stored = load_fixture(store, args.rows, args.seed)
+    print(f"Loaded {stored:,} sales into the {args.backend} store in {time.monotonic() - started:.1f}s")
+
+    server = start_stub(store=store, latency=args.latency_ms / 1000, max_rows=args.max_rows)
+    results = {}
+    try:
+        supabase = create_client(server.url, STUB_KEY)
+        parameters = sample_parameters(supabase, args.repeat, args.seed)
+        print(f"\n{'query':<12} {'rows/req':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+        for name in args.queries:
+            results[name] = figures = run_query(supabase, name, parameters)
+            print(f"{name:<12} {figures['rows_per_request']:>9,.1f} {figures['p50_ms']:>9,.2f} "
+                  f"{figures['p95_ms']:>9,.2f} {figures['mean_ms']:>9,.2f}")
+    finally:
+        server.shutdown()
+        store.close()
+
+    if args.output:
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'database')},
+            'stored': stored,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Time comparable-sales lookups: full scans vs the comps.py grid
+
+Loads a generated sales file and parcels for its parcel numbers into
+postgrest_stub.py's store, builds a market_query.py snapshot from it over
+REST and a CompsEngine on the snapshot, then finds comps for parcels drawn
+from the file three ways:
+
+  scan      distance from the parcel to every indexed sale, then the window
+            and radius filters and a sort: what a query without a spatial
+            index does
+  grid      CompsEngine.nearest(), the cells around the parcel only
+  comps     CompsEngine.comps(): locating the parcel, the grid, and the
+            result frame
+  estimate  CompsEngine.estimate() for every parcel at once, reported per
+            parcel
+
+The grid answers are checked against the scan's (same sales, same order),
+and the estimates against the median price per square foot of the grid
+comps for the sampled parcels.
+
+Usage (run from backend-scripts/):
+    python3 benchmark-comps.py                              # 100k sales
+    python3 benchmark-comps.py --rows 500000 --radius 0.25 --output comps.json
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from supabase import create_client
+
+from comps import COMP_COUNT, RADIUS_MILES, WINDOW_MONTHS, CompsEngine
+from market_query import build_snapshot
+from postgrest_stub import MemoryStore, load_fixture, start_stub
+from sales_fixtures import fixture_csv, synthetic_parcels
+
+# Any well-formed JWT works against the stub
+STUB_KEY = ('eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.'
+            'eyJyb2xlIjoiYW5vbiIsImlzcyI6InN0dWIifQ.'
+            'c3R1Yi1zaWduYXR1cmU')
+
+
+def scan_comps(engine, where, radius, count, window):
+    """Positions of the comps, nearest first, from every indexed sale"""
+    (x, y, key), (first, last) = where, window
+    distance = np.hypot(engine.x - x, engine.y - y)
+    keep = np.flatnonzero((distance <= radius) & (engine.day >= first) & (engine.day <= last)
+                          & (engine.key != key))
+    return keep[np.lexsort((keep, distance[keep]))][:count]
+
+def time_lookups(lookup, subjects):
+    seconds = []
+    for subject in subjects:
+        started = time.perf_counter()
+        lookup(subject)
+        seconds.append(time.perf_counter() - started)
+    seconds.sort()
+    return {
+        'requests': len(seconds),
+        'p50_ms': round(statistics.median(seconds) * 1000, 3),
+        'p95_ms': round(seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)] * 1000, 3),
+        'mean_ms': round(statistics.fmean(seconds) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparable sales: full scans vs the comps.py grid')
+    parser.add_argument('--rows', type=int, default=100000, help='fixture rows to load (default: 100000)')
+    parser.add_argument('--seed', type=int, default=42, help='fixture and sample seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=200, help='parcels looked up (default: 200)')
+    parser.add_argument('--radius', type=float, default=RADIUS_MILES, help=f'miles (default: {RADIUS_MILES})')
+    parser.add_argument('--count', type=int, default=COMP_COUNT, help=f'comps per parcel (default: {COMP_COUNT})')
+    parser.add_argument('--months', type=int, default=WINDOW_MONTHS, help=f'sale window (default: {WINDOW_MONTHS})')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    store = MemoryStore()
+    started = time.monotonic()
+    stored = load_fixture(store, args.rows, args.seed)
+    store.insert('parcels', synthetic_parcels(fixture_csv(args.rows, args.seed), args.seed))
+    print(f"Loaded {stored:,} sales and {store.count('parcels'):,} parcels in {time.monotonic() - started:.1f}s")
+
+    server = start_stub(store=store)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            build_snapshot(create_client(server.url, STUB_KEY), directory)
+            engine = CompsEngine.from_snapshot(directory)
+    finally:
+        server.shutdown()
+    print(f"Indexed {len(engine.sales):,} arm's-length sales in {engine.build_seconds:.2f}s")
+
+    options = dict(radius=args.radius, count=args.count, months=args.months)
+    rng = np.random.default_rng(args.seed)
+    parcels = [str(key) for key in rng.choice(engine.locations.index.to_numpy(), args.repeat, replace=False)]
+
+    window = engine.window(args.months)
+    located = [engine.locate(parcel) for parcel in parcels]
+    mismatched = sum(
+        not np.array_equal(engine.comps(parcel=parcel, **options)['sales_id'].to_numpy(),
+                           engine.sales['sales_id'].to_numpy()[scan_comps(engine, where, args.radius,
+                                                                          args.count, window)])
+        for parcel, where in zip(parcels, located))
+    results = {
+        'scan': time_lookups(lambda where: scan_comps(engine, where, args.radius, args.count, window), located),
+        'grid': time_lookups(lambda where: engine.nearest(*where, args.radius, args.count, *window), located),
+        'comps': time_lookups(lambda parcel: engine.comps(parcel=parcel, **options), parcels),
+    }
+
+    started = time.perf_counter()
+    estimates = engine.estimate(**options)
+    elapsed = time.perf_counter() - started
+    results['estimate'] = {
+        'parcels': len(estimates),
+        'priced': int(estimates['median_ppsf'].notna().sum()),
+        'seconds': round(elapsed, 2),
+        'mean_ms': round(elapsed * 1000 / max(len(estimates), 1), 4),
+    }
+    by_key = estimates.set_index(engine.subjects()['key'])['median_ppsf']
+    differ = 0
+    for parcel in parcels:
+        comps = engine.comps(parcel=parcel, **options)
+        expected = round(float(comps['price_per_sqft'].dropna().median()), 2) if comps['floor_area'].notna().any() \
+            else float('nan')
+        actual = by_key.get(parcel, float('nan'))
+        differ += not (np.isclose(expected, actual, atol=0.011) or (np.isnan(expected) and np.isnan(actual)))
+
+    print(f"\n{'method':<10} {'lookups':>8} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for method in ('scan', 'grid', 'comps'):
+        figures = results[method]
+        print(f"{method:<10} {figures['requests']:>8,} {figures['p50_ms']:>9,.3f} {figures['p95_ms']:>9,.3f} "
+              f"{figures['mean_ms']:>9,.3f}")
+    figures = results['estimate']
+    print(f"{'estimate':<10} {figures['parcels']:>8,} {'':>9} {'':>9} {figures['mean_ms']:>9,.4f}"
+          f"   ({figures['seconds']:.2f}s, {figures['priced']:,} priced)")
+    print(f"\nGrid vs scan: {mismatched} of {len(parcels)} parcels differ; "
+          f"estimate vs grid median: {differ} differ")
+
+    if args.output:
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'stored': stored,
+            'indexed': len(engine.sales),
+            'mismatched': mismatched,
+            'estimate_mismatched': differ,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
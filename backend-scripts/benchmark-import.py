@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sales import stage by stage on synthetic Detroit sales files
+
+Generates (and caches, see sales_fixtures.fixture_csv) realistic files in
+the export's layout at each size, then runs one import pass per file with
+the stages timed separately rather than overlapped:
+
+  read       CsvChunkReader chunks (--engine, --compact)
+  transform  the mapping profile's prepare() and transform() (sales_profiles.py)
+  serialize  record dicts for each batch and the JSON request bodies
+  upload     the bodies POSTed to the local PostgREST stub (discarding the
+             rows) by BatchUploader with --concurrency requests in flight
+
+Rows/sec for read and transform count the file's rows, serialize and upload
+count the records sent. Results go to a JSON file with the git revision
+and library versions; --baseline compares against an earlier run and exits
+with status 1 if a stage got slower than --tolerance allows.
+
+Usage (run from backend-scripts/):
+    python3 benchmark-import.py                              # 10k, 100k and 1M rows
+    python3 benchmark-import.py --rows 100000 --profile existing --compact
+    python3 benchmark-import.py --baseline benchmark-import.json --output new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from batch_uploader import AIMDRateController, BatchUploader
+from csv_reader import ENGINES, CsvChunkReader
+from import_pipeline import transform_chunk
+from postgrest_stub import start_stub
+from sales_dtypes import COMPACT_PLAN
+from sales_fixtures import fixture_csv
+from sales_profiles import PROFILES
+from sales_transform import iter_kept_batches
+
+STAGES = ('read', 'transform', 'serialize', 'upload')
+OUTPUT_FILE = 'benchmark-import.json'
+
+
+def _version():
+    """Git revision and library versions, so results can be told apart"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        revision += '-dirty' if dirty else ''
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    versions = {'git': revision, 'python': platform.python_version(),
+                'pandas': pd.__version__, 'numpy': np.__version__}
+    try:
+        import pyarrow
+        versions['pyarrow'] = pyarrow.__version__
+    except ImportError:
+        pass
+    return versions
+
+
+def run_size(rows, args, server, profile):
+    """One timed import pass over a `rows`-row fixture; returns its result dict"""
+    path = fixture_csv(rows, args.seed)
+    timings = dict.fromkeys(STAGES, 0.0)
+    records = batches = body_bytes = 0
+
+    client = httpx.Client(base_url=f"{server.url}/rest/v1", timeout=60,
+                          headers={'Content-Type': 'application/json', 'Prefer': 'return=minimal'})
+    send = lambda body: client.post(f"/{profile.table}", content=body).raise_for_status()
+    # Paced only by the stub's answers, so the stage measures transport and server
+    uploader = BatchUploader(send, max_in_flight=args.concurrency,
+                             controller=AIMDRateController(initial_rate=1e9, max_rate=1e9))
+
+    reader = CsvChunkReader(path, args.chunk_size, args.engine, profile.dtype,
+                            plan=COMPACT_PLAN if args.compact else None)
+    chunks = iter(reader)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        timings['read'] += time.perf_counter() - started
+        if chunk is None:
+            break
+
+        started = time.perf_counter()
+        transformed = transform_chunk(profile.transform, profile.prepare(chunk))
+        timings['transform'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        bodies = []
+        for _, batch in iter_kept_batches(transformed.columns, transformed.positions, transformed.rows,
+                                          args.batch_size, transformed.omit_none):
+            if batch:
+                records += len(batch)
+                bodies.append(json.dumps(batch).encode())
+        timings['serialize'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        for result in uploader.upload(enumerate(bodies)):
+            if not result.ok:
+                raise RuntimeError(f"upload failed: {result.error}")
+            batches += 1
+            body_bytes += len(result.records)
+        timings['upload'] += time.perf_counter() - started
+    client.close()
+
+    counts = {'read': rows, 'transform': rows, 'serialize': records, 'upload': records}
+    stages = {stage: {'seconds': round(seconds, 4),
+                      'rows_per_sec': round(counts[stage] / seconds) if seconds > 0 else None}
+              for stage, seconds in timings.items()}
+    total = sum(timings.values())
+    return {
+        'rows': rows,
+        'file_mb': round(os.path.getsize(path) / 1e6, 1),
+        'records': records,
+        'batches': batches,
+        'body_mb': round(body_bytes / 1e6, 1),
+        'stages': stages,
+        'total': {'seconds': round(total, 4), 'rows_per_sec': round(rows / total) if total else None},
+    }
+
+
+def print_result(result):
+    print(f"\n{result['rows']:,} rows ({result['file_mb']} MB file, {result['records']:,} records "
+          f"in {result['batches']:,} batches, {result['body_mb']} MB of JSON)")
+    for stage in STAGES + ('total',):
+        figures = result['stages'][stage] if stage in result['stages'] else result['total']
+        rate = figures['rows_per_sec']
+        print(f"  {stage:<10} {rate or 0:>12,} rows/sec  ({figures['seconds']:.2f}s)")
+
+
+def compare(results, baseline, tolerance):
+    """Print rows/sec against the baseline run; returns the regressions"""
+    previous = {result['rows']: result for result in baseline['results']}
+    regressions = []
+    print(f"\nAgainst {baseline['version'].get('git')} ({baseline['generated']}):")
+    for result in results:
+        before = previous.get(result['rows'])
+        if before is None:
+            continue
+        for stage in STAGES:
+            old = before['stages'][stage]['rows_per_sec']
+            new = result['stages'][stage]['rows_per_sec']
+            if not old or not new:
+                continue
+            change = new / old - 1
+            flag = ''
+            if change < -tolerance:
+                flag = '  REGRESSION'
+                regressions.append((result['rows'], stage, change))
+            print(f"  {result['rows']:>9,} {stage:<10} {old:>12,} -> {new:>12,} rows/sec ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage-by-stage benchmark of the sales import')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='fixture sizes (default: 10000 100000 1000000)')
+    parser.add_argument('--seed', type=int, default=42, help='fixture seed (default: 42)')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='updated',
+                        help='mapping profile (default: updated)')
+    parser.add_argument('--engine', choices=ENGINES, default='pandas', help='CSV engine (default: pandas)')
+    parser.add_argument('--compact', action='store_true', help='read with the compact dtype plan')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per chunk (default: 10000)')
+    parser.add_argument('--batch-size', type=int, default=500, help='records per request (default: 500)')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight (default: 4)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stub latency per request')
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f'results JSON (default: {OUTPUT_FILE})')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='slowdown per stage allowed against --baseline (default: 0.1)')
+    args = parser.parse_args()
+
+    profile = PROFILES[args.profile]
+    if profile.custom_transform is not None:
+        parser.error(f"profile {profile.name} reads a workbook; pick a CSV profile")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    server = start_stub(latency=args.latency_ms / 1000, discard=True)
+    results = []
+    try:
+        for rows in args.rows:
+            started = time.monotonic()
+            fixture_csv(rows, args.seed)
+            generated = time.monotonic() - started
+            if generated > 1:
+                print(f"Generated the {rows:,}-row fixture in {generated:.1f}s")
+            results.append(run_size(rows, args, server, profile))
+            print_result(results[-1])
+    finally:
+        server.shutdown()
+
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'version': _version(),
+        'machine': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('rows', 'output', 'baseline', 'tolerance')},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Compare the market SQL page's queries: DuckDB snapshot vs execute-sql.js
+
+Loads a generated sales file (and a parcels table for its parcel numbers)
+into postgrest_stub.py's store, builds a market_query.py snapshot from it
+over REST, then runs the kind of SQL generate-sql.js writes two ways:
+
+  duckdb      MarketQueryEngine.execute(), the query as written
+  rest        the supabase-py calls api/market/execute-sql.js turns the same
+              SQL into, against the stub (names in the updated layout,
+              grantor/grantee, which is what the table has)
+
+and prints latency per query, with what the handler does with it:
+
+  same        the handler sends the whole query
+  dropped     part of the query is not sent (EXTRACT, CURRENT_DATE, ...), so
+              the REST rows are not the answer; timed anyway
+  error       the handler or PostgREST rejects it (GROUP BY, parcels.<column>
+              filters, JOINs, subqueries); only DuckDB is timed
+
+Usage (run from backend-scripts/):
+    python3 benchmark-market-sql.py                         # 100k sales
+    python3 benchmark-market-sql.py --rows 500000 --repeat 20 --latency-ms 40
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from supabase import create_client
+
+from market_query import MarketQueryEngine, build_snapshot
+from postgrest_stub import MemoryStore, load_fixture, start_stub
+from sales_fixtures import fixture_csv, synthetic_parcels
+
+# Any well-formed JWT works against the stub
+STUB_KEY = ('eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.'
+            'eyJyb2xlIjoiYW5vbiIsImlzcyI6InN0dWIifQ.'
+            'c3R1Yi1zaWduYXR1cmU')
+
+TABLE = 'sales_transactions'
+
+# name: (SQL, what execute-sql.js does with it, its supabase-py calls)
+QUERIES = {
+    'buyer': ("SELECT * FROM sales_transactions WHERE (buyer_name ILIKE '%SMITH%' OR buyer_name ILIKE '%MARY%') "
+              "ORDER BY sale_date DESC LIMIT 100", 'same',
+              lambda t: t.select('*').or_('grantee.ilike.*SMITH*,grantee.ilike.*MARY*')
+              .order('sale_date', desc=True).limit(100)),
+    'seller': ("SELECT * FROM sales_transactions WHERE (seller_name ILIKE '%JONES%' OR seller_name ILIKE '%LINDA%') "
+               "ORDER BY sale_date DESC LIMIT 100", 'same',
+               lambda t: t.select('*').or_('grantor.ilike.*JONES*,grantor.ilike.*LINDA*')
+               .order('sale_date', desc=True).limit(100)),
+    'terms-price': ("SELECT * FROM sales_transactions WHERE sale_terms ILIKE '%arms length%' AND sale_price > 100000 "
+                    "ORDER BY sale_date DESC LIMIT 100", 'same',
+                    lambda t: t.select('*').ilike('terms_of_sale', '%arms length%').gt('sale_price', 100000)
+                    .order('sale_date', desc=True).limit(100)),
+    'year': ("SELECT * FROM sales_transactions WHERE EXTRACT(YEAR FROM sale_date) = 2023 "
+             "ORDER BY sale_date DESC LIMIT 100", 'dropped',
+             lambda t: t.select('*').order('sale_date', desc=True).limit(100)),
+    'recent': ("SELECT * FROM sales_transactions WHERE sale_date >= CURRENT_DATE - INTERVAL '365 days' "
+               "ORDER BY sale_date DESC LIMIT 100", 'dropped',
+               lambda t: t.select('*').order('sale_date', desc=True).limit(100)),
+    'assessed': ("SELECT *, parcels.assessed_value FROM sales_transactions WHERE parcels.assessed_value > 500000 "
+                 "ORDER BY parcels.assessed_value DESC LIMIT 100", 'error', None),
+    'neighborhood': ("SELECT *, parcels.neighborhood FROM sales_transactions "
+                     "WHERE parcels.neighborhood ILIKE '%1%' ORDER BY sale_date DESC LIMIT 100", 'error', None),
+    'top-buyers-2024': ("SELECT buyer_name, COUNT(*) as purchase_count FROM sales_transactions "
+                        "WHERE EXTRACT(YEAR FROM sale_date) = 2024 AND buyer_name IS NOT NULL "
+                        "GROUP BY buyer_name ORDER BY purchase_count DESC LIMIT 100", 'error', None),
+    'top-spenders': ("SELECT buyer_name, SUM(sale_price) as total_spent, COUNT(*) as property_count "
+                     "FROM sales_transactions WHERE buyer_name IS NOT NULL GROUP BY buyer_name "
+                     "ORDER BY total_spent DESC LIMIT 100", 'error', None),
+    'join': ("SELECT p.neighborhood, COUNT(*) AS sales, median(s.sale_price) AS median_price "
+             "FROM sales_transactions s JOIN parcels p ON p.parcel_id = s.parcels.parcel_id "
+             "WHERE s.sale_price > 1000 GROUP BY 1 ORDER BY sales DESC LIMIT 100", 'error', None),
+    'subquery': ("SELECT grantee, n FROM (SELECT grantee, COUNT(*) AS n FROM sales_transactions "
+                 "WHERE grantee IS NOT NULL GROUP BY grantee) WHERE n >= 5 ORDER BY n DESC LIMIT 100",
+                 'error', None),
+}
+
+
+def _figures(seconds, rows):
+    seconds = sorted(seconds)
+    return {
+        'requests': len(seconds),
+        'rows': rows,
+        'p50_ms': round(statistics.median(seconds) * 1000, 2),
+        'p95_ms': round(seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)] * 1000, 2),
+    }
+
+def time_duckdb(engine, sql, repeat, warmup=2):
+    for _ in range(warmup):
+        result = engine.execute(sql)
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = engine.execute(sql)
+        result.records()
+        seconds.append(time.perf_counter() - started)
+    return _figures(seconds, len(result.rows))
+
+def time_rest(supabase, query, repeat, warmup=2):
+    for _ in range(warmup):
+        query(supabase.table(TABLE)).execute()
+    seconds, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(query(supabase.table(TABLE)).execute().data or [])
+        seconds.append(time.perf_counter() - started)
+    return _figures(seconds, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DuckDB snapshot vs execute-sql.js for the market SQL page')
+    parser.add_argument('--rows', type=int, default=100000, help='fixture rows to load (default: 100000)')
+    parser.add_argument('--seed', type=int, default=42, help='fixture seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=30, help='runs per query (default: 30)')
+    parser.add_argument('--queries', nargs='+', choices=list(QUERIES), default=list(QUERIES),
+                        help='queries to run (default: all)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stub latency per request')
+    parser.add_argument('--threads', type=int, help='DuckDB threads (default: one per CPU)')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    store = MemoryStore()
+    started = time.monotonic()
+    stored = load_fixture(store, args.rows, args.seed)
+    store.insert('parcels', synthetic_parcels(fixture_csv(args.rows, args.seed), args.seed))
+    print(f"Loaded {stored:,} sales and {store.count('parcels'):,} parcels in {time.monotonic() - started:.1f}s")
+
+    server = start_stub(store=store)
+    results = {}
+    try:
+        supabase = create_client(server.url, STUB_KEY)
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.monotonic()
+            build_snapshot(supabase, directory)
+            snapshot_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print(f"Snapshot built in {time.monotonic() - started:.1f}s ({snapshot_bytes / 1e6:.1f} MB)")
+            engine = MarketQueryEngine(directory, timeout=30, threads=args.threads)
+            print(f"Loaded into DuckDB in {engine.load_seconds:.2f}s")
+
+        server.config.latency = args.latency_ms / 1000
+        print(f"\n{'query':<16} {'handler':<8} {'duckdb rows':>11} {'p50 ms':>8} {'p95 ms':>8}"
+              f" {'rest rows':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for name in args.queries:
+            sql, handling, rest = QUERIES[name]
+            result = results[name] = {'handler': handling, 'duckdb': time_duckdb(engine, sql, args.repeat)}
+            line = (f"{name:<16} {handling:<8} {result['duckdb']['rows']:>11,} "
+                    f"{result['duckdb']['p50_ms']:>8,.2f} {result['duckdb']['p95_ms']:>8,.2f}")
+            if rest is not None:
+                result['rest'] = figures = time_rest(supabase, rest, args.repeat)
+                line += f" {figures['rows']:>10,} {figures['p50_ms']:>8,.2f} {figures['p95_ms']:>8,.2f}"
+            print(line)
+    finally:
+        server.shutdown()
+
+    if args.output:
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'stored': stored,
+            'snapshot_bytes': snapshot_bytes,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Time person lookups: ilike scans vs the name token index
+
+Loads a generated sales file into postgrest_stub.py's store, builds a
+name_index.py index from it over REST, and looks up people drawn from the
+file two ways:
+
+  ilike   what SalesAPI.getAllTransactionsByPerson() sends: ilike
+          '%NAME%' on grantor and on grantee, newest first (and on
+          seller_name/buyer_name when both come back empty)
+  index   NameIndex.lookup() in memory, then the matching sales fetched
+          with sales_id=in.(...)
+
+Names are asked for as they are written in the file ('SMITH, JOHN'), so
+the ilike path finds them, and in the other order ('JOHN SMITH'), which
+only the index matches. --latency-ms adds the stub's per-request delay to
+stand in for the network.
+
+Usage (run from backend-scripts/):
+    python3 benchmark-name-search.py                        # 100k sales
+    python3 benchmark-name-search.py --rows 500000 --latency-ms 40 --output names.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+from supabase import create_client
+
+from name_index import build_index, transactions_by_person
+from postgrest_stub import MemoryStore, load_fixture, start_stub
+
+# Any well-formed JWT works against the stub
+STUB_KEY = ('eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.'
+            'eyJyb2xlIjoiYW5vbiIsImlzcyI6InN0dWIifQ.'
+            'c3R1Yi1zaWduYXR1cmU')
+
+TABLE = 'sales_transactions'
+
+
+def ilike_lookup(supabase, name):
+    """getAllTransactionsByPerson() as js/sales-api.js sends it"""
+    pattern = f"%{name.strip().upper()}%"
+    results = {}
+    for role, column, fallback in (('seller', 'grantor', 'seller_name'), ('buyer', 'grantee', 'buyer_name')):
+        results[role] = (supabase.table(TABLE).select('*').ilike(column, pattern)
+                         .order('sale_date', desc=True).execute().data or [])
+    if not results['seller'] and not results['buyer']:
+        for role, column in (('seller', 'seller_name'), ('buyer', 'buyer_name')):
+            try:
+                results[role] = (supabase.table(TABLE).select('*').ilike(column, pattern)
+                                 .order('sale_date', desc=True).execute().data or [])
+            except APIError:
+                # The updated layout has no seller_name/buyer_name; the page
+                # logs the error and carries on
+                pass
+    transactions, seen = [], set()
+    for role in ('seller', 'buyer'):
+        for row in results[role]:
+            mark = (row.get('street_address') or row.get('property_address'), row.get('sale_date'))
+            if mark not in seen:
+                seen.add(mark)
+                transactions.append({**row, 'role': role})
+    transactions.sort(key=lambda row: row.get('sale_date') or '', reverse=True)
+    return transactions
+
+
+def sample_names(supabase, count, seed):
+    """`count` 'LAST, FIRST' names of people in the table"""
+    rows = supabase.table(TABLE).select('grantor,grantee').order('sales_id').limit(5000).execute().data
+    names = sorted({name for row in rows for name in (row['grantor'], row['grantee'])
+                    if name and name.count(',') == 1 and 'LLC' not in name})
+    if not names:
+        raise SystemExit(f"{TABLE} has no 'LAST, FIRST' names to look up")
+    return random.Random(seed).sample(names, min(count, len(names)))
+
+def reversed_name(name):
+    last, first = (part.strip() for part in name.split(','))
+    return f"{first} {last}"
+
+
+def time_lookups(lookup, names):
+    seconds, rows = [], 0
+    for name in names:
+        started = time.perf_counter()
+        rows += len(lookup(name))
+        seconds.append(time.perf_counter() - started)
+    seconds.sort()
+    return {
+        'requests': len(seconds),
+        'rows_per_lookup': round(rows / len(seconds), 1),
+        'p50_ms': round(statistics.median(seconds) * 1000, 2),
+        'p95_ms': round(seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)] * 1000, 2),
+        'mean_ms': round(statistics.fmean(seconds) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Person lookups: ilike scans vs the name token index')
+    parser.add_argument('--rows', type=int, default=100000, help='fixture rows to load (default: 100000)')
+    parser.add_argument('--seed', type=int, default=42, help='fixture and name seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=30, help='names looked up (default: 30)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stub latency per request')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    store = MemoryStore()
+    started = time.monotonic()
+    stored = load_fixture(store, args.rows, args.seed)
+    print(f"Loaded {stored:,} sales in {time.monotonic() - started:.1f}s")
+
+    server = start_stub(store=store)
+    results = {}
+    try:
+        supabase = create_client(server.url, STUB_KEY)
+        with tempfile.TemporaryDirectory() as directory:
+            index = build_index(supabase, TABLE, os.path.join(directory, 'names.npz'))
+            print(index.summary())
+        names = sample_names(supabase, args.repeat, args.seed)
+        server.config.latency = args.latency_ms / 1000
+
+        runs = {
+            'ilike': lambda name: ilike_lookup(supabase, name),
+            'index': lambda name: transactions_by_person(supabase, index, name),
+        }
+        print(f"\n{'lookup':<8} {'names':<12} {'rows/lookup':>11} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+        for label, asked in (('as-filed', names), ('reversed', [reversed_name(name) for name in names])):
+            for method, lookup in runs.items():
+                lookup(asked[0])
+                figures = results[f"{method}/{label}"] = time_lookups(lookup, asked)
+                print(f"{method:<8} {label:<12} {figures['rows_per_lookup']:>11,.1f} {figures['p50_ms']:>9,.2f} "
+                      f"{figures['p95_ms']:>9,.2f} {figures['mean_ms']:>9,.2f}")
+    finally:
+        server.shutdown()
+
+    if args.output:
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'stored': stored,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sales transform step: per-row iterrows() vs column-at-a-time
+
+Runs the original row loop (clean_text/parse_date/parse_number per cell) and
+the vectorized transforms in sales_transform.py over the same chunks, checks
+that both produce identical records, and prints rows/sec for each.
+
+Usage:
+    python3 benchmark-transform.py                   # 100,000 synthetic rows
+    python3 benchmark-transform.py --rows 20000
+    python3 benchmark-transform.py --csv ../docs/Property_Sales_Detroit_-4801866508954663892.csv
+"""
+
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from sales_fixtures import synthetic_csv
+from sales_transform import (
+    DETAILED_SALES_COLUMNS, TEXT, DATE, FLOAT,
+    clean_text, parse_date, parse_number,
+    transform_detailed, transform_existing_schema, records_for,
+)
+
+def legacy_detailed(df_batch):
+    """fast-import-sales.py process_batch() before vectorization"""
+    records = []
+    for _, row in df_batch.iterrows():
+        record = {}
+        for field, source, kind in DETAILED_SALES_COLUMNS:
+            value = row.get(source)
+            if kind == TEXT:
+                record[field] = clean_text(value)
+            elif kind == DATE:
+                record[field] = parse_date(value)
+            else:
+                record[field] = parse_number(value, is_float=(kind == FLOAT))
+        if all([record.get('street_address'), record.get('sale_date'),
+                record.get('sale_price'), (record.get('grantor') or record.get('grantee'))]):
+            records.append(record)
+    return records
+
+def legacy_existing_schema(df_batch):
+    """import-all-sales.py process_batch() before vectorization"""
+    records = []
+    for _, row in df_batch.iterrows():
+        record = {
+            'property_address': clean_text(row.get('Street Address')),
+            'seller_name': clean_text(row.get('Grantor')) or 'UNKNOWN SELLER',
+            'buyer_name': clean_text(row.get('Grantee')) or 'UNKNOWN BUYER',
+            'sale_date': parse_date(row.get('Sale Date')),
+            'sale_price': parse_number(row.get('Sale Price'), is_float=True),
+            'parcel_id': clean_text(row.get('Parcel Number')),
+            'sale_terms': clean_text(row.get('Terms of Sale'))
+        }
+        property_zip = clean_text(row.get('ECF Neighborhood'))
+        if property_zip:
+            record['property_zip'] = property_zip[:10]
+        year_str = str(row.get('Sale Date')).split('/')[-1].split(' ')[0]
+        try:
+            year = int(year_str)
+            if 1900 <= year <= 2100:
+                record['year_built'] = year
+        except:
+            pass
+        if all([record.get('property_address'), record.get('sale_date'),
+                record.get('sale_price') and record.get('sale_price') > 100]):
+            records.append(record)
+    return records
+
+def run(name, func, chunks):
+    """Time one transform over all chunks; returns (records, seconds)"""
+    start = time.perf_counter()
+    records = [func(chunk) for chunk in chunks]
+    return records, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic rows to generate')
+    parser.add_argument('--csv', help='benchmark a real Detroit sales CSV instead')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    source = args.csv or synthetic_csv(args.rows)
+    kwargs = {'nrows': args.rows} if args.csv else {}
+    chunks = [chunk[chunk['Sale Price'] > 100] for chunk in
+              pd.read_csv(source, encoding='utf-8-sig', chunksize=args.chunk_size,
+                          low_memory=False, **kwargs)]
+    total_rows = sum(len(chunk) for chunk in chunks)
+    print(f"Benchmarking {total_rows:,} rows in {len(chunks)} chunks")
+
+    cases = [
+        ('detailed (fast-import-sales)', legacy_detailed, lambda c: records_for(c, transform_detailed)),
+        ('existing schema (import-all-sales)', legacy_existing_schema,
+         lambda c: records_for(c, transform_existing_schema)),
+    ]
+    for label, legacy, vectorized in cases:
+        before, before_time = run('legacy', legacy, chunks)
+        after, after_time = run('vectorized', vectorized, chunks)
+        if before != after:
+            print(f"{label}: OUTPUT MISMATCH")
+            sys.exit(1)
+        print(f"\n{label}")
+        print(f"  iterrows:   {total_rows / before_time:>12,.0f} rows/sec ({before_time:.2f}s)")
+        print(f"  vectorized: {total_rows / after_time:>12,.0f} rows/sec ({after_time:.2f}s)")
+        print(f"  speedup:    {before_time / after_time:>12.1f}x, records identical "
+              f"({sum(len(r) for r in after):,})")
+
+if __name__ == '__main__':
+    main()
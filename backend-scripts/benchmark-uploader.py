@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Measure sales upload throughput against the local PostgREST stub
+
+Compares the old loop (one insert, then time.sleep(0.05)) with BatchUploader
+at several concurrency levels. The stub adds per-request latency and a
+requests/sec limit that answers 429, so the AIMD controller has something to
+back off from.
+
+Usage:
+    python3 benchmark-uploader.py
+    python3 benchmark-uploader.py --batches 200 --latency-ms 120 --rate-limit 25
+"""
+
+import argparse
+import time
+
+from supabase import create_client
+
+from batch_uploader import AIMDRateController, BatchUploader
+from postgrest_stub import start_stub
+
+# Any well-formed JWT works against the stub
+STUB_KEY = ('eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.'
+            'eyJyb2xlIjoiYW5vbiIsImlzcyI6InN0dWIifQ.'
+            'c3R1Yi1zaWduYXR1cmU')
+
+def make_batches(count, batch_size):
+    """Synthetic sales_transactions batches in the fast-import-sales layout"""
+    batches = []
+    sales_id = 0
+    for b in range(count):
+        records = []
+        for _ in range(batch_size):
+            sales_id += 1
+            records.append({
+                'sales_id': sales_id,
+                'parcel_number': f'{sales_id:08d}.',
+                'street_address': f'{sales_id % 20000} GRAND RIVER',
+                'sale_date': '2024-01-01',
+                'sale_price': 55000.0,
+                'grantor': 'DETROIT LAND BANK AUTHORITY',
+                'grantee': 'SMITH, JOHN',
+            })
+        batches.append((b * batch_size, records))
+    return batches
+
+def run_sequential(supabase, batches):
+    """The pre-uploader loop: insert, then a fixed 50ms sleep"""
+    start = time.monotonic()
+    imported = errors = 0
+    for _, records in batches:
+        try:
+            supabase.table('sales_transactions').insert(records).execute()
+            imported += len(records)
+        except Exception:
+            errors += len(records)
+        time.sleep(0.05)
+    elapsed = time.monotonic() - start
+    return imported, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the concurrent batch uploader')
+    parser.add_argument('--batches', type=int, default=120)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    parser.add_argument('--rate-limit', type=float, default=30.0, help='stub requests/sec before 429')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    batches = make_batches(args.batches, args.batch_size)
+    server = start_stub(latency=args.latency_ms / 1000, rate_limit=args.rate_limit)
+    supabase = create_client(server.url, STUB_KEY)
+    total = args.batches * args.batch_size
+    print(f"Stub at {server.url}: {args.latency_ms:.0f}ms latency, "
+          f"{args.rate_limit:.0f} req/s limit | {total:,} rows in {args.batches} batches\n")
+
+    imported, errors, elapsed = run_sequential(supabase, batches)
+    print(f"{'sequential + sleep':<22} {imported / elapsed:>10,.0f} rows/sec "
+          f"({elapsed:.1f}s, errors {errors:,}, 429s {server.store.throttled})")
+
+    for concurrency in args.concurrency:
+        server.store.throttled = 0
+        send = lambda records: supabase.table('sales_transactions').insert(records).execute()
+        uploader = BatchUploader(send, max_in_flight=concurrency,
+                                 controller=AIMDRateController(initial_rate=10))
+        for _ in uploader.upload(batches):
+            pass
+        stats = uploader.stats
+        print(f"{f'uploader x{concurrency}':<22} {stats.rows_per_sec:>10,.0f} rows/sec "
+              f"({stats.elapsed:.1f}s, failed {stats.failed_rows:,}, 429s {server.store.throttled}, "
+              f"final rate {uploader.controller.rate:.1f} req/s)")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Comparable sales from the imported x/y coordinates
+
+Every sale in sales_transactions carries x_coordinate/y_coordinate
+(longitude/latitude), but the only radius search, api/properties/radius.js,
+asks an outside listing API. CompsEngine answers it from the sales
+themselves, over a market_query.py snapshot:
+
+  index     arm's-length sales (terms of sale VALID ARMS LENGTH, price of at
+            least min_price) with a date and coordinates, projected to miles
+            around the city and bucketed into a uniform grid of cell_miles
+            cells, stored as one array sorted by cell with each cell's start
+            offset. A radius query reads the cells the circle overlaps, one
+            contiguous slice per grid row, instead of every sale
+  locate    parcels have no coordinates of their own, so a parcel sits where
+            its sales do (median x/y, on the normalized parcel number as
+            parcel_linker joins them); an address is matched on its
+            canonical form (address_normalizer.py) to a sold parcel
+  comps     the n nearest indexed sales within radius miles, sold in the
+            `months` before as_of (default: the latest sale), leaving out the
+            subject parcel's own sales; price per square foot from the
+            parcels' total_floor_area where known
+  estimate  every parcel with a location and floor area at once: subjects
+            and the comp pool (sales with a floor area in the window) are
+            gridded, and each block of subjects in a cell is measured
+            against the candidates of the cells around it as one distance
+            matrix; the n nearest per row give the median price per square
+            foot, times the parcel's floor area
+
+Needs a snapshot: python3 market_query.py build
+
+Usage (run from backend-scripts/):
+    python3 comps.py parcel 02363364. --radius 0.5 --count 10
+    python3 comps.py address "11396 N Outer Drive" --months 36
+    python3 comps.py estimate --output estimates.csv
+
+    engine = CompsEngine.from_snapshot(SNAPSHOT_DIR)
+    nearby = engine.comps(parcel='02363364.', radius=0.5, count=10)
+    estimates = engine.estimate(radius=0.5, count=10)
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from address_normalizer import canonical_addresses
+from market_query import PARCELS, SALES, SNAPSHOT_DIR
+from parcel_linker import normalize_parcel_ids
+
+ARMS_LENGTH_TERMS = ('VALID ARMS LENGTH',)
+MIN_PRICE = 1000          # transfers below this are not market sales
+RADIUS_MILES = 0.5
+COMP_COUNT = 10
+WINDOW_MONTHS = 24
+CELL_MILES = 0.25
+
+MILES_PER_DEGREE = 69.05  # of latitude; longitude is scaled by cos(latitude)
+
+# Distance-matrix entries per block in estimate()
+BLOCK_ENTRIES = 2_000_000
+
+SALE_COLUMNS = ['sales_id', 'parcel_number', 'street_address', 'sale_date', 'sale_price',
+                'terms_of_sale', 'x_coordinate', 'y_coordinate']
+PARCEL_COLUMNS = ['parcel_id', 'address', 'total_floor_area']
+
+
+def load_snapshot(directory=SNAPSHOT_DIR):
+    """(sales, parcels) frames from a market_query.py snapshot; parcels is
+    None when the snapshot has no parcels table"""
+    path = os.path.join(directory, f"{SALES}.parquet")
+    if not os.path.exists(path):
+        raise SystemExit(f"No snapshot at {directory}: run python3 market_query.py build")
+    sales = pd.read_parquet(path, columns=SALE_COLUMNS)
+    path = os.path.join(directory, f"{PARCELS}.parquet")
+    parcels = pd.read_parquet(path, columns=PARCEL_COLUMNS) if os.path.exists(path) else None
+    return sales, parcels
+
+
+class SpatialGrid:
+    """Points bucketed into square cells: order sorts them by cell and
+    starts[c]:starts[c + 1] is cell c's slice of it"""
+
+    def __init__(self, x, y, cell, origin, shape):
+        self.cell = cell
+        self.origin = origin
+        self.columns, self.rows = shape
+        cells = self.cell_of(x, y)
+        self.order = np.argsort(cells, kind='stable')
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.columns * self.rows + 1))
+
+    @classmethod
+    def covering(cls, x, y, cell):
+        """Grid over the bounding box of x/y"""
+        origin = (x.min(), y.min()) if len(x) else (0.0, 0.0)
+        shape = (int((x.max() - origin[0]) // cell) + 1 if len(x) else 1,
+                 int((y.max() - origin[1]) // cell) + 1 if len(y) else 1)
+        return cls(x, y, cell, origin, shape)
+
+    def _column(self, x):
+        return np.clip(((x - self.origin[0]) // self.cell).astype(np.int64), 0, self.columns - 1)
+
+    def _row(self, y):
+        return np.clip(((y - self.origin[1]) // self.cell).astype(np.int64), 0, self.rows - 1)
+
+    def cell_of(self, x, y):
+        return self._row(y) * self.columns + self._column(x)
+
+    def near(self, x, y, radius):
+        """Positions (into the points) in the cells within radius of (x, y)"""
+        left, right = self._column(np.array([x - radius, x + radius]))
+        bottom, top = self._row(np.array([y - radius, y + radius]))
+        # The cells of a grid row are adjacent in order
+        slices = [self.order[self.starts[row * self.columns + left]:self.starts[row * self.columns + right + 1]]
+                  for row in range(bottom, top + 1)]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+
+class CompsEngine:
+    """Nearest arm's-length sales and price-per-square-foot estimates"""
+
+    def __init__(self, sales, parcels=None, min_price=MIN_PRICE, cell_miles=CELL_MILES):
+        started = time.monotonic()
+        sales = sales.reset_index(drop=True)
+        lon = pd.to_numeric(sales['x_coordinate'], errors='coerce').to_numpy(dtype=float)
+        lat = pd.to_numeric(sales['y_coordinate'], errors='coerce').to_numpy(dtype=float)
+        located = np.isfinite(lon) & np.isfinite(lat) & (lon != 0) & (lat != 0)
+        if not located.any():
+            raise ValueError('No sales have coordinates')
+        # Equirectangular projection about the sales' middle; good to well
+        # under 1% across a city
+        self.center = (float(np.median(lon[located])), float(np.median(lat[located])))
+        self._scale = MILES_PER_DEGREE * np.cos(np.radians(self.center[1]))
+        x, y = self.project(lon, lat)
+
+        keys = normalize_parcel_ids(sales['parcel_number'])
+        self.floor_area = self._floor_areas(parcels)
+        self.parcels = parcels
+
+        # Where each parcel and address is: median of its sales' positions
+        frame = pd.DataFrame({'key': keys, 'x': x, 'y': y})[located]
+        self.locations = frame.dropna(subset=['key']).groupby('key')[['x', 'y']].median()
+        frame['address'] = canonical_addresses(sales['street_address'].to_numpy()[located])
+        self.addresses = (frame.dropna(subset=['address', 'key'])
+                          .groupby('address').agg(key=('key', 'first'), x=('x', 'median'), y=('y', 'median')))
+
+        dates = pd.to_datetime(sales['sale_date'], errors='coerce')
+        prices = pd.to_numeric(sales['sale_price'], errors='coerce').to_numpy(dtype=float)
+        terms = sales['terms_of_sale'].astype('string').str.strip().str.upper()
+        indexed = (located & dates.notna().to_numpy() & (prices >= min_price)
+                   & terms.isin(ARMS_LENGTH_TERMS).fillna(False).to_numpy())
+        rows = np.flatnonzero(indexed)
+
+        # The index: one array per field, aligned by position
+        self.sales = sales.iloc[rows].reset_index(drop=True)
+        self.x, self.y = x[rows], y[rows]
+        self.day = dates.to_numpy(dtype='datetime64[D]')[rows]
+        self.price = prices[rows]
+        self.key = keys[rows]
+        self.parcel_code = pd.factorize(self.key)[0]
+        self.sqft = pd.Series(self.key).map(self.floor_area).to_numpy(dtype=float)
+        self.latest = self.day.max() if len(rows) else None
+        self.cell_miles = cell_miles
+        self.grid = SpatialGrid.covering(self.x, self.y, cell_miles)
+        self.build_seconds = time.monotonic() - started
+
+    @classmethod
+    def from_snapshot(cls, directory=SNAPSHOT_DIR, **options):
+        return cls(*load_snapshot(directory), **options)
+
+    @staticmethod
+    def _floor_areas(parcels):
+        """normalized parcel number -> total_floor_area (positive ones only)"""
+        if parcels is None or 'total_floor_area' not in parcels:
+            return pd.Series(dtype=float)
+        area = pd.Series(pd.to_numeric(parcels['total_floor_area'], errors='coerce').to_numpy(dtype=float),
+                         index=normalize_parcel_ids(parcels['parcel_id']))
+        area = area[area.index.notna() & (area > 0)]
+        return area[~area.index.duplicated()]
+
+    def project(self, lon, lat):
+        """Longitude/latitude to miles east/north of the center"""
+        return ((np.asarray(lon, dtype=float) - self.center[0]) * self._scale,
+                (np.asarray(lat, dtype=float) - self.center[1]) * MILES_PER_DEGREE)
+
+    def window(self, months=WINDOW_MONTHS, as_of=None):
+        """(first, last) sale day of the comp window, as datetime64[D]"""
+        last = pd.Timestamp(as_of if as_of is not None else self.latest)
+        return ((last - pd.DateOffset(months=months)).to_datetime64().astype('datetime64[D]'),
+                last.to_datetime64().astype('datetime64[D]'))
+
+    def locate(self, parcel=None, address=None):
+        """(x, y, parcel key) of a parcel number or street address, or None"""
+        if parcel is not None:
+            key = normalize_parcel_ids([parcel])[0]
+            if key in self.locations.index:
+                x, y = self.locations.loc[key]
+                return x, y, key
+            # A parcel that never sold: try its address
+            if self.parcels is not None and address is None:
+                match = self.parcels.loc[normalize_parcel_ids(self.parcels['parcel_id']) == key, 'address']
+                address = match.iloc[0] if len(match) else None
+        if address is not None:
+            canonical = canonical_addresses([address])[0]
+            if canonical in self.addresses.index:
+                found = self.addresses.loc[canonical]
+                return found['x'], found['y'], found['key']
+        return None
+
+    def nearest(self, x, y, key, radius, count, first, last):
+        """(positions, distances) of the count nearest indexed sales within
+        radius of (x, y) and sold first..last, leaving out parcel key's own"""
+        near = self.grid.near(x, y, radius)
+        distance = np.hypot(self.x[near] - x, self.y[near] - y)
+        keep = ((distance <= radius) & (self.day[near] >= first) & (self.day[near] <= last)
+                & (self.key[near] != key))
+        near, distance = near[keep], distance[keep]
+        nearest = np.lexsort((near, distance))[:count]
+        return near[nearest], distance[nearest]
+
+    def comps(self, parcel=None, address=None, radius=RADIUS_MILES, count=COMP_COUNT,
+              months=WINDOW_MONTHS, as_of=None):
+        """The count nearest arm's-length sales within radius miles of a parcel
+        or address, nearest first, with distance_miles, floor_area and
+        price_per_sqft; None when the subject cannot be located"""
+        where = self.locate(parcel, address)
+        if where is None:
+            return None
+        positions, distance = self.nearest(*where, radius, count, *self.window(months, as_of))
+        result = self.sales.iloc[positions].reset_index(drop=True)
+        result['distance_miles'] = distance.round(3)
+        result['floor_area'] = self.sqft[positions]
+        result['price_per_sqft'] = (self.price[positions] / result['floor_area']).round(2)
+        return result
+
+    def subjects(self):
+        """Every parcel with a location and floor area: key, parcel_id, x, y, floor_area"""
+        if self.parcels is None:
+            raise ValueError('Estimates need the parcels table (total_floor_area)')
+        frame = pd.DataFrame({'parcel_id': self.parcels['parcel_id'].to_numpy(),
+                              'key': normalize_parcel_ids(self.parcels['parcel_id']),
+                              'address': self.parcels['address'].to_numpy()})
+        frame['floor_area'] = frame['key'].map(self.floor_area)
+        frame = frame[frame['floor_area'].notna() & frame['key'].notna()].drop_duplicates('key')
+        position = self.locations.reindex(frame['key'])
+        frame['x'], frame['y'] = position['x'].to_numpy(), position['y'].to_numpy()
+        # Parcels that never sold, placed by their address where it matches
+        missing = frame['x'].isna().to_numpy()
+        if missing.any():
+            found = self.addresses.reindex(canonical_addresses(frame['address'].to_numpy()[missing]))
+            frame.loc[missing, 'x'] = found['x'].to_numpy()
+            frame.loc[missing, 'y'] = found['y'].to_numpy()
+        return frame.dropna(subset=['x']).drop(columns='address').reset_index(drop=True)
+
+    def estimate(self, radius=RADIUS_MILES, count=COMP_COUNT, months=WINDOW_MONTHS, as_of=None):
+        """Comps and a median price-per-sqft estimate for every parcel.
+
+        One row per parcel in subjects(): comps (found, up to count),
+        median_ppsf, estimate (median_ppsf * floor_area), nearest_miles,
+        farthest_miles and comp_sales_ids (space-separated, nearest first).
+        """
+        subjects = self.subjects()
+        first, last = self.window(months, as_of)
+        pool = np.flatnonzero((self.day >= first) & (self.day <= last) & np.isfinite(self.sqft))
+        px, py, ppsf = self.x[pool], self.y[pool], self.price[pool] / self.sqft[pool]
+        # Parcels as integers, so a subject's own sales can be masked out;
+        # -1 for subjects with no sales in the pool
+        pool_code, pool_keys = pd.factorize(self.key[pool])
+        subject_code = pd.Index(pool_keys).get_indexer(subjects['key'])
+        sx, sy = subjects['x'].to_numpy(), subjects['y'].to_numpy()
+
+        # Comps and subjects on one grid of radius-sized cells: a subject's
+        # comps are in its own cell or the eight around it
+        cell = max(radius, 1e-6)
+        grid = SpatialGrid.covering(np.concatenate([px, sx]), np.concatenate([py, sy]), cell)
+        comps = SpatialGrid(px, py, cell, grid.origin, (grid.columns, grid.rows))
+        cells = grid.cell_of(sx, sy)
+        order = np.argsort(cells, kind='stable')
+        bounds = np.flatnonzero(np.diff(cells[order])) + 1
+
+        found = np.full((len(subjects), count), -1, dtype=np.int64)
+        distance = np.full((len(subjects), count), np.inf)
+        for block in np.split(order, bounds):
+            if not len(block):
+                continue
+            cx, cy = sx[block[0]], sy[block[0]]
+            # Everything in the 3x3 cells around this one
+            candidates = comps.near(cx, cy, cell)
+            if not len(candidates):
+                continue
+            step = max(1, BLOCK_ENTRIES // len(candidates))
+            for rows in (block[i:i + step] for i in range(0, len(block), step)):
+                d = np.hypot(sx[rows, None] - px[candidates], sy[rows, None] - py[candidates])
+                d[(d > radius) | (subject_code[rows, None] == pool_code[candidates])] = np.inf
+                k = min(count, len(candidates))
+                nearest = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(candidates) else \
+                    np.broadcast_to(np.arange(k), (len(rows), k))
+                near_d = np.take_along_axis(d, nearest, axis=1)
+                by_distance = np.argsort(near_d, axis=1, kind='stable')
+                distance[rows, :k] = np.take_along_axis(near_d, by_distance, axis=1)
+                found[rows, :k] = candidates[np.take_along_axis(nearest, by_distance, axis=1)]
+        found[~np.isfinite(distance)] = -1
+
+        # Median of each row's comps, the missing ones sorted to the end
+        values = np.where(found >= 0, ppsf[np.maximum(found, 0)], np.nan)
+        values.sort(axis=1)
+        n = (found >= 0).sum(axis=1)
+        row = np.arange(len(subjects))
+        low, high = np.maximum(n - 1, 0) // 2, np.minimum(n // 2, count - 1)
+        median = np.where(n > 0, (values[row, low] + values[row, high]) / 2, np.nan)
+
+        result = subjects[['parcel_id', 'floor_area']].copy()
+        result['comps'] = n
+        result['median_ppsf'] = median.round(2)
+        result['estimate'] = (median * subjects['floor_area'].to_numpy()).round(-2)
+        result['nearest_miles'] = np.where(n > 0, distance[:, 0], np.nan).round(3)
+        result['farthest_miles'] = np.where(n > 0, distance[row, np.maximum(n - 1, 0)], np.nan).round(3)
+        sale_ids = self.sales['sales_id'].to_numpy()[pool]
+        result['comp_sales_ids'] = [' '.join(str(sale_ids[i]) for i in ids if i >= 0) for ids in found]
+        return result
+
+
+def main():
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--snapshot', default=SNAPSHOT_DIR, help=f'market_query.py snapshot (default: {SNAPSHOT_DIR})')
+    options.add_argument('--radius', type=float, default=RADIUS_MILES, help=f'miles (default: {RADIUS_MILES})')
+    options.add_argument('--count', type=int, default=COMP_COUNT, help=f'comps per subject (default: {COMP_COUNT})')
+    options.add_argument('--months', type=int, default=WINDOW_MONTHS,
+                         help=f'sale window before --as-of (default: {WINDOW_MONTHS})')
+    options.add_argument('--as-of', help='end of the window, YYYY-MM-DD (default: the latest sale)')
+    parser = argparse.ArgumentParser(description="Comparable sales from the sales' coordinates")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('parcel', parents=[options], help='comps for a parcel number').add_argument('parcel')
+    commands.add_parser('address', parents=[options], help='comps for a street address').add_argument('address')
+    command = commands.add_parser('estimate', parents=[options],
+                                  help='comps and a price-per-sqft estimate for every parcel')
+    command.add_argument('--output', help='write the estimates as CSV (default: print a summary)')
+    args = parser.parse_args()
+
+    engine = CompsEngine.from_snapshot(args.snapshot)
+    print(f"Indexed {len(engine.sales):,} arm's-length sales in {engine.build_seconds:.1f}s "
+          f"(latest {engine.latest})")
+    options = dict(radius=args.radius, count=args.count, months=args.months, as_of=args.as_of)
+
+    started = time.perf_counter()
+    if args.command == 'estimate':
+        estimates = engine.estimate(**options)
+        elapsed = time.perf_counter() - started
+        priced = estimates['median_ppsf'].notna()
+        print(f"Estimated {priced.sum():,} of {len(estimates):,} parcels in {elapsed:.1f}s; "
+              f"median ${estimates.loc[priced, 'median_ppsf'].median():,.2f}/sqft")
+        if args.output:
+            estimates.to_csv(args.output, index=False)
+            print(f"Estimates written to {args.output}")
+        return
+
+    comps = engine.comps(parcel=getattr(args, 'parcel', None), address=getattr(args, 'address', None), **options)
+    elapsed = (time.perf_counter() - started) * 1000
+    if comps is None:
+        raise SystemExit(f"No sales locate {getattr(args, 'parcel', None) or args.address!r}")
+    columns = ['distance_miles', 'sale_date', 'sale_price', 'price_per_sqft', 'street_address', 'sales_id']
+    print(comps[columns].to_string(index=False) if len(comps) else 'No comps in range')
+    print(f"({len(comps)} comps in {elapsed:.1f} ms)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Single-pass chunked CSV reader with byte-offset progress
+
+The importers used to read the whole export once just to count lines
+(`sum(1 for line in open(CSV_FILE))`) so they could show a percentage and
+ETA, then read it again with pd.read_csv(chunksize=...). CsvChunkReader makes
+one pass and reports progress from how far into the file the parser is,
+which needs nothing but the file size.
+
+Engines:
+
+  pandas   - pd.read_csv(chunksize=...), single-threaded. Column types are
+             inferred per chunk exactly as before.
+  arrow    - pyarrow.csv.open_csv, which parses blocks on several threads.
+             Columns named in `dtype` get that type and every other column
+             is read as text, so a block whose values look different from
+             the first one cannot break type inference halfway through.
+  snapshot - the cached Parquet snapshot of the file (sales_snapshot.py),
+             built on first use. Nothing is parsed from text after that.
+
+With a dtype plan (sales_dtypes.py) every chunk is converted to compact
+dtypes as it is read; the pandas engine builds the categoricals while
+parsing.
+
+'auto' uses the snapshot when pyarrow is installed and pandas otherwise. Every
+engine yields DataFrames of exactly chunk_size rows (the last may be
+shorter), so chunk numbers line up with import checkpoints.
+
+Usage (run from backend-scripts/):
+
+    reader = CsvChunkReader(CSV_FILE, chunk_size=10000, dtype={'Sale Price': 'float64'})
+    for chunk in reader:
+        ...
+        print(reader.progress_line())
+"""
+
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # the arrow engine is optional
+    pa = None
+
+ENGINES = ('auto', 'pandas', 'arrow', 'snapshot')
+
+# Types the importers rely on; Sale Price is compared numerically when
+# filtering out nominal transfers
+SALES_DTYPES = {'Sale Price': 'float64'}
+
+
+class CsvChunkReader:
+    """Iterate a CSV as DataFrame chunks in one pass, tracking bytes read.
+
+    skip_rows skips that many data rows after the header (for resuming an
+    import); row numbers in rows_read still count from the top of the file.
+    na_values lists the cells read as missing; None keeps the parser's
+    defaults ('', 'NA', 'NULL', 'N/A', ...). The snapshot engine ignores it.
+    """
+
+    def __init__(self, path, chunk_size=10000, engine='auto', dtype=None,
+                 skip_rows=0, block_size=4 << 20, plan=None, na_values=None):
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, not {engine!r}")
+        if engine in ('arrow', 'snapshot') and pa is None:
+            raise SystemExit(f"The {engine} engine needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.chunk_size = chunk_size
+        if engine == 'auto':
+            engine = 'snapshot' if pa is not None else 'pandas'
+        self.engine = engine
+        self.dtype = dict(dtype or {})
+        self.na_values = None if na_values is None else list(na_values)
+        self.plan = plan
+        self.skip_rows = skip_rows
+        self.block_size = block_size
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.rows_read = skip_rows
+        self.finished = False
+        self.started = None
+        self._start_fraction = 0.0
+
+    def __iter__(self):
+        self.started = time.monotonic()
+        if self.plan is not None:
+            yield from map(self.plan.apply, self._chunks())
+        else:
+            yield from self._chunks()
+
+    def _chunks(self):
+        if self.engine == 'snapshot':
+            yield from self._snapshot_chunks()
+            return
+        with open(self.path, 'rb') as f:
+            chunks = self._arrow_chunks(f) if self.engine == 'arrow' else self._pandas_chunks(f)
+            try:
+                for chunk in chunks:
+                    self.rows_read += len(chunk)
+                    if self.engine == 'pandas':
+                        self.bytes_read = f.tell()
+                    if self.skip_rows and not self._start_fraction and self.bytes_read:
+                        # Estimate where the skipped rows ended so the ETA
+                        # is based only on rows parsed in this run
+                        self._start_fraction = self.fraction * self.skip_rows / self.rows_read
+                    yield chunk
+            finally:
+                chunks.close()
+        self.bytes_read = self.total_bytes
+        self.finished = True
+
+    def _pandas_chunks(self, f):
+        skip = range(1, self.skip_rows + 1) if self.skip_rows else None
+        dtype = dict(self.dtype)
+        if self.plan is not None:
+            dtype.update(self.plan.read_dtypes())
+        na = {} if self.na_values is None else dict(na_values=self.na_values, keep_default_na=False)
+        yield from pd.read_csv(f, encoding='utf-8-sig', chunksize=self.chunk_size,
+                               low_memory=False, skiprows=skip, dtype=dtype or None, **na)
+
+    def _arrow_chunks(self, f):
+        # The header decides which columns exist; anything not in dtype is text
+        header = pd.read_csv(self.path, encoding='utf-8-sig', nrows=0).columns
+        column_types = {name: pa.from_numpy_dtype(self.dtype[name]) if name in self.dtype
+                        else pa.string() for name in header}
+        na = {} if self.na_values is None else dict(null_values=self.na_values)
+        reader = pa_csv.open_csv(
+            f,
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=self.block_size,
+                                            skip_rows_after_names=self.skip_rows),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types,
+                                                  strings_can_be_null=True, **na),
+        )
+        # Re-slice Arrow's byte-sized record batches into chunk_size rows.
+        # Arrow reads ahead of the batches it hands out, so f.tell() is no
+        # use for progress. Each batch is one block_size block of the file,
+        # which gives the average bytes per row to place a row in the file.
+        pending, pending_rows = [], 0
+        block_rows = []
+        for batch in reader:
+            block_rows.append(batch.num_rows)
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= self.chunk_size:
+                table = pa.Table.from_batches(pending)
+                rest = table.slice(self.chunk_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+                self.bytes_read = self._arrow_position(self.rows_read + self.chunk_size, block_rows)
+                yield self._to_frame(table.slice(0, self.chunk_size))
+        if pending_rows:
+            self.bytes_read = self.total_bytes
+            yield self._to_frame(pa.Table.from_batches(pending))
+
+    def _arrow_position(self, rows_done, block_rows):
+        """Estimated byte offset of row rows_done from rows per block so far"""
+        # With skip_rows the first block is only partly returned
+        sample = block_rows[1:] if self.skip_rows and len(block_rows) > 1 else block_rows
+        rows = sum(sample)
+        if not rows:
+            return self.bytes_read
+        return min(self.total_bytes, int(rows_done * self.block_size * len(sample) / rows))
+
+    def _snapshot_chunks(self):
+        from sales_snapshot import iter_chunks, snapshot_info
+        total_rows = snapshot_info(self.path)['rows']
+        self._start_fraction = self.skip_rows / total_rows if total_rows else 0.0
+        for chunk in iter_chunks(self.path, self.chunk_size, skip_rows=self.skip_rows):
+            self.rows_read += len(chunk)
+            # No parsing position to go by; rows are a fair stand-in
+            self.bytes_read = int(self.total_bytes * self.rows_read / total_rows)
+            yield chunk
+        self.bytes_read = self.total_bytes
+        self.finished = True
+
+    def _to_frame(self, table):
+        frame = table.to_pandas()
+        # Keep pandas-style row labels (position in the file) for callers
+        # that slice by label
+        frame.index = pd.RangeIndex(self.rows_read, self.rows_read + len(frame))
+        return frame
+
+    @property
+    def fraction(self):
+        """Share of the file parsed so far, 0.0-1.0"""
+        return self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started else 0.0
+
+    def eta_seconds(self):
+        """Remaining time at the byte rate seen so far in this run"""
+        done = self.fraction - self._start_fraction
+        if done <= 0 or self.elapsed <= 0:
+            return None
+        return self.elapsed * (1 - self.fraction) / done
+
+    def progress_line(self):
+        """e.g. '37.5% (62.1/165.6 MB) | ETA: 4.2 min'"""
+        eta = self.eta_seconds()
+        eta_text = f"{eta / 60:.1f} min" if eta is not None else '?'
+        return (f"{self.fraction * 100:.1f}% ({self.bytes_read / 1e6:,.1f}/"
+                f"{self.total_bytes / 1e6:,.1f} MB) | ETA: {eta_text}")
+
+
+def add_reader_arguments(parser):
+    """Add the shared --engine option to an importer's CLI"""
+    parser.add_argument('--engine', choices=ENGINES, default='auto',
+                        help='CSV parser: arrow (multithreaded, needs pyarrow), pandas, '
+                             'snapshot (cached Parquet copy, needs pyarrow) '
+                             'or auto (default: snapshot when pyarrow is installed)')
+    parser.add_argument('--compact', action='store_true',
+                        help='hold chunks in compact dtypes (categoricals, Int32, float32 coordinates, '
+                             'parsed dates; see sales_dtypes.py) for larger chunks in less memory')
+    return parser
@@ -3,15 +3,20 @@
 Fast import for Detroit sales data with better progress tracking
 """
 
+import argparse
 import os
 import sys
-import pandas as pd
-from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import re
 import time
 
+from batch_uploader import add_upload_arguments, uploader_from_args
+from csv_reader import CsvChunkReader, SALES_DTYPES, add_reader_arguments
+from sales_dedup import add_dedup_arguments, dedup_from_args
+from sales_dtypes import COMPACT_PLAN
+from sales_transform import transform_detailed, iter_record_batches, records_for
+from wire_format import add_wire_arguments, writer_from_args
+
 # Load environment variables
 load_dotenv()
 
@@ -22,74 +27,14 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXV
 # File path
 CSV_FILE = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
 
-def clean_text(text):
-    """Clean and standardize text fields"""
-    if pd.isna(text):
-        return None
-    text = str(text).strip()
-    text = re.sub(r'\s+', ' ', text)
-    return text if text else None
-
-def parse_date(date_value):
-    """Parse date from CSV format"""
-    if pd.isna(date_value):
-        return None
-    try:
-        date_str = str(date_value).split(' ')[0]
-        return datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
-    except:
-        return None
-
-def parse_number(value, is_float=False):
-    """Parse numeric values"""
-    if pd.isna(value):
-        return None
-    try:
-        if is_float:
-            return float(value)
-        else:
-            return int(float(value))
-    except:
-        return None
+# Rows the database rejected, with its error (see batch_uploader.py)
+DEAD_LETTER_FILE = 'fast-import-sales.rejected.jsonl'
 
 def process_batch(df_batch):
     """Process a batch of records"""
-    records = []
-    
-    for _, row in df_batch.iterrows():
-        record = {
-            'sales_id': parse_number(row.get('Sales ID')),
-            'parcel_number': clean_text(row.get('Parcel Number')),
-            'sale_number': parse_number(row.get('Sale Number')),
-            'street_address': clean_text(row.get('Street Address')),
-            'street_number': clean_text(row.get('Street Number')),
-            'street_prefix': clean_text(row.get('Street Prefix')),
-            'street_name': clean_text(row.get('Street Name')),
-            'unit_number': clean_text(row.get('Unit Number')),
-            'sale_date': parse_date(row.get('Sale Date')),
-            'sale_price': parse_number(row.get('Sale Price'), is_float=True),
-            'grantor': clean_text(row.get('Grantor')),
-            'grantee': clean_text(row.get('Grantee')),
-            'liber_page': clean_text(row.get('Liber Page')),
-            'terms_of_sale': clean_text(row.get('Terms of Sale')),
-            'sale_verification': clean_text(row.get('Sale Verification')),
-            'sale_instrument': clean_text(row.get('Sale Instrument')),
-            'property_transfer_percentage': parse_number(row.get('Property Transfer Percentage'), is_float=True),
-            'property_class_code': clean_text(row.get('Property Class Code')),
-            'ecf_neighborhood': clean_text(row.get('ECF Neighborhood')),
-            'x_coordinate': parse_number(row.get('x'), is_float=True),
-            'y_coordinate': parse_number(row.get('y'), is_float=True),
-            'esri_oid': parse_number(row.get('ESRI_OID'))
-        }
-        
-        # Only include records with required fields
-        if all([record.get('street_address'), record.get('sale_date'), 
-                record.get('sale_price'), (record.get('grantor') or record.get('grantee'))]):
-            records.append(record)
-    
-    return records
+    return records_for(df_batch, transform_detailed)
 
-def main():
+def main(args):
     """Main import function"""
     print(f"Starting fast import from {CSV_FILE}")
     start_time = time.time()
@@ -132,19 +77,32 @@ def main():
     batch_size = 500    # Larger batches for fewer API calls
     total_imported = 0
     total_errors = 0
-    chunk_num = 0
     
-    try:
-        # Get total rows
-        print("Counting total rows...")
-        total_rows = sum(1 for line in open(CSV_FILE)) - 1
-        print(f"Total rows in file: {total_rows:,}")
-        
-        # Process chunks
-        for chunk in pd.read_csv(CSV_FILE, encoding='utf-8-sig', chunksize=chunk_size, low_memory=False):
+    # Plain inserts duplicate every sale on a rerun; with --dedup, rows whose
+    # sale keys are already in the table or earlier in the file are dropped
+    dedup = dedup_from_args(args, supabase, 'sales_transactions')
+    transform = (lambda df: dedup.select(*transform_detailed(df))) if dedup else transform_detailed
+    
+    # Several batches in flight, paced by an adaptive rate controller
+    # instead of a fixed sleep between inserts
+    # Request bodies from orjson, null keys left out and gzipped, unless --encoder client
+    writer = writer_from_args(args, supabase, 'sales_transactions')
+    uploader = uploader_from_args(
+        writer or (lambda records: supabase.table('sales_transactions').insert(records).execute()),
+        args
+    )
+    
+    # One pass over the file; progress comes from the byte offset
+    reader = CsvChunkReader(CSV_FILE, chunk_size, args.engine, SALES_DTYPES,
+                            plan=COMPACT_PLAN if args.compact else None)
+    
+    def batches():
+        """Yield ((row position, share of file read), records) for every batch"""
+        chunk_num = 0
+        for chunk in reader:
             chunk_num += 1
             chunk_start = (chunk_num - 1) * chunk_size + 1
-            chunk_end = min(chunk_num * chunk_size, total_rows)
+            chunk_end = chunk_start + len(chunk) - 1
             
             # Filter for meaningful sales
             chunk_filtered = chunk[chunk['Sale Price'] > 100]
@@ -155,30 +113,28 @@ def main():
             
             print(f"\nChunk {chunk_num} (rows {chunk_start:,}-{chunk_end:,}): Processing {len(chunk_filtered):,} valid sales...")
             
-            # Process in batches
-            for i in range(0, len(chunk_filtered), batch_size):
-                batch = chunk_filtered.iloc[i:i+batch_size]
-                records = process_batch(batch)
-                
+            for i, records in iter_record_batches(chunk_filtered, transform, batch_size):
                 if records:
-                    try:
-                        result = supabase.table('sales_transactions').insert(records).execute()
-                        total_imported += len(records)
-                        
-                        # Show progress
-                        overall_progress = (chunk_start + i) / total_rows * 100
-                        elapsed = time.time() - start_time
-                        rate = total_imported / elapsed if elapsed > 0 else 0
-                        eta = (total_rows - (chunk_start + i)) / rate / 60 if rate > 0 else 0
-                        
-                        print(f"  Progress: {overall_progress:.1f}% | Imported: {total_imported:,} | Rate: {rate:.0f}/sec | ETA: {eta:.1f} min")
-                        
-                    except Exception as e:
-                        total_errors += len(records)
-                        print(f"  Batch error: {str(e)[:100]}")
+                    yield (chunk_start + i, reader.fraction), records
+    
+    try:
+        for result in uploader.upload(batches()):
+            total_imported += len(result.committed)
+            if result.committed:
+                # Show progress
+                _, fraction = result.key
+                elapsed = time.time() - start_time
+                rate = total_imported / elapsed if elapsed > 0 else 0
+                eta = (reader.eta_seconds() or 0) / 60
                 
-                # Small delay to avoid rate limits
-                time.sleep(0.05)
+                print(f"  Progress: {fraction * 100:.1f}% | Imported: {total_imported:,} | Rate: {rate:.0f}/sec | ETA: {eta:.1f} min")
+            if not result.ok:
+                total_errors += result.failed_rows
+                if result.rejected:
+                    print(f"  {len(result.rejected)} rejected rows to {args.dead_letter}: "
+                          f"{str(result.rejected[0][1])[:100]}")
+                if result.unsent_rows:
+                    print(f"  Batch error: {str(result.error)[:100]}")
         
     except Exception as e:
         print(f"\nError processing file: {e}")
@@ -190,6 +146,9 @@ def main():
     print(f"Total records imported: {total_imported:,}")
     print(f"Total errors: {total_errors:,}")
     print(f"Average rate: {total_imported/elapsed_time:.0f} records/sec")
+    print(uploader.stats.summary())
+    if dedup:
+        print(dedup.summary())
     
     # Verify data
     if total_imported > 0:
@@ -213,4 +172,9 @@ def main():
             print(f"Error verifying: {e}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Fast import for Detroit sales data')
+    add_upload_arguments(parser, DEAD_LETTER_FILE)
+    add_wire_arguments(parser)
+    add_reader_arguments(parser)
+    add_dedup_arguments(parser)
+    main(parser.parse_args())
\ No newline at end of file
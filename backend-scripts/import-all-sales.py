@@ -3,15 +3,25 @@
 Full import of Detroit sales data
 """
 
+import argparse
 import os
 import sys
-import pandas as pd
-from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import re
 import time
 
+from batch_uploader import add_upload_arguments, uploader_from_args
+from csv_reader import CsvChunkReader, SALES_DTYPES, add_reader_arguments
+from import_checkpoint import ImportJournal, JournalMismatch, add_resume_arguments, max_sales_id
+from import_metrics import add_metrics_arguments, metrics_from_args
+from import_pipeline import ImportPipeline, add_pipeline_arguments
+from sales_dedup import add_dedup_arguments, dedup_from_args
+from sales_delta import DeltaManifest, add_delta_arguments
+from sales_dtypes import COMPACT_PLAN
+from sales_report import add_report_arguments, build_report, print_report, write_report
+from sales_transform import DETAILED_SALES_COLUMNS, transform_keyed, records_for
+from wire_format import add_wire_arguments, writer_from_args
+
 # Load environment variables
 load_dotenv()
 
@@ -22,74 +32,24 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXV
 # File path
 CSV_FILE = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
 
-def clean_text(text):
-    """Clean and standardize text fields"""
-    if pd.isna(text):
-        return None
-    text = str(text).strip()
-    text = re.sub(r'\s+', ' ', text)
-    return text if text else None
+# Checkpoint journal (see import_checkpoint.py)
+JOURNAL_FILE = 'import-all-sales.journal'
 
-def parse_date(date_value):
-    """Parse date from CSV format"""
-    if pd.isna(date_value):
-        return None
-    try:
-        date_str = str(date_value).split(' ')[0]
-        return datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
-    except:
-        return None
+# Fingerprints of the last import for --delta (see sales_delta.py)
+MANIFEST_FILE = 'import-all-sales.manifest.npz'
+DELETIONS_FILE = 'import-all-sales.deleted.csv'
 
-def parse_number(value, is_float=False):
-    """Parse numeric values"""
-    if pd.isna(value):
-        return None
-    try:
-        if is_float:
-            return float(value)
-        else:
-            return int(float(value))
-    except:
-        return None
+# Verification report written after the import (see sales_report.py)
+REPORT_FILE = 'import-all-sales.report.json'
+
+# Rows the database rejected, with its error (see batch_uploader.py)
+DEAD_LETTER_FILE = 'import-all-sales.rejected.jsonl'
 
 def process_batch(df_batch):
     """Process a batch of records"""
-    records = []
-    
-    for _, row in df_batch.iterrows():
-        # Map to existing schema columns
-        record = {
-            'property_address': clean_text(row.get('Street Address')),
-            'seller_name': clean_text(row.get('Grantor')) or 'UNKNOWN SELLER',
-            'buyer_name': clean_text(row.get('Grantee')) or 'UNKNOWN BUYER',
-            'sale_date': parse_date(row.get('Sale Date')),
-            'sale_price': parse_number(row.get('Sale Price'), is_float=True),
-            'parcel_id': clean_text(row.get('Parcel Number')),
-            'sale_terms': clean_text(row.get('Terms of Sale'))
-        }
-        
-        # Store additional data in existing columns if available
-        # Using creative mapping for important fields
-        property_zip = clean_text(row.get('ECF Neighborhood'))
-        if property_zip:
-            record['property_zip'] = property_zip[:10]  # Neighborhood as proxy for area
-            
-        year_str = str(row.get('Sale Date')).split('/')[-1].split(' ')[0]
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2100:
-                record['year_built'] = year  # Using sale year as proxy
-        except:
-            pass
-        
-        # Only include records with required fields
-        if all([record.get('property_address'), record.get('sale_date'), 
-                record.get('sale_price') and record.get('sale_price') > 100]):
-            records.append(record)
-    
-    return records
+    return records_for(df_batch, transform_keyed)
 
-def main():
+def main(args):
     """Main import function"""
     print(f"Starting FULL import from {CSV_FILE}")
     print("This will import all ~477,000 records...")
@@ -111,7 +71,7 @@ def main():
     
     # Get current count
     try:
-        count_result = supabase.table('sales_transactions').select('id', count='exact').execute()
+        count_result = supabase.table('sales_transactions').select('id', count='exact', head=True).execute()
         existing_count = count_result.count
         print(f"Existing records in database: {existing_count:,}")
     except:
@@ -123,59 +83,141 @@ def main():
     batch_size = 500    # Larger batches
     total_imported = 0
     total_errors = 0
-    chunk_num = 0
-    
-    # Count total rows first
-    print("Counting total rows...")
-    total_rows = sum(1 for line in open(CSV_FILE)) - 1
-    print(f"Total rows in file: {total_rows:,}")
     
+    # Find where to start
+    journal = ImportJournal(args.journal, CSV_FILE, chunk_size)
     try:
-        for chunk in pd.read_csv(CSV_FILE, encoding='utf-8-sig', chunksize=chunk_size, low_memory=False):
+        start_row = journal.resume() if args.resume else journal.start()
+    except JournalMismatch as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if start_row:
+        print(f"Resuming after row {start_row:,} ({journal.chunks} chunks, "
+              f"{journal.rows:,} records committed, highest sales_id {journal.max_sales_id})")
+    
+    # Several batches in flight, paced by an adaptive rate controller
+    # instead of a fixed sleep between inserts. Upserting on sales_id makes
+    # replaying a partly-sent chunk after --resume safe.
+    # Per-stage latencies, request bytes and queue depths (--metrics,
+    # --prometheus, --flamegraph)
+    metrics, reporter = metrics_from_args(args)
+    metrics.instrument_client(supabase.postgrest.session)
+    # Columnar batches encoded straight to (gzipped) JSON, unless --encoder client
+    writer = writer_from_args(args, supabase, 'sales_transactions', 'sales_id', metrics)
+    uploader = uploader_from_args(
+        writer or (lambda records: supabase.table('sales_transactions').upsert(records, on_conflict='sales_id').execute()),
+        args, metrics
+    )
+    
+    # With --delta only rows that are new or changed since the last run
+    # are uploaded; the first delta run uploads everything
+    delta = None
+    if args.delta:
+        delta = DeltaManifest(args.manifest, [field for field, _, _ in DETAILED_SALES_COLUMNS])
+        if delta.first_run:
+            print(f"No manifest at {args.manifest}; uploading every row and recording fingerprints")
+    
+    # Reading, transforming (on --workers processes) and uploading overlap;
+    # results still come back in file order for the journal
+    # With --dedup, rows whose sale keys are already in the table or
+    # earlier in the file are dropped before they are sent
+    dedup = dedup_from_args(args, supabase, 'sales_transactions')
+    
+    pipeline = ImportPipeline(transform_keyed, batch_size, args.workers,
+                              select=delta.select if delta else dedup.select if dedup else None,
+                              metrics=metrics, columnar=writer is not None)
+    
+    # One pass over the file, skipping committed rows without converting
+    # them; progress comes from the byte offset
+    reader = CsvChunkReader(CSV_FILE, chunk_size, args.engine, SALES_DTYPES, skip_rows=start_row,
+                            plan=COMPACT_PLAN if args.compact else None)
+    
+    def chunks():
+        """Yield ((chunk, first row, last row, share of file read), filtered chunk)"""
+        chunk_num = start_row // chunk_size
+        for chunk in reader:
             chunk_num += 1
             chunk_start = (chunk_num - 1) * chunk_size + 1
-            chunk_end = min(chunk_num * chunk_size, total_rows)
+            chunk_end = chunk_start + len(chunk) - 1
+            fraction = reader.fraction
             
-            # Filter for meaningful sales
+            # Filter for meaningful sales; one row per sales_id so a batch
+            # never upserts the same key twice
             chunk_filtered = chunk[chunk['Sale Price'] > 100]
+            chunk_filtered = chunk_filtered.drop_duplicates('Sales ID', keep='last')
+            
+            # Chunks with nothing to send still come back as one empty
+            # batch, so they are checkpointed
+            yield (chunk_num, chunk_start, chunk_end, fraction), chunk_filtered
+    
+    checkpointing = True
+    try:
+        chunk_imported = 0
+        chunk_failed = 0
+        chunk_max_id = None
+        for result in pipeline.run(uploader, chunks()):
+            (chunk_num, chunk_start, chunk_end, fraction), _, last = result.key
+            # A batch that failed on its data was split: the rows that
+            # landed count as imported, and rows rejected on their own are
+            # in the dead-letter file rather than holding the checkpoint
+            total_imported += len(result.committed)
+            chunk_imported += len(result.committed)
+            if delta:
+                delta.commit(result.committed)
+            batch_max_id = max_sales_id(result.committed)
+            if batch_max_id is not None:
+                chunk_max_id = max(chunk_max_id or batch_max_id, batch_max_id)
+            if not result.ok:
+                total_errors += result.failed_rows
+                chunk_failed += result.unsent_rows
+                if result.rejected:
+                    print(f"  {len(result.rejected)} rejected rows to {args.dead_letter}: "
+                          f"{str(result.rejected[0][1])[:100]}")
+                if result.unsent_rows:
+                    print(f"  Batch error: {str(result.error)[:100]}")
             
-            if len(chunk_filtered) == 0:
+            if not last:
                 continue
             
-            # Process in batches
-            chunk_imported = 0
-            for i in range(0, len(chunk_filtered), batch_size):
-                batch = chunk_filtered.iloc[i:i+batch_size]
-                records = process_batch(batch)
-                
-                if records:
-                    try:
-                        result = supabase.table('sales_transactions').insert(records).execute()
-                        total_imported += len(records)
-                        chunk_imported += len(records)
-                        
-                    except Exception as e:
-                        total_errors += len(records)
-                        print(f"  Batch error: {str(e)[:100]}")
-                
-                # Rate limiting
-                time.sleep(0.05)
+            # Only advance the checkpoint over chunks that fully landed, so
+            # --resume replays from the first chunk with a failed batch
+            if checkpointing and chunk_failed == 0:
+                journal.commit_chunk(chunk_num, chunk_end, chunk_imported, chunk_max_id)
+            elif checkpointing:
+                checkpointing = False
+                print(f"  Checkpoint held at row {journal.rows_end:,}: chunk {chunk_num} had {chunk_failed} failed records")
             
             # Progress update every chunk
-            overall_progress = chunk_end / total_rows * 100
+            overall_progress = fraction * 100
             elapsed = time.time() - start_time
             rate = total_imported / elapsed if elapsed > 0 else 0
-            eta = (total_rows - chunk_end) / (chunk_size * rate / 60) if rate > 0 else 0
+            eta = (reader.eta_seconds() or 0) / 60
             
             print(f"Chunk {chunk_num}: Processed rows {chunk_start:,}-{chunk_end:,} ({overall_progress:.1f}%) | "
                   f"Imported {chunk_imported} | Total: {total_imported:,} | "
                   f"Rate: {rate:.0f}/sec | ETA: {eta:.1f} min")
+            chunk_imported = 0
+            chunk_failed = 0
+            chunk_max_id = None
                 
     except KeyboardInterrupt:
         print("\n\nImport interrupted by user!")
     except Exception as e:
         print(f"\nError processing file: {e}")
     
+    if not (reader.finished and checkpointing):
+        print(f"\nCommitted through row {journal.rows_end:,} "
+              f"(highest sales_id {journal.max_sales_id}). Rerun with --resume to continue.")
+    
+    if dedup:
+        print(f"\n{dedup.summary()}")
+    
+    if delta:
+        deleted = delta.save(DELETIONS_FILE, complete=reader.finished)
+        print(f"\n{delta.summary()}")
+        if deleted:
+            print(f"Keys no longer in the file written to {DELETIONS_FILE} (not deleted from the database)")
+    
     # Summary
     elapsed_time = time.time() - start_time
     print(f"\n{'='*60}")
@@ -184,33 +226,38 @@ def main():
     print(f"Total errors: {total_errors:,}")
     if elapsed_time > 0:
         print(f"Average rate: {total_imported/elapsed_time:.0f} records/sec")
+    print(uploader.stats.summary())
+    print(pipeline.summary())
+    reporter.run = {'imported': total_imported, 'errors': total_errors,
+                    'elapsed_seconds': round(elapsed_time, 1)}
+    reporter.close()
+    print(metrics.summary())
     
-    # Final verification
+    # Final verification; counts and statistics are computed by the
+    # database rather than by fetching the table
     print("\nVerifying final data...")
     try:
-        count_result = supabase.table('sales_transactions').select('id', count='exact').execute()
-        final_count = count_result.count
-        print(f"Total records now in database: {final_count:,}")
+        report = build_report(supabase, run={
+            'source': CSV_FILE,
+            'imported': total_imported,
+            'errors': total_errors,
+            'elapsed_seconds': round(elapsed_time, 1),
+            'existing_rows': existing_count,
+        })
+        final_count = report['stats']['total_rows']
+        report['import']['net_increase'] = final_count - existing_count
+        write_report(report, args.report)
+        print_report(report)
         print(f"Net increase: {final_count - existing_count:,}")
+        print(f"Report written to {args.report}")
         
         # Show recent sales
         recent = supabase.table('sales_transactions').select('*').order('sale_date', desc=True).limit(5).execute()
         if recent.data:
             print("\nMost recent sales:")
             for sale in recent.data:
-                print(f"  - {sale['property_address']}: ${sale['sale_price']:,.0f} on {sale['sale_date']}")
-                print(f"    From: {sale.get('seller_name', 'Unknown')} To: {sale.get('buyer_name', 'Unknown')}")
-                
-        # Show seller statistics
-        print("\nChecking seller statistics...")
-        sellers = supabase.table('sales_transactions').select('seller_name').execute()
-        if sellers.data:
-            from collections import Counter
-            seller_counts = Counter(s['seller_name'] for s in sellers.data if s.get('seller_name'))
-            print("\nTop 10 sellers by number of sales:")
-            for seller, count in seller_counts.most_common(10):
-                if seller and seller != 'UNKNOWN SELLER':
-                    print(f"  - {seller}: {count} sales")
+                print(f"  - {sale['street_address']}: ${sale['sale_price']:,.0f} on {sale['sale_date']}")
+                print(f"    From: {sale.get('grantor', 'Unknown')} To: {sale.get('grantee', 'Unknown')}")
                     
     except Exception as e:
         print(f"Error in verification: {e}")
@@ -219,9 +266,25 @@ def main():
     print("The sales history feature should now be fully functional.")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Full import of Detroit sales data')
+    add_upload_arguments(parser, DEAD_LETTER_FILE)
+    add_wire_arguments(parser)
+    add_resume_arguments(parser, JOURNAL_FILE)
+    add_reader_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_delta_arguments(parser, MANIFEST_FILE)
+    add_dedup_arguments(parser)
+    add_report_arguments(parser, REPORT_FILE)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.delta and args.dedup:
+        parser.error('--dedup drops every row already in the table, which leaves --delta nothing to compare')
+    if args.delta and args.resume:
+        parser.error('--delta already skips rows that were imported; use it without --resume')
+    
     # Confirm before starting
     response = input("\nThis will import ~477,000 records. Continue? (yes/no): ")
     if response.lower() == 'yes':
-        main()
+        main(args)
     else:
         print("Import cancelled.")
\ No newline at end of file
@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 import re
 
+from sales_snapshot import load_sales
+
 # Load environment variables
 load_dotenv()
 
@@ -73,7 +75,7 @@ def main():
     print("\nReading CSV file...")
     try:
         # Read first 1000 rows to test
-        df = pd.read_csv(CSV_FILE, encoding='utf-8-sig', nrows=1000)
+        df = load_sales(CSV_FILE, nrows=1000)
         print(f"Loaded {len(df)} rows for testing")
         
         # Filter meaningful sales
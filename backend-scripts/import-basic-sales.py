@@ -8,6 +8,7 @@ This script:
 3. Creates a more complete sales history
 """
 
+import argparse
 import os
 import sys
 import pandas as pd
@@ -16,6 +17,9 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 import re
 
+from batch_uploader import add_upload_arguments, uploader_from_args
+from parcel_linker import ParcelLinker
+
 # Load environment variables
 load_dotenv()
 
@@ -54,50 +58,24 @@ def parse_price(price_value):
     except:
         return None
 
-def link_sales_to_owners():
+def link_sales_to_owners(args):
     """Link sales data to parcel owners"""
     print("\nLinking sales to parcel owners...")
     
     # Initialize Supabase client
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
     
-    # Get all sales without proper owner names
-    sales_response = supabase.table('sales_transactions').select('*').eq('seller_name', 'PROPERTY TRANSFER').execute()
-    sales = sales_response.data
-    
-    print(f"Found {len(sales)} sales to link with owners")
-    
-    updated_count = 0
-    for sale in sales:
-        try:
-            # Look up parcel by address
-            address = sale['property_address']
-            parcel_response = supabase.table('parcels').select('*').ilike('address', f"{address}%").limit(1).execute()
-            
-            if parcel_response.data and len(parcel_response.data) > 0:
-                parcel = parcel_response.data[0]
-                
-                # Update the sale with owner information
-                update_data = {
-                    'seller_name': parcel.get('owner_full_name', 'UNKNOWN OWNER'),
-                    'buyer_name': 'BUYER - ' + sale['sale_date'][:4],  # Use year as placeholder
-                    'year_built': parcel.get('year_built'),
-                    'square_feet': parcel.get('total_floor_area'),
-                    'property_zip': parcel.get('zip_code')
-                }
-                
-                # Update the record
-                supabase.table('sales_transactions').update(update_data).eq('id', sale['id']).execute()
-                updated_count += 1
-                
-                if updated_count % 100 == 0:
-                    print(f"Updated {updated_count} records...")
-                    
-        except Exception as e:
-            print(f"Error updating sale {sale['id']}: {e}")
-            continue
+    # One pass over parcels and sales, joined locally, written back in
+    # batches (see parcel_linker.py) instead of two requests per sale
+    linker = ParcelLinker(supabase, sales_filters={'seller_name': 'PROPERTY TRANSFER'})
+    uploader = uploader_from_args(
+        lambda records: supabase.table('sales_transactions').upsert(records, on_conflict='id').execute(),
+        args
+    )
+    report = linker.run(uploader)
     
-    print(f"\nTotal sales linked to owners: {updated_count}")
+    print(f"\n{report.summary()}")
+    print(uploader.stats.summary())
 
 def import_basic_sales():
     """Import basic sales data"""
@@ -174,11 +152,17 @@ def import_basic_sales():
     return total_imported
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import basic sales data and link it to parcel owners')
+    add_upload_arguments(parser)
+    parser.add_argument('--link-only', action='store_true',
+                        help='skip the Excel import and only link existing sales to owners')
+    args = parser.parse_args()
+    
     # First import the basic sales
-    imported_count = import_basic_sales()
+    imported_count = 0 if args.link_only else import_basic_sales()
     
     # Then link to owners if we imported any records
-    if imported_count > 0:
-        link_sales_to_owners()
+    if imported_count > 0 or args.link_only:
+        link_sales_to_owners(args)
     
     print("\nImport process completed!")
\ No newline at end of file
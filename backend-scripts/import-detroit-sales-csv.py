@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 import re
 
+from sales_snapshot import load_sales
+
 # Load environment variables
 load_dotenv()
 
@@ -82,7 +84,7 @@ def import_sales_data():
             'x': 'float64',
             'y': 'float64'
         }
-        df = pd.read_csv(CSV_FILE, encoding='utf-8-sig', dtype=dtype_spec, low_memory=False)
+        df = load_sales(CSV_FILE).astype(dtype_spec)
         print(f"Loaded {len(df)} rows from CSV file")
         print(f"Columns found: {list(df.columns)}")
         
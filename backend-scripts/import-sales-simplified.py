@@ -5,13 +5,13 @@ Simplified import for Detroit sales data - handles schema issues
 
 import os
 import sys
-import pandas as pd
-from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import re
 import time
 
+from csv_reader import CsvChunkReader, SALES_DTYPES
+from sales_transform import transform_simplified, records_for
+
 # Load environment variables
 load_dotenv()
 
@@ -22,59 +22,10 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXV
 # File path
 CSV_FILE = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
 
-def clean_text(text):
-    """Clean and standardize text fields"""
-    if pd.isna(text):
-        return None
-    text = str(text).strip()
-    text = re.sub(r'\s+', ' ', text)
-    return text if text else None
-
-def parse_date(date_value):
-    """Parse various date formats"""
-    if pd.isna(date_value):
-        return None
-    try:
-        # Handle the specific format in this CSV
-        date_str = str(date_value).split(' ')[0]  # Get just the date part
-        return datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
-    except:
-        return None
-
-def parse_number(value, is_float=False):
-    """Parse numeric values"""
-    if pd.isna(value):
-        return None
-    try:
-        if is_float:
-            return float(value)
-        else:
-            return int(float(value))
-    except:
-        return None
-
 def import_sales_batch(df_batch, supabase, batch_num, total_batches):
     """Import a batch of sales records"""
-    records = []
-    
-    for _, row in df_batch.iterrows():
-        # Build a simplified record without ecf_neighborhood for now
-        record = {
-            'sales_id': parse_number(row.get('Sales ID')),
-            'parcel_number': clean_text(row.get('Parcel Number')),
-            'street_address': clean_text(row.get('Street Address')),
-            'sale_date': parse_date(row.get('Sale Date')),
-            'sale_price': parse_number(row.get('Sale Price'), is_float=True),
-            'grantor': clean_text(row.get('Grantor')),  # Seller
-            'grantee': clean_text(row.get('Grantee')),  # Buyer
-            'terms_of_sale': clean_text(row.get('Terms of Sale')),
-            'property_class_code': clean_text(row.get('Property Class Code'))
-        }
-        
-        # Only include records with required fields
-        if all([record.get('street_address'), record.get('sale_date'), 
-                record.get('sale_price'), (record.get('grantor') or record.get('grantee'))]):
-            records.append(record)
+    # Simplified record without ecf_neighborhood for now
+    records = records_for(df_batch, transform_simplified)
     
     if records:
         try:
@@ -118,12 +69,8 @@ def main():
     chunk_num = 0
     
     try:
-        # Count total rows first
-        total_rows = sum(1 for line in open(CSV_FILE)) - 1
-        print(f"Total rows in file: {total_rows:,}")
-        
         # Process chunks
-        for chunk in pd.read_csv(CSV_FILE, encoding='utf-8-sig', chunksize=chunk_size):
+        for chunk in CsvChunkReader(CSV_FILE, chunk_size, dtype=SALES_DTYPES):
             chunk_num += 1
             print(f"\nProcessing chunk {chunk_num} (rows {(chunk_num-1)*chunk_size + 1} to {chunk_num*chunk_size})...")
             
@@ -12,10 +12,10 @@ Requirements:
 import os
 import sys
 import pandas as pd
-from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import re
+
+from sales_transform import transform_resi_workbook, iter_record_batches
 
 # Load environment variables
 load_dotenv()
@@ -27,65 +27,6 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXV
 # File path
 EXCEL_FILE = '../docs/2025 Resi All Transactions.xlsx'
 
-def clean_name(name):
-    """Clean and standardize names"""
-    if pd.isna(name):
-        return None
-    name = str(name).strip().upper()
-    # Remove extra spaces
-    name = re.sub(r'\s+', ' ', name)
-    return name
-
-def clean_address(address):
-    """Clean and standardize addresses"""
-    if pd.isna(address):
-        return None
-    address = str(address).strip().upper()
-    # Remove extra spaces
-    address = re.sub(r'\s+', ' ', address)
-    return address
-
-def parse_date(date_value):
-    """Parse various date formats"""
-    if pd.isna(date_value):
-        return None
-    try:
-        if isinstance(date_value, datetime):
-            return date_value.strftime('%Y-%m-%d')
-        elif isinstance(date_value, str):
-            # Try common date formats
-            for fmt in ['%m/%d/%Y', '%Y-%m-%d', '%m-%d-%Y', '%Y/%m/%d']:
-                try:
-                    return datetime.strptime(date_value, fmt).strftime('%Y-%m-%d')
-                except:
-                    continue
-        return None
-    except:
-        return None
-
-def parse_price(price_value):
-    """Parse price values, removing $ and commas"""
-    if pd.isna(price_value):
-        return None
-    try:
-        if isinstance(price_value, (int, float)):
-            return float(price_value)
-        elif isinstance(price_value, str):
-            # Remove $, commas, and spaces
-            cleaned = re.sub(r'[\$,\s]', '', price_value)
-            return float(cleaned) if cleaned else None
-    except:
-        return None
-
-def parse_number(value):
-    """Parse numeric values"""
-    if pd.isna(value):
-        return None
-    try:
-        return int(float(value))
-    except:
-        return None
-
 def import_sales_transactions():
     """Main import function"""
     print(f"Starting import from {EXCEL_FILE}")
@@ -144,87 +85,9 @@ def import_sales_transactions():
         for col in df.columns:
             print(f"  {col}: {df.iloc[0][col]}")
     
-    # Process each row
-    for i in range(0, len(df), batch_size):
-        batch = df.iloc[i:i+batch_size]
-        batch_data = []
-        
-        for _, row in batch.iterrows():
-            try:
-                # Build record based on available columns
-                record = {}
-                
-                # Map the actual Excel columns we found
-                # Required fields
-                if 'Street Address' in df.columns:
-                    record['property_address'] = clean_address(row.get('Street Address'))
-                
-                # For this dataset, we need to generate seller/buyer names from transaction type
-                # Since this appears to be a property transfer dataset without explicit seller/buyer
-                record['seller_name'] = 'PROPERTY TRANSFER'  # Default for now
-                record['buyer_name'] = 'NEW OWNER'  # Default for now
-                
-                if 'Sale Date' in df.columns:
-                    record['sale_date'] = parse_date(row.get('Sale Date'))
-                
-                if 'Sale Price' in df.columns:
-                    record['sale_price'] = parse_price(row.get('Sale Price'))
-                
-                # Skip if required fields are missing or price is too low (likely not a real sale)
-                if not all([record.get('property_address'), record.get('sale_date'), 
-                           record.get('sale_price')]):
-                    continue
-                    
-                # Skip if sale price is less than $100 (likely not a real sale)
-                if record.get('sale_price', 0) < 100:
-                    continue
-                
-                # Optional fields
-                # Map parcel number
-                if 'Parcel Number' in df.columns:
-                    record['parcel_id'] = str(row.get('Parcel Number'))
-                
-                # Map terms of sale
-                if 'Terms of Sale' in df.columns:
-                    record['sale_terms'] = str(row.get('Terms of Sale'))
-                
-                # Additional mappings if available
-                optional_mappings = {
-                    'Property Type': 'property_type',
-                    'Type': 'property_type',
-                    'Year Built': 'year_built',
-                    'Year': 'year_built',
-                    'Square Feet': 'square_feet',
-                    'Sq Ft': 'square_feet',
-                    'Bedrooms': 'bedrooms',
-                    'Beds': 'bedrooms',
-                    'Bathrooms': 'bathrooms',
-                    'Baths': 'bathrooms',
-                    'ZIP': 'property_zip',
-                    'Zip Code': 'property_zip',
-                    'ECF Area': 'property_zip'  # ECF Area might contain zip info
-                }
-                
-                for excel_col, db_col in optional_mappings.items():
-                    if excel_col in df.columns:
-                        if db_col in ['year_built', 'square_feet', 'bedrooms']:
-                            record[db_col] = parse_number(row.get(excel_col))
-                        elif db_col == 'bathrooms':
-                            val = row.get(excel_col)
-                            if pd.notna(val):
-                                try:
-                                    record[db_col] = float(val)
-                                except:
-                                    pass
-                        else:
-                            record[db_col] = str(row.get(excel_col)) if pd.notna(row.get(excel_col)) else None
-                
-                batch_data.append(record)
-                
-            except Exception as e:
-                errors.append(f"Row {i + _}: {str(e)}")
-                continue
-        
+    # Build records a batch at a time; required fields, the $100 minimum and
+    # the optional column mappings are applied column-wise in sales_transform
+    for i, batch_data in iter_record_batches(df, transform_resi_workbook, batch_size):
         # Insert batch into database
         if batch_data:
             try:
@@ -12,6 +12,8 @@ from supabase import create_client, Client
 import re
 import time
 
+from csv_reader import CsvChunkReader, SALES_DTYPES
+
 # Load environment variables
 load_dotenv()
 
@@ -118,7 +120,7 @@ def main():
         # Process first chunk as a test
         print("Testing with first chunk...")
         
-        for chunk in pd.read_csv(CSV_FILE, encoding='utf-8-sig', chunksize=chunk_size, low_memory=False):
+        for chunk in CsvChunkReader(CSV_FILE, chunk_size, dtype=SALES_DTYPES):
             chunk_num += 1
             
             # Filter for meaningful sales
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal for resumable sales imports
+
+The journal is an append-only JSON-lines file. The first line describes the
+run (source file, its size and the chunk size); every following line records
+a chunk whose batches were all acknowledged by the database:
+
+    {"type": "start", "source": "...", "size": 123456789, "chunk_size": 10000, ...}
+    {"type": "chunk", "chunk": 1, "rows_end": 10000, "rows": 9123, "max_sales_id": 40211, ...}
+
+Each line is flushed and fsync'd before the import moves on, so after a crash
+or Ctrl+C the journal never claims more than the database has. A torn last
+line (power loss mid-write) is ignored when the journal is read back.
+
+Usage (run from backend-scripts/):
+
+    journal = ImportJournal('import-all-sales.journal', CSV_FILE, chunk_size)
+    start_row = journal.resume() if args.resume else journal.start()
+    ...
+    journal.commit_chunk(chunk_num, rows_end, rows, max_sales_id)
+"""
+
+import json
+import os
+from datetime import datetime
+
+
+class JournalMismatch(Exception):
+    """The journal was written for a different file or chunk size"""
+
+
+class ImportJournal:
+    """Committed chunk offsets and the highest acknowledged sales_id"""
+
+    def __init__(self, path, source, chunk_size):
+        self.path = path
+        self.source = source
+        self.chunk_size = chunk_size
+        self.rows_end = 0
+        self.max_sales_id = None
+        self.chunks = 0
+        self.rows = 0
+
+    def _header(self):
+        return {
+            'type': 'start',
+            'source': os.path.abspath(self.source),
+            'size': os.path.getsize(self.source),
+            'chunk_size': self.chunk_size,
+            'started': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def _append(self, entry, mode='a'):
+        with open(self.path, mode) as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self):
+        """Begin a fresh journal (discarding any previous one); returns row 0"""
+        self.rows_end = 0
+        self.max_sales_id = None
+        self.chunks = 0
+        self.rows = 0
+        self._append(self._header(), mode='w')
+        return 0
+
+    def resume(self):
+        """Load an existing journal; returns the first uncommitted data row.
+
+        Starts a fresh journal if none exists. Raises JournalMismatch if the
+        source file changed size or the chunk size differs, since the saved
+        offsets would then point at the wrong rows.
+        """
+        if not os.path.exists(self.path):
+            return self.start()
+
+        entries = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # torn write at the end of the file
+
+        if not entries or entries[0].get('type') != 'start':
+            raise JournalMismatch(f"{self.path} is not an import journal")
+        header, current = entries[0], self._header()
+        for field in ('source', 'size', 'chunk_size'):
+            if header.get(field) != current[field]:
+                raise JournalMismatch(
+                    f"{self.path} was written for {field}={header.get(field)!r}, "
+                    f"now {current[field]!r}; rerun without --resume to start over")
+
+        for entry in entries[1:]:
+            if entry.get('type') != 'chunk':
+                continue
+            self.chunks += 1
+            self.rows += entry.get('rows', 0)
+            self.rows_end = max(self.rows_end, entry['rows_end'])
+            sales_id = entry.get('max_sales_id')
+            if sales_id is not None and (self.max_sales_id is None or sales_id > self.max_sales_id):
+                self.max_sales_id = sales_id
+        return self.rows_end
+
+    def commit_chunk(self, chunk, rows_end, rows, max_sales_id=None):
+        """Record that every batch for data rows up to rows_end is in the database"""
+        if max_sales_id is not None and (self.max_sales_id is None or max_sales_id > self.max_sales_id):
+            self.max_sales_id = max_sales_id
+        self.rows_end = rows_end
+        self.chunks += 1
+        self.rows += rows
+        self._append({
+            'type': 'chunk',
+            'chunk': chunk,
+            'rows_end': rows_end,
+            'rows': rows,
+            'max_sales_id': max_sales_id,
+            'at': datetime.now().isoformat(timespec='seconds'),
+        })
+
+
+def max_sales_id(records):
+    """Largest sales_id in a batch of records, or None"""
+    ids = [record['sales_id'] for record in records if record.get('sales_id') is not None]
+    return max(ids) if ids else None
+
+def add_resume_arguments(parser, default_journal):
+    """Add the shared --resume/--journal options to an importer's CLI"""
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the last committed chunk in the journal')
+    parser.add_argument('--journal', default=default_journal,
+                        help=f'checkpoint journal path (default: {default_journal})')
+    return parser
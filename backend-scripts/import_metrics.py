@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and throughput metrics for the sales importers
+
+The importers print one overall rate, which does not say whether a slow run
+is waiting on parsing, the transform, JSON encoding, HTTP or the database.
+ImportMetrics collects, from the pipeline and the uploader:
+
+  latency histograms (seconds)
+    read       next chunk from the source, including the importer's prepare step
+    transform  the vectorized transform of one chunk (in a worker)
+    serialize  record dicts and batches for one chunk
+    encode     send() called until httpx has the request body: query
+               building and JSON encoding in the supabase client, or
+               encoding and gzip in wire_format.JsonWriter
+    http       request sent until the response headers arrive (network,
+               PostgREST and the database)
+    request    one whole send() attempt
+    batch      a batch from first attempt to final result, retries included
+  size histograms      records per batch, request body bytes (as sent, and
+                       as JSON before gzip)
+  counters             batches, records, payload and JSON bytes, retries,
+                       failures, responses by status
+  queue depths         transformed chunks waiting for the serializer, and
+                       batches held by the uploader (last, mean and max)
+
+MetricsReporter writes a snapshot every --metrics-interval seconds as a
+JSON line (--metrics) and as a Prometheus text file (--prometheus, the
+node_exporter textfile format), plus a final one at the end. With
+--flamegraph, every transform call is sampled by StackSampler (a pure-Python
+sampling profiler, in the worker processes too) and the merged stacks are
+written as a flamegraph SVG, with the folded stacks beside it for
+flamegraph.pl or speedscope.
+
+Usage (run from backend-scripts/):
+
+    metrics, reporter = metrics_from_args(args)     # add_metrics_arguments(parser)
+    metrics.instrument_client(supabase.postgrest.session)
+    uploader = uploader_from_args(send, args, metrics)
+    pipeline = ImportPipeline(transform, 500, args.workers, metrics=metrics)
+    try:
+        ...
+    finally:
+        reporter.close()
+    print(metrics.summary())
+"""
+
+import bisect
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+LATENCY_STAGES = ('read', 'transform', 'serialize', 'encode', 'http', 'request', 'batch')
+
+# Seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Records or bytes: powers of 4 from 1 to 16M
+SIZE_BUCKETS = tuple(4 ** power for power in range(13))
+
+PREFIX = 'sales_import'
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style) with count, sum and max"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th value (max for the last)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 6),
+        }
+
+
+class Gauge:
+    """A sampled level (queue depth): last, mean and max of the samples"""
+
+    def __init__(self):
+        self.last = 0
+        self.max = 0
+        self.total = 0
+        self.samples = 0
+
+    def set(self, value):
+        self.last = value
+        self.max = max(self.max, value)
+        self.total += value
+        self.samples += 1
+
+    def snapshot(self):
+        mean = self.total / self.samples if self.samples else 0
+        return {'last': self.last, 'mean': round(mean, 2), 'max': self.max}
+
+
+class ImportMetrics:
+    """Thread-safe collection of the import's histograms, counters and gauges.
+
+    sample_interval (seconds) turns on stack sampling of the transform
+    stage; the pipeline passes it to its workers and hands the stacks back
+    through add_stacks().
+    """
+
+    def __init__(self, sample_interval=None):
+        self.started = time.monotonic()
+        self.sample_interval = sample_interval
+        self.latency = {}
+        self.sizes = {}
+        self.counters = collections.Counter()
+        self.gauges = {}
+        self.stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self.latency:
+                self.latency[stage] = Histogram(LATENCY_BUCKETS)
+            self.latency[stage].observe(seconds)
+
+    def observe_size(self, name, value):
+        with self._lock:
+            if name not in self.sizes:
+                self.sizes[name] = Histogram(SIZE_BUCKETS)
+            self.sizes[name].observe(value)
+
+    def count(self, name, value=1, **labels):
+        """Add to a counter; labels become part of its series name"""
+        if labels:
+            name += '{' + ','.join(f'{key}="{labels[key]}"' for key in sorted(labels)) + '}'
+        with self._lock:
+            self.counters[name] += value
+
+    def gauge(self, name, value):
+        with self._lock:
+            if name not in self.gauges:
+                self.gauges[name] = Gauge()
+            self.gauges[name].set(value)
+
+    def add_stacks(self, stacks):
+        with self._lock:
+            self.stacks.update(stacks)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    # The uploader marks the start of each send() attempt; the httpx hooks
+    # below run on the same thread and split it into encode and http
+    def attempt_started(self):
+        self._local.started = time.perf_counter()
+        self._local.sent = None
+
+    def instrument_client(self, session):
+        """Add event hooks to an httpx.Client (supabase.postgrest.session)
+        that time encode and http and count request bytes and statuses"""
+
+        def on_request(request):
+            now = time.perf_counter()
+            started = getattr(self._local, 'started', None)
+            if started is not None:
+                self.observe('encode', now - started)
+            self._local.sent = now
+            size = len(request.content)
+            self.count('payload_bytes', size)
+            self.observe_size('payload_bytes', size)
+
+        def on_response(response):
+            sent = getattr(self._local, 'sent', None)
+            if sent is not None:
+                self.observe('http', time.perf_counter() - sent)
+            self.count('responses', status=response.status_code)
+
+        session.event_hooks['request'].append(on_request)
+        session.event_hooks['response'].append(on_response)
+        return session
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def snapshot(self):
+        """JSON-ready copy of every metric"""
+        with self._lock:
+            return {
+                'elapsed_seconds': round(self.elapsed, 3),
+                'latency': {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+                'sizes': {name: histogram.snapshot() for name, histogram in self.sizes.items()},
+                'counters': dict(self.counters),
+                'gauges': {name: gauge.snapshot() for name, gauge in self.gauges.items()},
+            }
+
+    def summary(self):
+        """e.g. 'Stage latency mean/p95: read 41/100ms | transform 120/250ms | ...'"""
+        with self._lock:
+            stages = [(stage, self.latency[stage]) for stage in LATENCY_STAGES if stage in self.latency]
+            depths = {name: gauge.snapshot() for name, gauge in self.gauges.items()}
+            sent = self.counters.get('payload_bytes', 0)
+            encoded = self.counters.get('json_bytes', 0)
+        parts = [f"{stage} {histogram.sum / histogram.count * 1000:,.0f}/"
+                 f"{histogram.quantile(0.95) * 1000:,.0f}ms" for stage, histogram in stages if histogram.count]
+        line = 'Stage latency mean/p95: ' + (' | '.join(parts) if parts else 'none recorded')
+        if sent:
+            line += f"\nSent {sent / 1e6:,.1f} MB of request bodies"
+            if encoded > sent:
+                line += f" ({encoded / 1e6:,.1f} MB of JSON, {encoded / sent:.1f}x smaller compressed)"
+        if depths:
+            line += '\nQueue depth mean/max: ' + ' | '.join(
+                f"{name} {depth['mean']:.1f}/{depth['max']}" for name, depth in depths.items())
+        return line
+
+
+def prometheus_text(metrics, prefix=PREFIX):
+    """The metrics in the Prometheus text exposition format"""
+    lines = []
+    with metrics._lock:
+        lines += [f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, histogram in metrics.latency.items():
+            lines += _histogram_lines(f"{prefix}_stage_seconds", f'stage="{stage}"', histogram)
+        for name, histogram in metrics.sizes.items():
+            lines += [f"# TYPE {prefix}_{name} histogram"]
+            lines += _histogram_lines(f"{prefix}_{name}", '', histogram)
+        typed = set()
+        for series, value in sorted(metrics.counters.items()):
+            name, _, labels = series.partition('{')
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total{'{' + labels if labels else ''} {value}")
+        if metrics.gauges:
+            lines += [f"# TYPE {prefix}_queue_depth gauge", f"# TYPE {prefix}_queue_depth_max gauge"]
+        for name, gauge in metrics.gauges.items():
+            lines.append(f'{prefix}_queue_depth{{queue="{name}"}} {gauge.last}')
+            lines.append(f'{prefix}_queue_depth_max{{queue="{name}"}} {gauge.max}')
+        lines.append(f"{prefix}_elapsed_seconds {metrics.elapsed:.3f}")
+    return '\n'.join(lines) + '\n'
+
+def _histogram_lines(name, labels, histogram):
+    joined = labels + ',' if labels else ''
+    lines, cumulative = [], 0
+    for bound, count in zip(histogram.bounds + ('+Inf',), histogram.buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{joined}le="{bound}"}} {cumulative}')
+    suffix = f"{{{labels}}}" if labels else ''
+    lines.append(f"{name}_sum{suffix} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+def _write_atomic(path, text):
+    """Replace path in one step, so a scraper never reads half a file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+class StackSampler:
+    """Sampling profiler for one thread: every interval seconds the thread's
+    Python stack is read with sys._current_frames() and counted in folded
+    form ('outer;inner;innermost'). Use as a context manager around the code
+    to profile; it samples the thread that entered it."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+def write_flamegraph(stacks, path, title='transform stage'):
+    """Write the folded stacks to <path>.folded and a flamegraph SVG to path"""
+    base = os.path.splitext(path)[0]
+    with open(f"{base}.folded", 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    # Merge the stacks into a tree: name -> [samples, children]
+    root = [0, {}]
+    for stack, count in stacks.items():
+        node = root
+        node[0] += count
+        for name in stack.split(';'):
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+    total = root[0] or 1
+
+    width, row = 1200, 17
+    rectangles = []
+
+    def place(children, x, depth):
+        for name, (count, grandchildren) in sorted(children.items()):
+            w = count / total * (width - 20)
+            if w >= 0.5:
+                rectangles.append((x, depth, w, name, count))
+                place(grandchildren, x, depth + 1)
+            x += w
+
+    place(root[1], 10.0, 0)
+    depth = max((rectangle[1] for rectangle in rectangles), default=0) + 1
+    height = depth * row + 50
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="Verdana" font-size="11">',
+             '<rect width="100%" height="100%" fill="#f8f8f8"/>',
+             f'<text x="{width / 2}" y="20" text-anchor="middle" font-size="15">'
+             f'{escape(title)} ({total:,} samples)</text>']
+    for x, level, w, name, count in rectangles:
+        y = height - 10 - (level + 1) * row
+        hue = zlib.crc32(name.encode()) % 60
+        label = escape(name[:int(w / 7)]) if w > 21 else ''
+        parts.append(f'<g><title>{escape(name)}: {count:,} samples ({count / total:.1%})</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                     f'fill="hsl({hue}, 85%, 60%)"/>'
+                     f'<text x="{x + 3:.1f}" y="{y + row - 5}">{label}</text></g>')
+    parts.append('</svg>')
+    with open(path, 'w') as f:
+        f.write('\n'.join(parts))
+
+
+class MetricsReporter:
+    """Writes snapshots of an ImportMetrics every `interval` seconds on a
+    background thread (JSON lines and/or a Prometheus text file), and the
+    final snapshot and the flamegraph on close()."""
+
+    def __init__(self, metrics, jsonl=None, prometheus=None, interval=10.0, flamegraph=None, run=None):
+        self.metrics = metrics
+        self.jsonl = jsonl
+        self.prometheus = prometheus
+        self.interval = interval
+        self.flamegraph = flamegraph
+        self.run = run or {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+
+    def start(self):
+        if self.jsonl:
+            self._file = open(self.jsonl, 'a')
+        if self.jsonl or self.prometheus:
+            self._thread = threading.Thread(target=self._loop, name='metrics-reporter', daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write('interval')
+
+    def write(self, event):
+        if self._file is not None:
+            line = {'time': datetime.now().isoformat(timespec='seconds'), 'event': event}
+            if event == 'final':
+                line['run'] = self.run
+            line.update(self.metrics.snapshot())
+            self._file.write(json.dumps(line) + '\n')
+            self._file.flush()
+        if self.prometheus:
+            _write_atomic(self.prometheus, prometheus_text(self.metrics))
+
+    def close(self):
+        """Stop the background writer and write the final snapshot"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write('final')
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.flamegraph and self.metrics.stacks:
+            write_flamegraph(self.metrics.stacks, self.flamegraph)
+            print(f"Transform flamegraph written to {self.flamegraph} "
+                  f"({sum(self.metrics.stacks.values()):,} samples)")
+
+
+def add_metrics_arguments(parser):
+    """Add the shared --metrics/--prometheus/--flamegraph options to an importer's CLI"""
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='append per-stage metrics snapshots to FILE as JSON lines')
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help='seconds between metrics snapshots (default: 10)')
+    parser.add_argument('--prometheus', metavar='FILE',
+                        help='keep FILE updated with the metrics in Prometheus text format')
+    parser.add_argument('--flamegraph', metavar='SVG',
+                        help='sample the transform stage and write a flamegraph SVG (and .folded stacks)')
+    parser.add_argument('--sample-ms', type=float, default=5.0,
+                        help='stack sampling interval for --flamegraph (default: 5)')
+    return parser
+
+def metrics_from_args(args, run=None):
+    """(ImportMetrics, started MetricsReporter) from add_metrics_arguments() options"""
+    metrics = ImportMetrics(sample_interval=args.sample_ms / 1000 if args.flamegraph else None)
+    reporter = MetricsReporter(metrics, args.metrics, args.prometheus, args.metrics_interval,
+                               args.flamegraph, run)
+    return metrics, reporter.start()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Staged, multi-core import pipeline
+
+The importers read a chunk, transform it, build the records and upload them
+one step after another in a single process, so at any moment only one of
+those is running. ImportPipeline overlaps them:
+
+    reader ──queue──> transform workers ──in order──> serializer ──> uploader
+    (thread)          (process pool)                  (this thread)  (BatchUploader)
+
+  reader      pulls chunks from the CSV reader and runs the caller's cheap
+              per-chunk prepare step (filters, progress bookkeeping)
+  transform   runs the vectorized sales_transform function in worker
+              processes, one chunk per task, returning only the kept rows
+  serializer  turns transformed columns into batch_size-record batches
+              (and applies an optional in-process select step, e.g. the
+              delta manifest); with columnar=True the batches are
+              ColumnBatch slices for a wire_format.JsonWriter
+  uploader    BatchUploader with its own concurrency and rate control
+
+The queue between reader and serializer is bounded, so at most `prefetch`
+chunks are held in memory however far the reader could run ahead. Chunks
+are collected in the order they were read, so batches reach the uploader,
+and results reach the caller, in file order and checkpoints stay valid.
+
+At the end, summary() reports how busy each stage was, which shows the
+bottleneck stage. Per-chunk latencies, the depth of the chunk queue and,
+when sampling is on, the transform's stacks go to `metrics` (an
+ImportMetrics, see import_metrics.py).
+
+Usage (run from backend-scripts/):
+
+    pipeline = ImportPipeline(transform_keyed, batch_size=500, workers=4)
+    chunks = ((chunk_info, chunk_df) for chunk_df in reader)
+    for result in pipeline.run(uploader, chunks):
+        (chunk_info, offset, last) = result.key
+        ...
+    print(pipeline.summary())
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from import_metrics import ImportMetrics, StackSampler
+from sales_transform import iter_kept_batches, to_records
+from wire_format import column_batch
+
+# Poll interval for queue operations, so a stopped pipeline is noticed
+_TICK = 0.1
+
+
+class TransformedChunk:
+    """What a worker sends back: the kept rows' columns and their positions"""
+
+    def __init__(self, columns, positions, rows, omit_none, seconds, stacks=None):
+        self.columns = columns
+        self.positions = positions
+        self.rows = rows
+        self.omit_none = omit_none
+        self.seconds = seconds
+        self.stacks = stacks
+
+def transform_chunk(transform, df, sample_interval=None):
+    """Worker task: run transform on a chunk and keep only the kept rows.
+    With sample_interval the call is stack-sampled and the stacks returned."""
+    started = time.perf_counter()
+    sampler = None
+    if sample_interval:
+        with StackSampler(sample_interval) as sampler:
+            transformed = transform(df)
+    else:
+        transformed = transform(df)
+    columns, keep = transformed[:2]
+    omit_none = transformed[2] if len(transformed) > 2 else ()
+    positions = np.flatnonzero(keep)
+    kept = {field: values[positions] for field, values in columns.items()}
+    return TransformedChunk(kept, positions, len(df), omit_none, time.perf_counter() - started,
+                            sampler.stacks if sampler else None)
+
+
+class StageStats:
+    """Time a stage spent working and waiting on its neighbours"""
+
+    def __init__(self, name, capacity=1):
+        self.name = name
+        self.capacity = capacity  # parallel slots (workers, uploads in flight)
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.items = 0
+
+    def utilization(self, wall):
+        return self.busy / (wall * self.capacity) if wall > 0 else 0.0
+
+    def describe(self, wall):
+        slots = f" of {self.capacity}" if self.capacity > 1 else ''
+        waiting = f", {self.waiting / wall:.0%} waiting" if self.waiting and wall > 0 else ''
+        return f"{self.name} {self.utilization(wall):.0%} busy{slots}{waiting} ({self.items:,})"
+
+
+class ImportPipeline:
+    """Reader thread -> transform process pool -> serializer -> uploader.
+
+    transform must be a module-level function (it is pickled to the
+    workers). workers=1 transforms in the reader thread without a pool.
+    select(columns, keep) -> (columns, keep), if given, runs in this process
+    on each transformed chunk before its batches are built. columnar=True
+    yields ColumnBatch batches instead of record dict lists.
+    """
+
+    def __init__(self, transform, batch_size=500, workers=None, prefetch=None, select=None,
+                 metrics=None, columnar=False):
+        self.transform = transform
+        self.batch_size = batch_size
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.prefetch = prefetch or 2 * self.workers
+        self.select = select
+        self.build = column_batch if columnar else to_records
+        self.metrics = metrics if metrics is not None else ImportMetrics()
+        self.reader = StageStats('reader')
+        self.transformer = StageStats('transform', self.workers)
+        self.serializer = StageStats('serializer')
+        self.uploader = StageStats('upload')
+        self.started = None
+        self.finished = None
+
+    @property
+    def stages(self):
+        return (self.reader, self.transformer, self.serializer, self.uploader)
+
+    def _executor(self):
+        if self.workers == 1:
+            return None
+        # Workers are started from the reader thread; forking a process that
+        # is running threads can deadlock, so start them from a clean one
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            # Workers fork from a server that already imported pandas, so
+            # they start in milliseconds instead of re-importing it each
+            context.set_forkserver_preload(['sales_transform'])
+        else:
+            context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def _read(self, items, pending, stop, errors, pool):
+        """Reader thread: prepare chunks and hand them to the workers"""
+        try:
+            iterator = iter(items)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    info, df = next(iterator)
+                except StopIteration:
+                    break
+                self.reader.busy += time.perf_counter() - started
+                self.reader.items += 1
+                self.metrics.observe('read', time.perf_counter() - started)
+                sample_interval = self.metrics.sample_interval
+                if pool is None:
+                    future = Future()
+                    future.set_result(transform_chunk(self.transform, df, sample_interval))
+                else:
+                    future = pool.submit(transform_chunk, self.transform, df, sample_interval)
+
+                started = time.perf_counter()
+                while not stop.is_set():
+                    try:
+                        pending.put((info, future), timeout=_TICK)
+                        break
+                    except queue.Full:
+                        continue
+                self.reader.waiting += time.perf_counter() - started
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            while not stop.is_set():
+                try:
+                    pending.put(None, timeout=_TICK)
+                    break
+                except queue.Full:
+                    continue
+
+    def batches(self, items):
+        """Yield ((info, offset, last), records) for (info, chunk) items, in order.
+
+        Every chunk yields at least one batch (an empty one if no rows were
+        kept) and its final batch has last=True.
+        """
+        pending = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        errors = []
+        pool = self._executor()
+        self.started = time.monotonic()
+        reader = threading.Thread(target=self._read, args=(items, pending, stop, errors, pool),
+                                  name='pipeline-reader', daemon=True)
+        reader.start()
+        try:
+            while True:
+                waited = time.perf_counter()
+                self.metrics.gauge('transform_queue', pending.qsize())
+                entry = pending.get()
+                if entry is None:
+                    break
+                info, future = entry
+                chunk = future.result()
+                self.serializer.waiting += time.perf_counter() - waited
+                self.transformer.busy += chunk.seconds
+                self.transformer.items += 1
+                self.metrics.observe('transform', chunk.seconds)
+                if chunk.stacks:
+                    self.metrics.add_stacks(chunk.stacks)
+
+                started = time.perf_counter()
+                columns, positions = chunk.columns, chunk.positions
+                if self.select is not None:
+                    columns, keep = self.select(columns, np.ones(len(positions), dtype=bool))
+                    columns = {field: values[keep] for field, values in columns.items()}
+                    positions = positions[keep]
+                batches = list(iter_kept_batches(columns, positions, chunk.rows, self.batch_size,
+                                                 chunk.omit_none, self.build)) or [(0, [])]
+                self.serializer.busy += time.perf_counter() - started
+                self.serializer.items += 1
+                self.metrics.observe('serialize', time.perf_counter() - started)
+                for number, (offset, records) in enumerate(batches):
+                    yield (info, offset, number == len(batches) - 1), records
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            reader.join()
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            self.finished = time.monotonic()
+
+    def run(self, uploader, items):
+        """Upload every batch of items with uploader; yields BatchResults in order"""
+        self.uploader.capacity = uploader.max_in_flight
+        try:
+            for result in uploader.upload(self.batches(items)):
+                self.uploader.busy += result.seconds
+                self.uploader.items += 1
+                yield result
+        finally:
+            self.finished = time.monotonic()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self):
+        """e.g. 'Pipeline (4 workers, 61.2s): reader 8% busy | transform 71% busy of 4 ...'"""
+        wall = self.elapsed
+        busiest = max(self.stages, key=lambda stage: stage.utilization(wall))
+        return (f"Pipeline ({self.workers} worker{'s' if self.workers != 1 else ''}, {wall:.1f}s): "
+                + ' | '.join(stage.describe(wall) for stage in self.stages)
+                + f" | bottleneck: {busiest.name}")
+
+
+def add_pipeline_arguments(parser):
+    """Add the shared --workers option to an importer's CLI"""
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='transform worker processes (default: one per CPU; 1 = no pool)')
+    return parser
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Read-only SQL over a local snapshot of sales_transactions and parcels
+
+api/market/execute-sql.js turns the SQL that generate-sql.js writes back
+into Supabase query-builder calls with regular expressions. It rejects
+JOINs, UNIONs and subqueries, ignores GROUP BY and any condition its
+patterns miss, and every query is a remote scan. MarketQueryEngine runs the
+generated SELECT as written, in DuckDB, over a columnar copy of the two
+tables:
+
+  build    pages both tables out of Supabase (keyset on id, see
+           parcel_linker.iter_pages) into one Parquet file each; columns
+           named *_date become DATE and *_at TIMESTAMP (UTC)
+  load     the files are read into an in-memory DuckDB database. The
+           generated SQL refers to the parcel of a sale as parcels.<column>
+           without a join (execute-sql.js embeds it), so sales_transactions
+           gets a `parcels` column holding the matching parcels row (on the
+           normalized parcel number, as parcel_linker joins them). The
+           parcels table is there as well for explicit JOINs. Old-layout
+           names the prompt still uses (buyer_name, seller_name,
+           property_address, sale_terms) are added as aliases of
+           grantee/grantor/street_address/terms_of_sale when the table has
+           only the new ones, and the other way round
+  execute  one SELECT per request: anything else, or more than one
+           statement, is refused before it runs. File and network access
+           are switched off and the settings locked once the snapshot is
+           loaded. A query still running after `timeout` seconds is
+           interrupted, and at most max_rows rows are returned
+
+Results have the execute-sql.js response shape (data, rowCount, sql,
+executionTime), with the parcels column flattened into parcel_<column>
+fields as that handler does, so the page can point at serve() instead.
+
+Requires duckdb (pip install duckdb) and pyarrow.
+
+Usage (run from backend-scripts/):
+
+    python3 market_query.py build                    # refresh the snapshot from Supabase
+    python3 market_query.py query "SELECT grantee, COUNT(*) AS n FROM sales_transactions GROUP BY 1 ORDER BY n DESC LIMIT 5"
+    python3 market_query.py serve --port 8787 --timeout 5
+
+    engine = MarketQueryEngine(SNAPSHOT_DIR, timeout=5)
+    result = engine.execute(sql)
+"""
+
+import argparse
+import datetime as dt
+import decimal
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from parcel_linker import PAGE_SIZE, iter_pages
+
+SNAPSHOT_DIR = os.getenv('MARKET_SNAPSHOT_DIR') or '../docs/.snapshots/market'
+
+SALES = 'sales_transactions'
+PARCELS = 'parcels'
+TABLES = (SALES, PARCELS)
+
+# (old layout name, updated-sales-schema.sql name); whichever the table
+# lacks is added as an alias of the other
+COLUMN_ALIASES = (
+    ('buyer_name', 'grantee'),
+    ('seller_name', 'grantor'),
+    ('property_address', 'street_address'),
+    ('sale_terms', 'terms_of_sale'),
+)
+
+# Left out of the flattened parcel_<column> fields, as in execute-sql.js
+PARCEL_METADATA = ('created_at', 'updated_at', 'id', 'data_source', 'sync_status')
+
+# Rows written per Parquet part while paging a table out
+_PART_ROWS = 50000
+
+_METADATA = 'snapshot.json'
+
+
+class QueryRejected(ValueError):
+    """The SQL is not a single SELECT"""
+
+class QueryTimeout(RuntimeError):
+    """The query ran past the engine's timeout and was interrupted"""
+
+
+def _require_duckdb():
+    if duckdb is None:
+        raise SystemExit("The market query engine needs duckdb: pip install duckdb")
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _parcel_key(column):
+    """SQL for normalize_parcel_ids() in parcel_linker.py"""
+    return (f"NULLIF(ltrim(regexp_replace(upper(trim(CAST({column} AS VARCHAR))), "
+            f"'\\.0?$', ''), '0'), '')")
+
+
+# -- Snapshot ---------------------------------------------------------------
+
+def _part_table(rows):
+    """Arrow table of REST rows, *_at columns as naive UTC timestamps"""
+    import pandas as pd
+    import pyarrow as pa
+
+    frame = pd.DataFrame(rows)
+    for name in frame.columns:
+        if name.endswith('_at'):
+            stamps = pd.to_datetime(frame[name], errors='coerce', utc=True, format='ISO8601')
+            frame[name] = stamps.dt.tz_localize(None)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+def _write_parts(supabase, table, directory, page_size):
+    """Page a table into Parquet parts; returns the part paths"""
+    import pyarrow.parquet as pq
+
+    parts, pending, rows = [], [], 0
+    for page in iter_pages(supabase, table, '*', page_size=page_size):
+        pending.extend(page)
+        rows += len(page)
+        if len(pending) >= _PART_ROWS:
+            parts.append(os.path.join(directory, f"part-{len(parts):05d}.parquet"))
+            pq.write_table(_part_table(pending), parts[-1])
+            pending = []
+            print(f"  {table}: {rows:,} rows...", end='\r')
+    if pending:
+        parts.append(os.path.join(directory, f"part-{len(parts):05d}.parquet"))
+        pq.write_table(_part_table(pending), parts[-1])
+    return parts
+
+def _typed_select(con, parts):
+    """SELECT over the parts with *_date columns as DATE"""
+    source = f"read_parquet({[str(path) for path in parts]!r}, union_by_name = true)"
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    replace = [f"TRY_CAST({_quote(name)} AS DATE) AS {_quote(name)}"
+               for name in columns if name.endswith('_date')]
+    order = ' ORDER BY id' if 'id' in columns else ''
+    return f"SELECT * {'REPLACE (' + ', '.join(replace) + ')' if replace else ''} FROM {source}{order}"
+
+def build_snapshot(supabase, directory=SNAPSHOT_DIR, tables=TABLES, page_size=PAGE_SIZE):
+    """Write <directory>/<table>.parquet for each table; returns the metadata"""
+    _require_duckdb()
+    os.makedirs(directory, exist_ok=True)
+    con = duckdb.connect()
+    metadata = {'built_at': dt.datetime.now().isoformat(timespec='seconds'), 'tables': {}}
+    for table in tables:
+        started = time.monotonic()
+        staging = os.path.join(directory, f".{table}.parts")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            parts = _write_parts(supabase, table, staging, page_size)
+            target = os.path.join(directory, f"{table}.parquet")
+            if parts:
+                con.execute(f"COPY ({_typed_select(con, parts)}) TO '{target}.tmp' "
+                            f"(FORMAT parquet, COMPRESSION zstd)")
+                os.replace(f"{target}.tmp", target)
+                rows = con.execute(f"SELECT count(*) FROM read_parquet('{target}')").fetchone()[0]
+            else:
+                if os.path.exists(target):
+                    os.remove(target)
+                rows = 0
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        metadata['tables'][table] = {'rows': rows, 'seconds': round(time.monotonic() - started, 1)}
+        print(f"  {table}: {rows:,} rows in {time.monotonic() - started:.1f}s")
+    con.close()
+    with open(os.path.join(directory, _METADATA), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+def snapshot_info(directory=SNAPSHOT_DIR):
+    """The metadata build_snapshot() wrote, or None"""
+    try:
+        with open(os.path.join(directory, _METADATA)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# -- Engine -----------------------------------------------------------------
+
+class QueryResult:
+    """Columns, rows (lists), whether rows were cut at max_rows, and seconds"""
+
+    def __init__(self, sql, columns, rows, truncated, seconds):
+        self.sql = sql
+        self.columns = columns
+        self.rows = rows
+        self.truncated = truncated
+        self.seconds = seconds
+
+    def records(self):
+        """Row dicts with the parcels column flattened as execute-sql.js does"""
+        records = []
+        for row in self.rows:
+            record = {}
+            for name, value in zip(self.columns, row):
+                if name == PARCELS and isinstance(value, dict):
+                    record.update((f"parcel_{key}", parcel_value) for key, parcel_value in value.items()
+                                  if key not in PARCEL_METADATA)
+                elif name != PARCELS or value is not None:
+                    record[name] = value
+            records.append(record)
+        return records
+
+    def response(self):
+        """The execute-sql.js response body"""
+        data = self.records()
+        return {
+            'data': data,
+            'rowCount': len(data),
+            'sql': self.sql,
+            'executionTime': dt.datetime.now(dt.timezone.utc).isoformat(),
+            'elapsedMs': round(self.seconds * 1000, 2),
+            'truncated': self.truncated,
+        }
+
+
+class MarketQueryEngine:
+    """In-memory DuckDB over a snapshot directory (see module docstring)"""
+
+    def __init__(self, directory=SNAPSHOT_DIR, timeout=5.0, max_rows=1000, threads=None,
+                 memory_limit=None):
+        _require_duckdb()
+        self.directory = directory
+        self.timeout = timeout
+        self.max_rows = max_rows
+        started = time.monotonic()
+        self.con = duckdb.connect(':memory:')
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        self.rows = self._load()
+        # Nothing but the loaded tables from here on
+        self.con.execute("SET enable_external_access = false")
+        self.con.execute("SET lock_configuration = true")
+        self.load_seconds = time.monotonic() - started
+
+    def _path(self, table):
+        path = os.path.join(self.directory, f"{table}.parquet")
+        if not os.path.exists(path):
+            raise SystemExit(f"No {table} snapshot at {path}; run: python3 market_query.py build")
+        return path.replace("'", "''")
+
+    def _columns(self, table):
+        return [row[0] for row in self.con.execute(f"DESCRIBE {table}").fetchall()]
+
+    def _load(self):
+        con = self.con
+        con.execute(f"CREATE TABLE {PARCELS} AS SELECT * FROM read_parquet('{self._path(PARCELS)}')")
+        con.execute(f"CREATE TEMP TABLE _sales AS SELECT * FROM read_parquet('{self._path(SALES)}')")
+        sales = self._columns('_sales')
+        aliases = [f"{_quote(present)} AS {_quote(missing)}"
+                   for old, new in COLUMN_ALIASES
+                   for missing, present in ((old, new), (new, old))
+                   if missing not in sales and present in sales]
+        # parcel_id once linked (sales-transactions-schema.sql), else the
+        # parcel number from the export
+        keys = [name for name in ('parcel_id', 'parcel_number') if name in sales]
+        sale_key = _parcel_key(f"coalesce({', '.join('s.' + _quote(name) for name in keys)})") \
+            if keys else 'NULL'
+        con.execute(f"""
+            CREATE TABLE {SALES} AS
+            SELECT s.*{''.join(', s.' + alias for alias in aliases)}, p AS {PARCELS}
+            FROM _sales s
+            LEFT JOIN (
+                SELECT * EXCLUDE (_key) FROM (
+                    SELECT *, {_parcel_key('parcel_id')} AS _key FROM {PARCELS}
+                ) QUALIFY row_number() OVER (PARTITION BY _key ORDER BY _key) = 1
+            ) p ON {_parcel_key('p.parcel_id')} = {sale_key}
+        """)
+        con.execute("DROP TABLE _sales")
+        return {table: con.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in TABLES}
+
+    def check(self, sql, cursor=None):
+        """Raise QueryRejected unless sql is exactly one SELECT"""
+        try:
+            statements = (cursor or self.con).extract_statements(sql)
+        except duckdb.Error as e:
+            raise QueryRejected(str(e)) from None
+        if len(statements) != 1:
+            raise QueryRejected(f"Expected one statement, got {len(statements)}")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise QueryRejected(f"Only SELECT queries are allowed, not {statements[0].type.name}")
+
+    def execute(self, sql, timeout=None, max_rows=None):
+        """Run one SELECT; QueryRejected, QueryTimeout or duckdb.Error on failure"""
+        timeout = self.timeout if timeout is None else timeout
+        max_rows = self.max_rows if max_rows is None else max_rows
+        # A cursor per query: the service runs them on several threads
+        cursor = self.con.cursor()
+        try:
+            self.check(sql, cursor)
+        except QueryRejected:
+            cursor.close()
+            raise
+        timer = threading.Timer(timeout, cursor.interrupt) if timeout else None
+        started = time.perf_counter()
+        try:
+            if timer:
+                timer.start()
+            cursor.execute(sql)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchmany(max_rows + 1)
+        except duckdb.InterruptException:
+            raise QueryTimeout(f"Query exceeded the {timeout:g}s timeout") from None
+        finally:
+            if timer:
+                timer.cancel()
+            cursor.close()
+        truncated = len(rows) > max_rows
+        return QueryResult(sql, columns, rows[:max_rows], truncated, time.perf_counter() - started)
+
+
+# -- HTTP -------------------------------------------------------------------
+
+def _json_default(value):
+    if isinstance(value, (dt.date, dt.datetime, dt.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """POST {"sql": ...} to /api/market/execute-sql (or /)"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are separate writes: no delayed-ACK stall
+    engine = None
+    paths = ('/', '/api/market/execute-sql')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.path.split('?')[0] not in self.paths:
+            return self._send_json(404, {'error': 'Not found'})
+        try:
+            sql = (json.loads(body or b'{}').get('sql') or '').strip()
+        except (ValueError, AttributeError):
+            return self._send_json(400, {'error': 'Expected a JSON body with "sql"'})
+        if not sql:
+            return self._send_json(400, {'error': 'No SQL query provided'})
+        try:
+            result = self.engine.execute(sql)
+        except QueryRejected as e:
+            return self._send_json(400, {'error': str(e), 'sql': sql})
+        except QueryTimeout as e:
+            return self._send_json(504, {'error': str(e), 'sql': sql})
+        except duckdb.Error as e:
+            return self._send_json(400, {'error': 'Query failed', 'details': str(e), 'sql': sql})
+        self._send_json(200, result.response())
+
+
+def serve(engine, port=8787, host='127.0.0.1'):
+    """Start the query service on a background thread; returns the server"""
+    handler = type('BoundQueryHandler', (QueryHandler,), {'engine': engine})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read-only SQL over a local sales/parcels snapshot')
+    parser.add_argument('command', choices=('build', 'info', 'query', 'serve'))
+    parser.add_argument('sql', nargs='?', help='the SELECT to run (query)')
+    parser.add_argument('--snapshot', default=SNAPSHOT_DIR, help=f'snapshot directory (default: {SNAPSHOT_DIR})')
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds per query (default: 5)')
+    parser.add_argument('--max-rows', type=int, default=1000, help='most rows returned (default: 1000)')
+    parser.add_argument('--threads', type=int, help='DuckDB threads (default: one per CPU)')
+    parser.add_argument('--memory-limit', help="DuckDB memory limit, e.g. '2GB'")
+    parser.add_argument('--port', type=int, default=8787, help='port to serve on (default: 8787)')
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from dotenv import load_dotenv
+        from supabase import create_client
+        load_dotenv()
+        supabase = create_client(os.getenv('SUPABASE_URL', 'https://gzswtqlvffqcpifdyrnf.supabase.co'),
+                                 os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_ANON_KEY'))
+        started = time.monotonic()
+        build_snapshot(supabase, args.snapshot)
+        print(f"Snapshot written to {args.snapshot} in {time.monotonic() - started:.1f}s")
+        return
+    if args.command == 'info':
+        print(json.dumps(snapshot_info(args.snapshot), indent=2))
+        return
+
+    engine = MarketQueryEngine(args.snapshot, args.timeout, args.max_rows, args.threads, args.memory_limit)
+    print(f"Loaded {', '.join(f'{table} ({rows:,} rows)' for table, rows in engine.rows.items())} "
+          f"in {engine.load_seconds:.1f}s", file=sys.stderr)
+    if args.command == 'query':
+        if not args.sql:
+            parser.error('query needs the SQL to run')
+        try:
+            result = engine.execute(args.sql)
+        except (QueryRejected, QueryTimeout, duckdb.Error) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(json.dumps(result.records(), indent=2, default=_json_default))
+        print(f"{len(result.rows):,} rows{' (truncated)' if result.truncated else ''} "
+              f"in {result.seconds * 1000:.1f} ms", file=sys.stderr)
+        return
+
+    server = serve(engine, args.port, args.host)
+    print(f"Market query service on {server.url}/api/market/execute-sql (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Token index of the party names on each sale (grantor/grantee)
+
+SalesAPI.getAllTransactionsByPerson() (js/sales-api.js) looks a person up
+with ilike '%NAME%' on grantor and grantee, then on seller_name and
+buyer_name, and a leading wildcard cannot use the btree indexes of
+updated-sales-schema.sql, so each of those is a scan of the table. It also
+misses 'SMITH, JOHN' when asked for 'JOHN SMITH'. NameIndex maps each
+normalized name token to the sorted list of sales it appears on:
+
+  tokens    upper case; apostrophes dropped (O'BRIEN -> OBRIEN), other
+            punctuation splits words; single letters (middle initials) and
+            entity/filler words (LLC, INC, CORP, TRUST, ET AL, THE, ...) are
+            left out, so word order and suffixes do not matter
+  postings  key * 2 + role (0 seller: grantor/seller_name, 1 buyer:
+            grantee/buyer_name) as int64, so intersecting two tokens' lists
+            keeps sales where both words are in the same party's name
+  lookup    the query is tokenized the same way and the posting lists of
+            its tokens intersected (with prefix=True each query token also
+            matches longer tokens: SMITH finds SMITHSON); the matching keys
+            are fetched with one in.(...) filter per 200 keys
+
+The key is sales_id when the table has it, else id; either way an integer.
+The index is built from the table (build) or kept up to date by the
+importer (import-sales.py --name-index), which adds every batch that lands;
+a re-imported sale replaces its earlier postings. It is saved as a
+compressed .npz (vocabulary, offsets, postings).
+
+Usage (run from backend-scripts/):
+
+    python3 name_index.py build                       # from sales_transactions
+    python3 name_index.py lookup "john smith" --role buyer --fetch
+
+    index = NameIndex(NAME_INDEX_FILE)
+    keys = index.lookup('SMITH, JOHN')                 # {role: array of keys}
+    rows = transactions_by_person(supabase, index, 'John Smith')
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from parcel_linker import PAGE_SIZE, iter_pages
+
+NAME_INDEX_FILE = 'sales_transactions.names.npz'
+
+SELLER, BUYER = 0, 1
+ROLES = {'seller': SELLER, 'buyer': BUYER}
+
+# Name column -> role, for both sales layouts
+NAME_FIELDS = {
+    'grantor': SELLER,
+    'grantee': BUYER,
+    'seller_name': SELLER,
+    'buyer_name': BUYER,
+}
+
+# Left out of the index and of queries
+STOP_WORDS = frozenset((
+    'LLC', 'L', 'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY', 'LTD', 'LP',
+    'LLP', 'PLLC', 'PC', 'TRUST', 'TRUSTEE', 'TRUSTEES', 'TR', 'TRS', 'REVOCABLE', 'LIVING',
+    'ET', 'AL', 'ETAL', 'UX', 'ETUX', 'VIR', 'ETVIR', 'THE', 'OF', 'AND', 'A', 'AN', 'FOR',
+    'AKA', 'FKA', 'DBA', 'NKA',
+))
+
+# Keys per in.(...) filter when fetching the matching sales
+FETCH_BATCH = 200
+
+_APOSTROPHES = r"['’`]"
+_SEPARATORS = r'[^A-Z0-9]+'
+
+
+def name_tokens(name):
+    """Index tokens of one name, in order, without repeats"""
+    text = re.sub(_SEPARATORS, ' ', re.sub(_APOSTROPHES, '', str(name or '').upper()))
+    words = [word for word in text.split() if len(word) > 1 and word not in STOP_WORDS]
+    return list(dict.fromkeys(words))
+
+def token_postings(keys, names, role):
+    """(token, posting) arrays for a column of names and their integer keys"""
+    keys = pd.to_numeric(pd.Series(keys, dtype=object), errors='coerce').to_numpy()
+    names = pd.Series(names, dtype=object)
+    valid = ~np.isnan(keys) & names.notna().to_numpy()
+    if not valid.any():
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+    text = (names[valid].astype(str).str.upper()
+            .str.replace(_APOSTROPHES, '', regex=True)
+            .str.replace(_SEPARATORS, ' ', regex=True))
+    words = pd.DataFrame({'token': text.str.split().to_numpy(),
+                          'posting': keys[valid].astype(np.int64) * 2 + role}).explode('token')
+    words = words[words['token'].notna()]
+    words = words[(words['token'].str.len() > 1) & ~words['token'].isin(STOP_WORDS)]
+    words = words.drop_duplicates()
+    return words['token'].to_numpy(dtype=object), words['posting'].to_numpy(dtype=np.int64)
+
+
+class NameIndex:
+    """Posting lists of name tokens, loaded from and saved to an .npz"""
+
+    def __init__(self, path=NAME_INDEX_FILE, key='sales_id'):
+        self.path = path
+        self.key = key
+        self.tokens = np.empty(0, dtype=str)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.empty(0, dtype=np.int64)
+        self.pending = []
+        self.replaced = []
+        if path and os.path.exists(path):
+            with np.load(path) as saved:
+                self.tokens = saved['tokens']
+                self.offsets = saved['offsets']
+                self.postings = saved['postings']
+                self.key = str(saved['key'])
+
+    @property
+    def sales(self):
+        """Distinct keys in the index"""
+        return len(np.unique(self.postings >> 1))
+
+    def add(self, columns):
+        """Queue the names of a batch of rows ({column: array}, with the key)"""
+        if self.key not in columns:
+            return
+        keys = columns[self.key]
+        self.replaced.append(pd.to_numeric(pd.Series(keys, dtype=object), errors='coerce')
+                             .dropna().to_numpy(dtype=np.int64))
+        for field, role in NAME_FIELDS.items():
+            if field in columns:
+                self.pending.append(token_postings(keys, columns[field], role))
+
+    def commit(self, records):
+        """add() for an uploaded batch (record dicts or a ColumnBatch)"""
+        columns = getattr(records, 'columns', None)
+        if columns is None:
+            fields = [self.key] + [field for field in NAME_FIELDS if any(field in record for record in records)]
+            columns = {field: np.array([record.get(field) for record in records], dtype=object)
+                       for field in fields}
+        self.add(columns)
+
+    def flush(self):
+        """Merge queued rows into the posting lists; a key added again
+        replaces all its earlier postings"""
+        if not self.pending and not self.replaced:
+            return
+        counts = np.diff(self.offsets)
+        tokens = np.repeat(self.tokens, counts).astype(object)
+        postings = self.postings
+        if self.replaced:
+            stale = np.isin(postings >> 1, np.concatenate(self.replaced))
+            tokens, postings = tokens[~stale], postings[~stale]
+        if self.pending:
+            tokens = np.concatenate([tokens] + [batch[0] for batch in self.pending])
+            postings = np.concatenate([postings] + [batch[1] for batch in self.pending])
+        self.pending, self.replaced = [], []
+
+        codes, vocabulary = pd.factorize(pd.Series(tokens, dtype=object), sort=True)
+        order = np.lexsort((postings, codes))
+        codes, postings = codes[order], postings[order]
+        distinct = np.ones(len(postings), dtype=bool)
+        distinct[1:] = (codes[1:] != codes[:-1]) | (postings[1:] != postings[:-1])
+        codes, postings = codes[distinct], postings[distinct]
+        self.tokens = np.asarray(vocabulary, dtype=str)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(vocabulary)))))
+        self.postings = postings
+
+    def save(self, path=None):
+        """Flush and write the index"""
+        self.flush()
+        path = path or self.path
+        tmp = path + '.tmp.npz'
+        np.savez_compressed(tmp, tokens=self.tokens, offsets=self.offsets, postings=self.postings,
+                            key=np.array(self.key))
+        os.replace(tmp, path)
+
+    def _postings(self, token, prefix=False):
+        start = np.searchsorted(self.tokens, token, 'left')
+        if prefix:
+            # Every token sorting between TOKEN and TOKEN + the highest character
+            end = np.searchsorted(self.tokens, token + '\U0010ffff', 'left')
+            if end - start > 1:
+                return np.unique(self.postings[self.offsets[start]:self.offsets[end]])
+        elif start >= len(self.tokens) or self.tokens[start] != token:
+            return self.postings[:0]
+        else:
+            end = start + 1
+        return self.postings[self.offsets[start]:self.offsets[end]]
+
+    def lookup(self, name, role=None, prefix=False):
+        """{role name: sorted keys of sales where one party's name has every
+        token of `name`}; role limits it to 'seller' or 'buyer'"""
+        self.flush()
+        tokens = name_tokens(name)
+        if not tokens:
+            return {label: np.empty(0, dtype=np.int64) for label in ROLES}
+        # Rarest first, so the running intersection stays small
+        lists = sorted((self._postings(token, prefix) for token in tokens), key=len)
+        matched = lists[0]
+        for postings in lists[1:]:
+            if not len(matched):
+                break
+            matched = np.intersect1d(matched, postings, assume_unique=True)
+        return {label: np.unique(matched[(matched & 1) == value] >> 1)
+                for label, value in ROLES.items() if role in (None, label)}
+
+    def summary(self):
+        return (f"Name index: {len(self.tokens):,} tokens | {len(self.postings):,} postings | "
+                f"{self.sales:,} sales | {os.path.getsize(self.path) / 1e6 if os.path.exists(self.path) else 0:,.1f} MB")
+
+
+def build_index(supabase, table='sales_transactions', path=NAME_INDEX_FILE, page_size=PAGE_SIZE):
+    """NameIndex of every row of the table, paged out by id; saved to path"""
+    started = time.monotonic()
+    sample = supabase.table(table).select('*').limit(1).execute().data
+    columns = set(sample[0]) if sample else set()
+    key = 'sales_id' if 'sales_id' in columns else 'id'
+    fields = [field for field in NAME_FIELDS if field in columns]
+    index = NameIndex(None, key)
+    index.path = path
+    rows = 0
+    pending = []
+    select = ','.join(dict.fromkeys(['id', key] + fields))
+    for page in iter_pages(supabase, table, select, page_size=page_size):
+        pending.extend(page)
+        rows += len(page)
+        if len(pending) >= 50000:
+            index.commit(pending)
+            pending = []
+            print(f"  Indexed {rows:,} rows...", end='\r')
+    if pending:
+        index.commit(pending)
+    index.save()
+    print(f"Indexed {', '.join(fields)} of {rows:,} rows by {key} in {time.monotonic() - started:.1f}s")
+    return index
+
+
+def fetch_rows(supabase, table, key, keys, columns='*'):
+    """Rows whose key is in keys, FETCH_BATCH keys per request"""
+    rows = []
+    keys = [int(value) for value in keys]
+    for start in range(0, len(keys), FETCH_BATCH):
+        rows.extend(supabase.table(table).select(columns)
+                    .in_(key, keys[start:start + FETCH_BATCH]).execute().data or [])
+    return rows
+
+def transactions_by_person(supabase, index, name, table='sales_transactions', prefix=False):
+    """getAllTransactionsByPerson() through the index: seller then buyer rows
+    tagged with their role, one per address and date, newest first"""
+    matched = index.lookup(name, prefix=prefix)
+    wanted = np.union1d(matched['seller'], matched['buyer'])
+    rows = {row[index.key]: row for row in fetch_rows(supabase, table, index.key, wanted)}
+    transactions, seen = [], set()
+    for role in ('seller', 'buyer'):
+        for key in matched[role].tolist():
+            row = rows.get(key)
+            if row is None:
+                continue
+            mark = (row.get('street_address') or row.get('property_address'), row.get('sale_date'))
+            if mark not in seen:
+                seen.add(mark)
+                transactions.append({**row, 'role': role})
+    transactions.sort(key=lambda row: row.get('sale_date') or '', reverse=True)
+    return transactions
+
+
+def add_name_index_arguments(parser):
+    """Add the shared --name-index option to an importer's CLI"""
+    parser.add_argument('--name-index', metavar='PATH', nargs='?', const=NAME_INDEX_FILE,
+                        help=f'add the grantor/grantee names of every uploaded row to a token index '
+                             f'(default path: {NAME_INDEX_FILE})')
+    return parser
+
+def name_index_from_args(args, key='sales_id'):
+    """NameIndex for --name-index, or None; key is the profile's upsert key"""
+    if not args.name_index:
+        return None
+    index = NameIndex(args.name_index, key)
+    if index.key != key:
+        raise SystemExit(f"{args.name_index} is keyed on {index.key}, not {key}; rebuild it or pick another path")
+    return index
+
+
+def main():
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description='Token index of sale party names')
+    parser.add_argument('command', choices=('build', 'lookup', 'stats'))
+    parser.add_argument('name', nargs='?', help='name to look up')
+    parser.add_argument('--index', default=NAME_INDEX_FILE, help=f'index file (default: {NAME_INDEX_FILE})')
+    parser.add_argument('--table', default='sales_transactions')
+    parser.add_argument('--role', choices=sorted(ROLES), help='only sales where the name is the seller/buyer')
+    parser.add_argument('--prefix', action='store_true', help='match query words as prefixes')
+    parser.add_argument('--fetch', action='store_true', help='fetch and print the matching sales')
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = create_client(os.getenv('SUPABASE_URL', 'https://gzswtqlvffqcpifdyrnf.supabase.co'),
+                             os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_ANON_KEY'))
+    if args.command == 'build':
+        print(build_index(supabase, args.table, args.index).summary())
+        return
+    if not os.path.exists(args.index):
+        raise SystemExit(f"No index at {args.index}; run: python3 name_index.py build")
+    index = NameIndex(args.index)
+    if args.command == 'stats':
+        print(index.summary())
+        return
+    if not args.name:
+        parser.error('lookup needs a name')
+    started = time.perf_counter()
+    matched = index.lookup(args.name, args.role, args.prefix)
+    print(f"Tokens {name_tokens(args.name)}: "
+          + ', '.join(f"{len(keys):,} as {role}" for role, keys in matched.items())
+          + f" in {(time.perf_counter() - started) * 1000:.2f} ms")
+    if args.fetch:
+        for row in transactions_by_person(supabase, index, args.name, args.table, args.prefix):
+            if args.role in (None, row['role']):
+                print(f"  {row.get('sale_date')}  {row['role']:<6}  {row.get('sale_price')!s:>10}  "
+                      f"{row.get('street_address') or row.get('property_address')}  "
+                      f"{row.get('grantor') or row.get('seller_name')} -> {row.get('grantee') or row.get('buyer_name')}")
+
+if __name__ == '__main__':
+    main()
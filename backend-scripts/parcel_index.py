@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+In-memory parcel index for resolving sale addresses to parcel IDs offline
+
+Builds hash tables over the parcels' canonical addresses (see
+address_normalizer.py) and resolves a whole column of sale addresses with
+joins instead of one ilike query per address. Each address is tried
+against progressively looser keys, and the first that hits sets the match
+method and its confidence:
+
+    unit      (number, street, unit)        1.00
+    street    (number, street)              0.95
+    name      (number, name)                0.85  suffix/directionals differ
+    range     number inside a parcel's      0.75  '1200-1210 MAIN ST'
+              number range on the street
+
+When a key fits several parcels the first one (in parcels order) is taken
+and the confidence is divided by the number of candidates.
+
+Usage (run from backend-scripts/):
+
+    index = ParcelIndex(parcels_df)           # needs parcel_id and address
+    matches = index.match(sales_df['Street Address'])
+    # -> DataFrame: parcel_id, row, method, confidence, candidates
+
+CLI, against the parcel and sales exports:
+    python3 parcel_index.py --parcels ../parcel_file_current_-3720075312525260545.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from address_normalizer import parse_addresses
+
+# (method, key parts, confidence) in the order they are tried
+MATCH_KEYS = (
+    ('unit', ('number', 'street', 'unit'), 1.0),
+    ('street', ('number', 'street'), 0.95),
+    ('name', ('number', 'name'), 0.85),
+)
+RANGE_CONFIDENCE = 0.75
+UNMATCHED = 'unmatched'
+
+PARCELS_CSV = '../parcel_file_current_-3720075312525260545.csv'
+SALES_CSV = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
+
+
+def _key(parts, columns):
+    """One hashable key per row; None where any part is missing"""
+    frame = parts[list(columns)]
+    keys = pd.Series(list(zip(*(frame[column].tolist() for column in columns))), dtype=object)
+    return keys.where(frame.notna().all(axis=1).to_numpy(), None)
+
+
+class ParcelIndex:
+    """Hash indexes from canonical address keys to parcel rows"""
+
+    def __init__(self, parcels, address_column='address', id_column='parcel_id'):
+        self.parcels = parcels.reset_index(drop=True)
+        self.id_column = id_column
+        started = time.monotonic()
+        self.parts = parse_addresses(self.parcels[address_column])
+        self.tables = {}
+        for method, columns, _ in MATCH_KEYS:
+            keys = _key(self.parts, columns)
+            present = keys.notna()
+            # key -> (first row, number of parcels with that key)
+            grouped = pd.DataFrame({'key': keys[present], 'row': np.flatnonzero(present)}) \
+                .groupby('key', sort=False)['row'].agg(['first', 'size'])
+            self.tables[method] = grouped
+        ranged = self.parts['number_high'].notna() & self.parts['street'].notna()
+        self.ranges = pd.DataFrame({
+            'street': self.parts.loc[ranged, 'street'],
+            'low': pd.to_numeric(self.parts.loc[ranged, 'number'].str.extract(r'^(\d+)')[0]),
+            'high': pd.to_numeric(self.parts.loc[ranged, 'number_high'].str.extract(r'^(\d+)')[0]),
+            'row': np.flatnonzero(ranged),
+        })
+        self.build_seconds = time.monotonic() - started
+
+    def __len__(self):
+        return len(self.parcels)
+
+    def match(self, addresses):
+        """Resolve a column of addresses; one result row per input, in order"""
+        parts = parse_addresses(addresses)
+        n = len(parts)
+        row = np.full(n, -1, dtype=np.int64)
+        candidates = np.zeros(n, dtype=np.int64)
+        confidence = np.zeros(n)
+        method = np.full(n, UNMATCHED, dtype=object)
+
+        for name, columns, base in MATCH_KEYS:
+            todo = row < 0
+            if not todo.any():
+                break
+            keys = _key(parts[todo], columns)
+            # reindex is the probe side of the hash join
+            hits = self.tables[name].reindex(pd.Index(keys, dtype=object))
+            found = hits['first'].notna().to_numpy()
+            positions = np.flatnonzero(todo)[found]
+            row[positions] = hits['first'].to_numpy()[found].astype(np.int64)
+            candidates[positions] = hits['size'].to_numpy()[found].astype(np.int64)
+            confidence[positions] = base / candidates[positions]
+            method[positions] = name
+
+        self._match_ranges(parts, row, candidates, confidence, method)
+
+        # row -1 (unmatched) picks the None appended at the end
+        ids = np.append(self.parcels[self.id_column].to_numpy(dtype=object), None)
+        return pd.DataFrame({'parcel_id': ids[row], 'row': row, 'method': method,
+                             'confidence': confidence.round(3), 'candidates': candidates})
+
+    def _match_ranges(self, parts, row, candidates, confidence, method):
+        todo = np.flatnonzero((row < 0) & parts['street'].notna().to_numpy()
+                              & parts['number'].notna().to_numpy())
+        if not len(todo) or self.ranges.empty:
+            return
+        wanted = pd.DataFrame({
+            'position': todo,
+            'street': parts['street'].to_numpy()[todo],
+            'number': pd.to_numeric(parts['number'].iloc[todo].str.extract(r'^(\d+)')[0]).to_numpy(),
+        })
+        joined = wanted.merge(self.ranges, on='street')
+        joined = joined[(joined['number'] >= joined['low']) & (joined['number'] <= joined['high'])]
+        if joined.empty:
+            return
+        grouped = joined.groupby('position', sort=False)['row'].agg(['first', 'size'])
+        positions = grouped.index.to_numpy()
+        row[positions] = grouped['first'].to_numpy()
+        candidates[positions] = grouped['size'].to_numpy()
+        confidence[positions] = RANGE_CONFIDENCE / candidates[positions]
+        method[positions] = 'range'
+
+
+def match_summary(matches):
+    """Match rate and counts per method, e.g. for a report"""
+    total = len(matches)
+    counts = matches['method'].value_counts()
+    matched = total - int(counts.get(UNMATCHED, 0))
+    lines = [f"Matched {matched:,} of {total:,} addresses ({matched / total:.1%})" if total
+             else "No addresses to match"]
+    for name in [m for m, _, _ in MATCH_KEYS] + ['range', UNMATCHED]:
+        if counts.get(name):
+            lines.append(f"  {name:<10} {int(counts[name]):>9,}")
+    if matched:
+        lines.append(f"  mean confidence {matches.loc[matches['row'] >= 0, 'confidence'].mean():.3f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve sale addresses to parcel IDs offline')
+    parser.add_argument('--parcels', default=PARCELS_CSV, help='parcel export (Parcel ID, Address)')
+    parser.add_argument('--sales', default=SALES_CSV, help='sales export (Street Address)')
+    parser.add_argument('--limit', type=int, help='only the first N sales')
+    parser.add_argument('--output', help='write the matches to this CSV')
+    args = parser.parse_args()
+
+    from sales_snapshot import load_sales
+
+    parcels = pd.read_csv(args.parcels, usecols=['Parcel ID', 'Address'], dtype=str,
+                          encoding='utf-8-sig').rename(columns={'Parcel ID': 'parcel_id', 'Address': 'address'})
+    index = ParcelIndex(parcels)
+    print(f"Indexed {len(index):,} parcels in {index.build_seconds:.2f}s")
+
+    sales = load_sales(args.sales, columns=['Sales ID', 'Street Address'], nrows=args.limit)
+    started = time.monotonic()
+    matches = index.match(sales['Street Address'])
+    print(f"Resolved {len(matches):,} sale addresses in {time.monotonic() - started:.2f}s")
+    print(match_summary(matches))
+
+    if args.output:
+        out = pd.concat([sales.reset_index(drop=True), matches.drop(columns='row')], axis=1)
+        out.to_csv(args.output, index=False)
+        print(f"Matches written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Set-based linking of sales to parcel owners
+
+import-basic-sales.py used to look up every sale's parcel with its own
+`parcels ... ilike('address', ...)` request and then send one update per
+match, two round trips per sale. The linker instead:
+
+  1. pulls a projected snapshot of parcels (only the columns it needs) and
+     of the sales to link, page by page on the id key,
+  2. joins them locally with hash joins, first on the normalized parcel
+     number and then, for the rest, on the canonical street address
+     through parcel_index.ParcelIndex,
+  3. writes the owner/building fields back as batched upserts on id.
+
+Usage (run from backend-scripts/):
+
+    linker = ParcelLinker(supabase)
+    report = linker.run(uploader)
+    print(report.summary())
+"""
+
+import numpy as np
+import pandas as pd
+
+from parcel_index import ParcelIndex
+
+# What the linker reads from parcels and what it fills in on each sale
+PARCEL_COLUMNS = ('id', 'parcel_id', 'address', 'owner_full_name', 'year_built',
+                  'total_floor_area', 'zip_code')
+ENRICHED_COLUMNS = {
+    # sales_transactions column: parcels column
+    'seller_name': 'owner_full_name',
+    'year_built': 'year_built',
+    'square_feet': 'total_floor_area',
+    'property_zip': 'zip_code',
+}
+
+PARCEL_ID = 'parcel_id'
+ADDRESS = 'address'
+UNMATCHED = 'unmatched'
+
+# Columns the database maintains itself; left out of the write-back
+_SERVER_COLUMNS = ('created_at', 'updated_at')
+
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+# Address matches below this confidence (see parcel_index.py) are not written
+MIN_CONFIDENCE = 0.5
+
+
+def normalize_parcel_ids(values):
+    """Join key for parcel numbers.
+
+    The city writes them with leading zeros and a trailing dot
+    ('02315902.'), and a float round trip turns that into '2315902.0', so
+    both are reduced to '2315902'.
+    """
+    series = pd.Series(values, dtype=object)
+    notna = series.notna()
+    keys = (series[notna].map(str).str.strip().str.upper()
+            .str.replace(r'\.0?$', '', regex=True).str.lstrip('0'))
+    series[notna] = keys.where(~keys.isin(('', 'NAN', 'NONE')), None)
+    return series.to_numpy(dtype=object)
+
+
+def iter_pages(supabase, table, columns='*', filters=None, page_size=PAGE_SIZE):
+    """Pages (lists of row dicts) of a table in id order, page_size rows each.
+
+    Pages are keyed on id (id > last id seen) rather than offsets, so each
+    request is an index range scan however deep into the table it is.
+    columns must include id.
+    """
+    last_id = None
+    while True:
+        query = supabase.table(table).select(columns)
+        for column, value in (filters or {}).items():
+            query = query.eq(column, value)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.order('id').limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+def fetch_rows(supabase, table, columns='*', filters=None, page_size=PAGE_SIZE):
+    """All rows of a table in id order (see iter_pages)"""
+    return [row for page in iter_pages(supabase, table, columns, filters, page_size) for row in page]
+
+
+class LinkReport:
+    """Match counts for one linking run"""
+
+    def __init__(self, sales, parcels, by_parcel_id, by_address, mean_confidence=0.0):
+        self.sales = sales
+        self.mean_confidence = mean_confidence
+        self.parcels = parcels
+        self.by_parcel_id = by_parcel_id
+        self.by_address = by_address
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def matched(self):
+        return self.by_parcel_id + self.by_address
+
+    @property
+    def match_rate(self):
+        return self.matched / self.sales if self.sales else 0.0
+
+    def summary(self):
+        return (f"Linked {self.matched:,} of {self.sales:,} sales ({self.match_rate:.1%}) "
+                f"against {self.parcels:,} parcels | by parcel number: {self.by_parcel_id:,} | "
+                f"by address: {self.by_address:,} | unmatched: {self.sales - self.matched:,} | "
+                f"mean confidence: {self.mean_confidence:.2f} | "
+                f"written: {self.written:,} | failed: {self.failed:,}")
+
+
+def link_sales(sales, parcels, min_confidence=MIN_CONFIDENCE):
+    """Hash-join sales to parcels; returns sales with the parcel columns added.
+
+    Each sale is matched on its parcel number if that finds a parcel, and
+    otherwise through a ParcelIndex on its canonical street address, kept
+    if the match confidence is at least min_confidence. Parcels sharing a
+    key are resolved to the lowest id so reruns match the same way. The
+    'match' column says which key matched (PARCEL_ID, ADDRESS or
+    UNMATCHED) and 'confidence' how sure the match is.
+    """
+    parcels = parcels.sort_values('id', kind='stable').reset_index(drop=True)
+    parcels = parcels.assign(_parcel_key=normalize_parcel_ids(parcels['parcel_id']))
+    wanted = list(ENRICHED_COLUMNS.values())
+
+    sales = sales.reset_index(drop=True)
+    parcel_keys = normalize_parcel_ids(sales['parcel_id'])
+
+    # reindex on a hashed index is the build/probe of a hash join
+    rows_by_key = (pd.Series(np.arange(len(parcels)), index=parcels['_parcel_key'])
+                   .loc[lambda rows: rows.index.notna()])
+    rows_by_key = rows_by_key[~rows_by_key.index.duplicated()]
+    parcel_rows = rows_by_key.reindex(pd.Index(parcel_keys, dtype=object)).to_numpy()
+    found_parcel = ~np.isnan(parcel_rows)
+
+    by_address = ParcelIndex(parcels).match(sales['property_address'])
+    found_address = ~found_parcel & (by_address['row'].to_numpy() >= 0) & \
+        (by_address['confidence'].to_numpy() >= min_confidence)
+
+    rows = np.where(found_parcel, np.nan_to_num(parcel_rows, nan=-1), by_address['row'].to_numpy())
+    rows = np.where(found_parcel | found_address, rows, -1).astype(np.int64)
+    # row -1 (unmatched) picks the all-None row appended at the end
+    fields = np.vstack([parcels[wanted].to_numpy(dtype=object),
+                        np.full((1, len(wanted)), None, dtype=object)])
+    linked = sales.copy()
+    for position, column in enumerate(wanted):
+        linked['_parcel_' + column] = fields[rows, position]
+    linked['match'] = np.select([found_parcel, found_address], [PARCEL_ID, ADDRESS], UNMATCHED)
+    linked['confidence'] = np.select([found_parcel, found_address],
+                                     [1.0, by_address['confidence'].to_numpy()], 0.0)
+    return linked
+
+def enrichment_records(linked):
+    """Full sale rows with the parcel fields filled in, for the matched sales.
+
+    Rows go back whole so the upsert on id never has to insert a partial
+    row. Sales keep their existing values where the parcel has none, and
+    the buyer placeholder becomes 'BUYER - <sale year>' as before.
+    """
+    matched = linked[linked['match'] != UNMATCHED]
+    records = []
+    sale_columns = [column for column in linked.columns
+                    if not column.startswith('_parcel_') and column not in ('match', 'confidence')
+                    and column not in _SERVER_COLUMNS]
+    for row in matched.to_dict('records'):
+        record = {column: row[column] for column in sale_columns}
+        for sale_column, parcel_column in ENRICHED_COLUMNS.items():
+            value = row['_parcel_' + parcel_column]
+            if value is not None and not pd.isna(value):
+                record[sale_column] = value
+        if row['_parcel_owner_full_name'] is None or pd.isna(row['_parcel_owner_full_name']):
+            record['seller_name'] = 'UNKNOWN OWNER'
+        if record.get('sale_date'):
+            record['buyer_name'] = 'BUYER - ' + str(record['sale_date'])[:4]
+        records.append({key: (None if not isinstance(value, str) and pd.isna(value) else value)
+                        for key, value in record.items()})
+    return records
+
+
+class ParcelLinker:
+    """Fetch, join and write back in three set-based steps"""
+
+    def __init__(self, supabase, sales_filters=None, batch_size=500, min_confidence=MIN_CONFIDENCE):
+        self.supabase = supabase
+        self.sales_filters = sales_filters if sales_filters is not None else {'seller_name': 'PROPERTY TRANSFER'}
+        self.batch_size = batch_size
+        self.min_confidence = min_confidence
+
+    def fetch(self):
+        # object dtype keeps integers as ints; a column with nulls would
+        # otherwise turn into floats that integer columns reject
+        parcels = pd.DataFrame(fetch_rows(self.supabase, 'parcels', ','.join(PARCEL_COLUMNS)),
+                               columns=list(PARCEL_COLUMNS), dtype=object)
+        sales = pd.DataFrame(fetch_rows(self.supabase, 'sales_transactions', '*', self.sales_filters),
+                             dtype=object)
+        return sales, parcels
+
+    def run(self, uploader):
+        """Link every sale matching sales_filters; returns a LinkReport"""
+        sales, parcels = self.fetch()
+        print(f"Found {len(sales):,} sales to link against {len(parcels):,} parcels")
+        if sales.empty:
+            return LinkReport(0, len(parcels), 0, 0)
+
+        linked = link_sales(sales, parcels, self.min_confidence)
+        counts = linked['match'].value_counts()
+        matched = linked['match'] != UNMATCHED
+        report = LinkReport(len(linked), len(parcels), int(counts.get(PARCEL_ID, 0)),
+                            int(counts.get(ADDRESS, 0)),
+                            float(linked.loc[matched, 'confidence'].mean()) if matched.any() else 0.0)
+
+        records = enrichment_records(linked)
+        batches = ((i, records[i:i + self.batch_size])
+                   for i in range(0, len(records), self.batch_size))
+        for result in uploader.upload(batches):
+            report.written += len(result.committed)
+            if not result.ok:
+                report.failed += result.failed_rows
+                print(f"  Batch error: {str(result.error)[:100]}")
+        return report
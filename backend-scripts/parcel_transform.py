@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Vectorized transform of the city parcel file into the parcels table
+
+The Python equivalent of transformRow() in upload-parcel-data.js, a column
+at a time, for the 'parcels' mapping profile (sales_profiles.py):
+
+    python3 import-sales.py --profile parcels --source ../parcel_file_current_-3720075312525260545.csv
+
+Values are parsed the way the JS parsed them, so a refresh from Python
+does not rewrite every parcel loaded by the old script:
+
+  text     passed through as read (not trimmed), 'NA' included (the
+           profile reads only empty cells as missing); empty cells are
+           NULL, where the JS sent ''
+  integer  parseInteger(): drop everything but digits and '-', then the
+           leading integer, so '1,234' is 1234 (and '1234.5' is 12345,
+           as before)
+  number   parseNumber(): drop everything but digits, '.' and '-', then
+           the leading decimal number
+  date     parseDate(): any date the parser understands, as YYYY-MM-DD;
+           times with a UTC offset are converted to UTC first, like
+           Date.toISOString()
+
+owner_full_name is 'Taxpayer 1, Taxpayer 2' (trimmed, either alone when
+the other is empty) and owner_full_mailing_address joins address, city,
+state and ZIP with ', ', as formatOwnerName() and formatMailingAddress()
+did. Rows without a Parcel ID or an address are dropped: the upsert is on
+parcel_id, and address is NOT NULL in schema.sql.
+
+Usage (run from backend-scripts/):
+
+    columns, keep = transform_parcels(chunk)
+    records = to_records(columns, keep)
+"""
+
+import numpy as np
+import pandas as pd
+
+from sales_transform import DATE, FLOAT, INTEGER, TEXT
+
+try:
+    import pyarrow  # noqa: F401  (backs the string dtype)
+    _STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+except (ImportError, TypeError):
+    _STRING = None
+
+# schema.sql parcels column, parcel file column, kind
+PARCEL_COLUMNS = (
+    ('parcel_id', 'Parcel ID', TEXT),
+    ('address', 'Address', TEXT),
+    ('zip_code', 'ZIP Code', TEXT),
+    ('owner_name1', 'Taxpayer 1', TEXT),
+    ('owner_name2', 'Taxpayer 2', TEXT),
+    ('owner_mailing_address', 'Taxpayer Address', TEXT),
+    ('owner_mailing_city', 'Taxpayer City', TEXT),
+    ('owner_mailing_state', 'Taxpayer State', TEXT),
+    ('owner_mailing_zip', 'Taxpayer ZIP Code', TEXT),
+    ('property_class', 'Property Class', TEXT),
+    ('property_class_description', 'Property Class Description', TEXT),
+    ('year_built', 'Year Built', INTEGER),
+    ('building_style', 'Building Style', TEXT),
+    ('building_count', 'Building Count', INTEGER),
+    ('total_floor_area', 'Total Floor Area', INTEGER),
+    ('tax_status', 'Tax Status', TEXT),
+    ('tax_status_description', 'Tax Status Description', TEXT),
+    ('assessed_value', 'Assessed Value', FLOAT),
+    ('previous_assessed_value', 'Previous Assessed Value', FLOAT),
+    ('taxable_value', 'Taxable Value', FLOAT),
+    ('previous_taxable_value', 'Previous Taxable Value', FLOAT),
+    ('neighborhood', 'Neighborhood', TEXT),
+    ('ward', 'Ward', INTEGER),
+    ('council_district', 'Council District', INTEGER),
+    ('total_square_footage', 'Total Square Footage', INTEGER),
+    ('total_acreage', 'Total Acreage', FLOAT),
+    ('frontage', 'Frontage', FLOAT),
+    ('depth', 'Depth', FLOAT),
+    ('sale_date', 'Sale Date', DATE),
+    ('sale_price', 'Sale Price', FLOAT),
+    ('legal_description', 'Legal Description', TEXT),
+    ('street_number', 'Street Number', TEXT),
+    ('street_prefix', 'Street Prefix', TEXT),
+    ('street_name', 'Street Name', TEXT),
+)
+
+# Read every column as text: a Parcel ID like '01000001.' must not become a float
+PARCEL_DTYPES = {source: 'str' for _, source, _ in PARCEL_COLUMNS}
+
+# The leading number, kept by str.replace(); what does not start with one
+# is left as is and fails to_numeric()
+_INTEGER_PREFIX = r'^(-?\d+).*$'
+_NUMBER_PREFIX = r'^(-?(?:\d+\.?\d*|\.\d+)).*$'
+
+
+def _text(values):
+    """String Series (Arrow-backed when pyarrow is installed, so the regex
+    passes below run in C), NaN where the cell was empty"""
+    series = pd.Series(values).reset_index(drop=True)
+    if _STRING is not None:
+        series = series.astype(_STRING)
+    else:
+        series = series.astype(object)
+        notna = series.notna()
+        series[notna] = series[notna].map(str)
+    return series.where(series.notna() & (series != ''), np.nan)
+
+def _objects(series):
+    """Object array with None for missing values"""
+    result = series.astype(object).to_numpy(copy=True)
+    result[series.isna().to_numpy()] = None
+    return result
+
+def js_int_column(values):
+    """parseInteger() for a column"""
+    digits = _text(values).str.replace(r'[^0-9-]', '', regex=True)
+    number = pd.to_numeric(digits.str.replace(_INTEGER_PREFIX, r'\1', regex=True), errors='coerce')
+    return _objects(number.astype('Int64'))
+
+def js_number_column(values):
+    """parseNumber() for a column"""
+    digits = _text(values).str.replace(r'[^0-9.\-]', '', regex=True)
+    number = pd.to_numeric(digits.str.replace(_NUMBER_PREFIX, r'\1', regex=True), errors='coerce')
+    return _objects(number.astype('float64'))
+
+def js_date_column(values):
+    """parseDate() for a column; each distinct value is parsed once"""
+    text = _text(values)
+    result = np.full(len(text), None, dtype=object)
+    notna = text.notna().to_numpy()
+    if notna.any():
+        codes, uniques = pd.factorize(text[notna].str.strip())
+        parsed = [pd.to_datetime(value, errors='coerce', utc=True) for value in uniques]
+        dates = np.array([None if pd.isna(stamp) else stamp.strftime('%Y-%m-%d') for stamp in parsed],
+                         dtype=object)
+        result[notna] = dates[codes]
+    return result
+
+def text_column(values):
+    """Cell values as read, None for empty cells"""
+    return _objects(_text(values))
+
+def owner_name_column(name1, name2):
+    """formatOwnerName(): 'N1, N2', either alone, or None"""
+    first = _text(name1).fillna('').str.strip()
+    second = _text(name2).fillna('').str.strip()
+    both = (first != '') & (second != '')
+    full = first.where(first != '', second).where(~both, first + ', ' + second)
+    return _objects(full.where(full != '', np.nan))
+
+def mailing_address_column(*parts):
+    """formatMailingAddress(): the non-empty parts, trimmed, joined with ', '"""
+    joined = None
+    for part in parts:
+        text = _text(part)
+        present = text.notna()
+        trimmed = text.fillna('').str.strip()
+        if joined is None:
+            joined = trimmed.where(present, np.nan)
+            continue
+        started = joined.notna()
+        joined = joined.where(~present, (joined.fillna('') + ', ').where(started, '') + trimmed)
+    return _objects(joined)
+
+_PARSERS = {
+    TEXT: text_column,
+    INTEGER: js_int_column,
+    FLOAT: js_number_column,
+    DATE: js_date_column,
+}
+
+
+def transform_parcels(df):
+    """(columns, keep) for a chunk of the parcel file (see module docstring)"""
+    columns = {}
+    for field, source, kind in PARCEL_COLUMNS:
+        values = df[source] if source in df else np.full(len(df), None, dtype=object)
+        columns[field] = _PARSERS[kind](values)
+
+    taxpayer = {source: df[source] if source in df else np.full(len(df), None, dtype=object)
+                for source in ('Taxpayer 1', 'Taxpayer 2', 'Taxpayer Address', 'Taxpayer City',
+                               'Taxpayer State', 'Taxpayer ZIP Code')}
+    columns['owner_full_name'] = owner_name_column(taxpayer['Taxpayer 1'], taxpayer['Taxpayer 2'])
+    columns['owner_full_mailing_address'] = mailing_address_column(
+        taxpayer['Taxpayer Address'], taxpayer['Taxpayer City'],
+        taxpayer['Taxpayer State'], taxpayer['Taxpayer ZIP Code'])
+
+    keep = np.not_equal(columns['parcel_id'], None) & np.not_equal(columns['address'], None)
+    return columns, keep
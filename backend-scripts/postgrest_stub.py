@@ -0,0 +1,1044 @@
+#!/usr/bin/env python3
+"""
+Local PostgREST stand-in for load-testing the importers and API queries offline
+
+Serves /rest/v1/<table> and /rest/v1/rpc/<function> on localhost with the
+subset of PostgREST that backend-scripts/ and the api/ and js/ clients use:
+
+  POST      insert; upsert with Prefer: resolution=merge-duplicates (or
+            ignore-duplicates) and ?on_conflict=<column>; return=representation;
+            ?columns= (keys a row leaves out are NULL); gzip bodies
+            (Content-Encoding: gzip) unless --no-gzip, which reads them the
+            way PostgREST does, as invalid JSON
+  GET/HEAD  select=<columns> (embedded resources such as parcels!left(...)
+            are skipped), filters eq/neq/gt/gte/lt/lte/like/ilike/in/is with
+            not. and or=(...)/and=(...), order=<column>.desc.nullslast,
+            limit/offset or a Range header, Prefer: count=exact, and
+            .single() (Accept: application/vnd.pgrst.object+json)
+  PATCH     update, DELETE delete, with the same filters
+
+Rows live in one of three stores (--backend):
+
+  memory    Python lists; the default, and the cheapest sink for upload
+            benchmarks
+  sqlite    a SQLite file (or :memory:); tables and columns are created from
+            the first rows written, and an upsert key gets a unique index
+  postgres  an existing database (--database-url, tables from the schema
+            files); inserts go through json_populate_recordset() as in
+            PostgREST, and rpc/ calls run the database function
+
+Responses can be slowed (latency, jitter), throttled (429 + Retry-After
+above a request rate), failed (random 503s) and cut at max_rows rows like
+PostgREST's db-max-rows, so uploader throughput and API query latency can
+be measured repeatably without touching the hosted Supabase project. The
+supabase Python client can point straight at it:
+
+    supabase = create_client('http://127.0.0.1:54321', SUPABASE_KEY)
+
+Run standalone:
+    python3 postgrest_stub.py --port 54321 --latency-ms 80 --rate-limit 30
+    python3 postgrest_stub.py --backend sqlite --database stub.db --load-fixture 100000
+    python3 postgrest_stub.py --backend postgres --database-url "$DATABASE_URL" --max-rows 1000
+
+Or embed it (see benchmark-uploader.py and benchmark-api.py):
+    server = start_stub(latency=0.05, rate_limit=20)
+    server = start_stub(store=SqliteStore('stub.db'), max_rows=1000)
+    ...
+    server.shutdown()
+"""
+
+import argparse
+import functools
+import gzip
+import json
+import operator
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as clock_time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    from psycopg.types.json import Jsonb
+except ImportError:  # only needed for the postgres backend
+    psycopg = None
+
+BACKENDS = ('memory', 'sqlite', 'postgres')
+
+OBJECT_MEDIA_TYPE = 'application/vnd.pgrst.object+json'
+
+
+class StubConfig:
+    """Fault injection knobs; may be changed while the server runs"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=None, error_rate=0.0,
+                 retry_after=1, discard=False, max_rows=None, gzip=True):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        # Accept writes without storing them (a sink for throughput benchmarks)
+        self.discard = discard
+        # Most rows any response carries, like PostgREST's db-max-rows
+        self.max_rows = max_rows
+        # Decompress Content-Encoding: gzip bodies, as a proxy in front of
+        # PostgREST can; PostgREST itself does not
+        self.gzip = gzip
+
+
+class TokenBucket:
+    """Requests/sec limiter with a one-second burst"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class QueryError(Exception):
+    """A request the stub answers with a PostgREST-style error body"""
+
+    def __init__(self, status, code, message, details=None, hint=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {'code': code, 'details': details, 'hint': hint, 'message': message}
+
+
+# -- Query parameters -------------------------------------------------------
+
+_OPERATORS = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'like', 'ilike', 'in', 'is')
+_IS_VALUES = {'null': 'NULL', 'true': 'TRUE', 'false': 'FALSE', 'unknown': 'NULL'}
+_LOGIC = ('or', 'and', 'not.or', 'not.and')
+_RESERVED = ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns')
+
+def _split(text):
+    """Split on commas outside parentheses and double quotes"""
+    parts, current = [], []
+    depth, quoted = 0, False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif char == ',' and not quoted and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return value
+
+def _parse_error(text):
+    return QueryError(400, 'PGRST100', f'"failed to parse filter ({text})"')
+
+def _condition(column, text):
+    """('cond', column, op, negated, operand) from 'op.value' or 'not.op.value'"""
+    negated = text.startswith('not.')
+    body = text[4:] if negated else text
+    op, dot, operand = body.partition('.')
+    if op not in _OPERATORS or not dot:
+        raise _parse_error(text)
+    if op == 'in':
+        if not (operand.startswith('(') and operand.endswith(')')):
+            raise _parse_error(text)
+        operand = [_unquote(value) for value in _split(operand[1:-1])]
+    elif op == 'is':
+        if operand.lower() not in _IS_VALUES:
+            raise _parse_error(text)
+        operand = operand.lower()
+    elif op in ('like', 'ilike'):
+        operand = operand.replace('*', '%')
+    else:
+        operand = _unquote(operand)
+    return ('cond', column, op, negated, operand)
+
+def _logic(key, text):
+    """('or' | 'and', negated, [expressions]) from key 'or' and '(a.eq.1,and(b.gt.2,c.is.null))'"""
+    if not (text.startswith('(') and text.endswith(')')):
+        raise _parse_error(text)
+    items = []
+    for part in _split(text[1:-1]):
+        head = part.split('(', 1)[0]
+        if head in _LOGIC:
+            items.append(_logic(head, part[len(head):]))
+        else:
+            column, _, rest = part.partition('.')
+            items.append(_condition(column, rest))
+    return (key.split('.')[-1], key.startswith('not.'), items)
+
+def parse_filters(params):
+    """The filter expressions of a query string; a row must match all of them"""
+    filters = []
+    for key, value in params:
+        if key in _LOGIC:
+            filters.append(_logic(key, value))
+        elif key not in _RESERVED and '.' not in key:
+            filters.append(_condition(key, value))
+    return filters
+
+def parse_order(params):
+    """[(column, descending, nulls_first)] from ?order=a.desc.nullslast,b"""
+    order = []
+    for part in _split(dict(params).get('order', '')):
+        column, *modifiers = part.split('.')
+        descending = 'desc' in modifiers
+        # Postgres puts NULLs last ascending and first descending
+        nulls_first = 'nullsfirst' in modifiers or (descending and 'nullslast' not in modifiers)
+        order.append((column, descending, nulls_first))
+    return order
+
+def parse_select(params):
+    """(star, [(output name, column)]) from ?select=. Embedded resources
+    (parcels!left(...)) are skipped and casts (::text) dropped."""
+    star, columns = False, []
+    for item in _split(dict(params).get('select', '*')):
+        if '(' in item:
+            continue
+        item = item.split('::')[0].strip()
+        if item == '*':
+            star = True
+            continue
+        alias, _, column = item.rpartition(':')
+        columns.append((alias or column, column))
+    return star or not columns, columns
+
+def _project(rows, select):
+    star, columns = select
+    if star and not columns:
+        return rows
+    projected = []
+    for row in rows:
+        out = dict(row) if star else {}
+        for name, column in columns:
+            out[name] = row.get(column)
+        projected.append(out)
+    return projected
+
+def _json_default(value):
+    """JSON for the values Postgres hands back (numeric, dates, uuid, ...)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, clock_time)):
+        return value.isoformat()
+    return str(value)
+
+
+# -- In-memory evaluation ---------------------------------------------------
+
+@functools.lru_cache(maxsize=256)
+def _like_pattern(pattern, ignore_case):
+    regex = ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char)
+                    for char in pattern)
+    return re.compile(regex, re.S | (re.I if ignore_case else 0))
+
+def _text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _is_number(value):
+    return type(value) in (int, float)
+
+def _numbers(values):
+    numbers = set()
+    for value in values:
+        try:
+            numbers.add(float(value))
+        except ValueError:
+            pass
+    return numbers
+
+_ORDERING = {'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+
+def _test(op, operand):
+    """stored value -> bool for one operator; numbers compare as numbers"""
+    if op == 'is':
+        if operand in ('null', 'unknown'):
+            return lambda stored: stored is None
+        return lambda stored: stored is not None and _text(stored) == operand
+    if op in ('like', 'ilike'):
+        fullmatch = _like_pattern(operand, op == 'ilike').fullmatch
+        return lambda stored: fullmatch(stored if isinstance(stored, str) else _text(stored)) is not None
+    values = operand if op == 'in' else [operand]
+    texts, numbers = set(values), _numbers(values)
+    if op in ('eq', 'in'):
+        return lambda stored: stored in numbers if _is_number(stored) else _text(stored) in texts
+    if op == 'neq':
+        return lambda stored: stored not in numbers if _is_number(stored) else _text(stored) not in texts
+    compare, number = _ORDERING[op], next(iter(numbers), None)
+    return lambda stored: (compare(stored, number) if number is not None and _is_number(stored)
+                           else compare(_text(stored), operand))
+
+def _predicate(expression):
+    """row -> bool for a filter expression, built once per request"""
+    kind = expression[0]
+    if kind == 'cond':
+        _, column, op, negated, operand = expression
+        test = _test(op, operand)
+        if op == 'is':
+            return lambda row: test(row.get(column)) != negated
+
+        def match(row):
+            stored = row.get(column)
+            # NULL compares as unknown, negated or not
+            return stored is not None and test(stored) != negated
+        return match
+    _, negated, items = expression
+    combine = any if kind == 'or' else all
+    children = [_predicate(item) for item in items]
+    return lambda row: combine(child(row) for child in children) != negated
+
+def _filter(rows, filters):
+    for expression in filters:
+        predicate = _predicate(expression)
+        rows = [row for row in rows if predicate(row)]
+    return rows
+
+def _sort(rows, order):
+    for column, descending, nulls_first in reversed(order):
+        # Under reverse=True the larger rank comes first
+        null_rank = 1 if nulls_first == descending else 0
+        rows.sort(key=lambda row: ((null_rank, '') if row.get(column) is None
+                                   else (1 - null_rank, row.get(column))),
+                  reverse=descending)
+    return rows
+
+
+# -- Stores -----------------------------------------------------------------
+
+class StubStore:
+    """Request counters and the store interface; rows live in the subclasses.
+
+    insert/update/delete return the affected rows when `returning` is set,
+    otherwise their number. select returns (rows, total matching), with
+    total None when it was not asked for and is not free to compute.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def note(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def call(self, function, arguments):
+        # No database functions here; answer like PostgREST does for a
+        # function that was never created
+        raise QueryError(404, 'PGRST202', f"Could not find the function public.{function}")
+
+    def count(self, table):
+        return self.table_counts().get(table, 0)
+
+    def close(self):
+        pass
+
+
+class MemoryStore(StubStore):
+    """In-memory tables: name -> list of row dicts with a BIGSERIAL-style id"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = {}
+        self.next_id = {}
+        # (table, on_conflict column) -> {key: row}, kept across requests
+        self.indexes = {}
+
+    def _index(self, table, column):
+        index = self.indexes.get((table, column))
+        if index is None:
+            index = {row.get(column): row for row in self.tables.get(table, [])
+                     if row.get(column) is not None}
+            self.indexes[(table, column)] = index
+        return index
+
+    def _drop_indexes(self, table, keep=None):
+        for key in [key for key in self.indexes if key[0] == table and key[1] != keep]:
+            del self.indexes[key]
+
+    def insert(self, table, rows, on_conflict=None, merge=False, returning=False):
+        with self.lock:
+            existing = self.tables.setdefault(table, [])
+            index = self._index(table, on_conflict) if on_conflict else None
+            self._drop_indexes(table, keep=on_conflict)
+            inserted = []
+            for row in rows:
+                key = row.get(on_conflict) if on_conflict else None
+                if key is not None and key in index:
+                    if merge:
+                        index[key].update(row)
+                        inserted.append(index[key])
+                    continue
+                new_id = self.next_id.get(table, 0) + 1
+                self.next_id[table] = new_id
+                stored = dict(row, id=row.get('id', new_id))
+                existing.append(stored)
+                if key is not None:
+                    index[key] = stored
+                inserted.append(stored)
+            return inserted if returning else len(inserted)
+
+    def select(self, table, filters, order=(), offset=0, limit=None, count=False):
+        with self.lock:
+            rows = list(self.tables.get(table, []))
+        rows = _filter(rows, filters)
+        _sort(rows, order)
+        end = None if limit is None else offset + limit
+        return rows[offset:end], len(rows)
+
+    def update(self, table, filters, values, returning=False):
+        with self.lock:
+            rows = _filter(self.tables.get(table, []), filters)
+            for row in rows:
+                row.update(values)
+            self._drop_indexes(table)
+            return rows if returning else len(rows)
+
+    def delete(self, table, filters, returning=False):
+        with self.lock:
+            removed = _filter(self.tables.get(table, []), filters)
+            gone = set(map(id, removed))
+            rows = [row for row in self.tables.get(table, []) if id(row) not in gone]
+            self.tables[table] = rows
+            self._drop_indexes(table)
+            return removed if returning else len(removed)
+
+    def table_counts(self):
+        with self.lock:
+            return {table: len(rows) for table, rows in self.tables.items()}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+_SQL_OPERATORS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+class SqliteStore(StubStore):
+    """Tables in a SQLite database, created from the rows written to them.
+
+    A column's type comes from its first non-null value, so filters such as
+    sales_id=eq.5 compare as numbers. Statements run one at a time on a
+    single connection.
+    """
+
+    placeholder = '?'
+    no_limit = '-1'
+    creates_tables = True
+
+    def __init__(self, path=':memory:'):
+        super().__init__()
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._columns = {}
+
+    # Dialect hooks (overridden by PostgresStore)
+
+    @contextmanager
+    def _cursor(self):
+        with self.lock:
+            try:
+                with self.connection:
+                    yield self.connection.cursor()
+            except sqlite3.Error as e:
+                self._columns.clear()  # columns added by the failed statement were rolled back
+                status = 409 if isinstance(e, sqlite3.IntegrityError) else 400
+                raise QueryError(status, '23505' if status == 409 else 'PGRST000', str(e))
+
+    def _load_columns(self, cursor, table):
+        rows = cursor.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        return [row[1] for row in rows] or None
+
+    def _like(self, target, op, operand, values):
+        if op == 'ilike':
+            values.append(operand)
+            return f"{target} LIKE {self.placeholder}"  # case-insensitive for ASCII
+        glob = ''.join('*' if char == '%' else '?' if char == '_' else
+                       f"[{char}]" if char in '*?[' else char for char in operand)
+        values.append(glob)
+        return f"{target} GLOB {self.placeholder}"
+
+    # Shared SQL
+
+    def columns(self, cursor, table):
+        """The table's columns, or None if it does not exist"""
+        if table not in self._columns:
+            self._columns[table] = self._load_columns(cursor, table)
+        return self._columns[table]
+
+    def _column(self, columns, table, column):
+        if column not in columns:
+            raise QueryError(400, '42703', f"column {table}.{column} does not exist")
+        return _quote(column)
+
+    def _condition_sql(self, columns, table, expression, values):
+        kind = expression[0]
+        if kind == 'cond':
+            _, column, op, negated, operand = expression
+            target = self._column(columns, table, column)
+            if op == 'is':
+                clause = f"{target} IS {_IS_VALUES[operand]}"
+            elif op == 'in':
+                values.extend(operand)
+                clause = (f"{target} IN ({', '.join([self.placeholder] * len(operand))})"
+                          if operand else '1 = 0')
+            elif op in ('like', 'ilike'):
+                clause = self._like(target, op, operand, values)
+            else:
+                values.append(operand)
+                clause = f"{target} {_SQL_OPERATORS[op]} {self.placeholder}"
+            return f"NOT ({clause})" if negated else clause
+        _, negated, items = expression
+        if not items:
+            return '1 = 1'
+        joined = f" {kind.upper()} ".join(self._condition_sql(columns, table, item, values)
+                                          for item in items)
+        return f"{'NOT ' if negated else ''}({joined})"
+
+    def _where(self, columns, table, filters):
+        values = []
+        clauses = [self._condition_sql(columns, table, expression, values) for expression in filters]
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), values
+
+    def _order_sql(self, columns, table, order):
+        if not order:
+            return ''
+        return ' ORDER BY ' + ', '.join(
+            f"{self._column(columns, table, column)} {'DESC' if descending else 'ASC'} "
+            f"NULLS {'FIRST' if nulls_first else 'LAST'}"
+            for column, descending, nulls_first in order)
+
+    def _existing(self, cursor, table):
+        columns = self.columns(cursor, table)
+        if columns is None and not self.creates_tables:
+            raise QueryError(404, 'PGRST205', f"Could not find the table 'public.{table}' in the schema cache")
+        return columns
+
+    def select(self, table, filters, order=(), offset=0, limit=None, count=False):
+        with self._cursor() as cursor:
+            columns = self._existing(cursor, table)
+            if columns is None:
+                return [], 0  # nothing written to it yet
+            where, values = self._where(columns, table, filters)
+            sql = f"SELECT * FROM {_quote(table)}{where}{self._order_sql(columns, table, order)}"
+            if limit is not None or offset:
+                sql += f" LIMIT {self.no_limit if limit is None else int(limit)} OFFSET {int(offset)}"
+            rows = [dict(row) for row in cursor.execute(sql, values).fetchall()]
+            total = None
+            if count:
+                row = cursor.execute(f"SELECT count(*) AS count FROM {_quote(table)}{where}", values).fetchone()
+                total = row['count']
+            return rows, total
+
+    def update(self, table, filters, values, returning=False):
+        with self._cursor() as cursor:
+            if self._existing(cursor, table) is None:
+                return [] if returning else 0
+            columns = self._prepare(cursor, table, [values])
+            where, where_values = self._where(columns, table, filters)
+            assignments = ', '.join(f"{_quote(name)} = {self.placeholder}" for name in values)
+            sql = f"UPDATE {_quote(table)} SET {assignments}{where}"
+            return self._write(cursor, sql + (' RETURNING *' if returning else ''),
+                               [self._value(value) for value in values.values()] + where_values,
+                               returning)
+
+    def delete(self, table, filters, returning=False):
+        with self._cursor() as cursor:
+            columns = self._existing(cursor, table)
+            if columns is None:
+                return [] if returning else 0
+            where, values = self._where(columns, table, filters)
+            sql = f"DELETE FROM {_quote(table)}{where}"
+            return self._write(cursor, sql + (' RETURNING *' if returning else ''), values, returning)
+
+    def _write(self, cursor, sql, values, returning):
+        cursor.execute(sql, values)
+        return [dict(row) for row in cursor.fetchall()] if returning else cursor.rowcount
+
+    # SQLite writes
+
+    def _value(self, value):
+        return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    def _prepare(self, cursor, table, rows):
+        """Create the table and any columns the rows bring; returns the columns"""
+        columns = self.columns(cursor, table)
+        if columns is None:
+            cursor.execute(f"CREATE TABLE {_quote(table)} (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+            columns = ['id']
+        added = False
+        for name in dict.fromkeys(key for row in rows for key in row):
+            if name not in columns:
+                sample = next((row[name] for row in rows if row.get(name) is not None), None)
+                cursor.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(name)} {_sqlite_type(sample)}")
+                added = True
+        if added or table not in self._columns or self._columns[table] is None:
+            self._columns[table] = self._load_columns(cursor, table)
+        return self._columns[table]
+
+    def insert(self, table, rows, on_conflict=None, merge=False, returning=False):
+        if not rows:
+            return [] if returning else 0
+        with self._cursor() as cursor:
+            self._prepare(cursor, table, rows)
+            names = list(dict.fromkeys(key for row in rows for key in row))
+            if on_conflict:
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'{table}_{on_conflict}_key')} "
+                               f"ON {_quote(table)} ({_quote(on_conflict)})")
+            sql = (f"INSERT INTO {_quote(table)} ({', '.join(map(_quote, names))}) "
+                   f"VALUES ({', '.join([self.placeholder] * len(names))})")
+            sql += _conflict_sql(names, on_conflict, merge)
+            values = [[self._value(row.get(name)) for name in names] for row in rows]
+            if not returning:
+                cursor.executemany(sql, values)
+                return cursor.rowcount
+            inserted = []
+            for row_values in values:
+                cursor.execute(sql + ' RETURNING *', row_values)
+                inserted.extend(dict(row) for row in cursor.fetchall())
+            return inserted
+
+    def table_counts(self):
+        with self._cursor() as cursor:
+            tables = [row[0] for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            return {table: cursor.execute(f"SELECT count(*) AS count FROM {_quote(table)}").fetchone()['count']
+                    for table in tables}
+
+    def close(self):
+        self.connection.close()
+
+
+def _sqlite_type(value):
+    if isinstance(value, (bool, int)):
+        return 'INTEGER'
+    if isinstance(value, float):
+        return 'REAL'
+    if isinstance(value, (str, dict, list)):
+        return 'TEXT'
+    return ''  # no affinity: values are kept as written
+
+def _conflict_sql(names, on_conflict, merge):
+    if not on_conflict:
+        return ''
+    updates = ', '.join(f"{_quote(name)} = EXCLUDED.{_quote(name)}"
+                        for name in names if name != on_conflict)
+    if merge and updates:
+        return f" ON CONFLICT ({_quote(on_conflict)}) DO UPDATE SET {updates}"
+    return f" ON CONFLICT ({_quote(on_conflict)}) DO NOTHING"
+
+
+# PostgREST's status for a Postgres error, by SQLSTATE (the rest are 400s)
+_SQLSTATE_STATUS = {'23503': 409, '23505': 409, '42P01': 404, '42883': 404, '57014': 500}
+
+
+class PostgresStore(SqliteStore):
+    """Tables in an existing Postgres database (create them from the schema
+    files first); a pool of up to pool_size connections serves requests."""
+
+    placeholder = '%s'
+    no_limit = 'ALL'
+    creates_tables = False
+
+    def __init__(self, dsn=None, pool_size=4):
+        StubStore.__init__(self)
+        from copy_loader import DATABASE_URL, connect
+        self.dsn = dsn or DATABASE_URL
+        self._connect = connect
+        self._columns = {}
+        self.pool = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self._connect(self.dsn).close()  # fail at startup, not on the first request
+
+    @contextmanager
+    def _cursor(self):
+        with self.slots:
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                connection = self._connect(self.dsn)
+                connection.autocommit = True
+            try:
+                with connection.transaction(), connection.cursor(row_factory=dict_row) as cursor:
+                    yield cursor
+            except psycopg.Error as e:
+                state = e.sqlstate or 'PGRST000'
+                message = e.diag.message_primary or str(e)
+                code = 'PGRST202' if state == '42883' else state
+                raise QueryError(_SQLSTATE_STATUS.get(state, 400), code, message, e.diag.message_detail)
+            finally:
+                if not connection.closed:
+                    self.pool.put(connection)
+
+    def _load_columns(self, cursor, table):
+        cursor.execute("SELECT column_name FROM information_schema.columns "
+                       "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position",
+                       [table])
+        return [row['column_name'] for row in cursor.fetchall()] or None
+
+    def _like(self, target, op, operand, values):
+        values.append(operand)
+        return f"{target}::text {'ILIKE' if op == 'ilike' else 'LIKE'} %s"
+
+    def _value(self, value):
+        if isinstance(value, (dict, list)):
+            return Jsonb(value)
+        return value
+
+    def _prepare(self, cursor, table, rows):
+        columns = self._existing(cursor, table)
+        for name in dict.fromkeys(key for row in rows for key in row):
+            if name not in columns:
+                raise QueryError(400, 'PGRST204',
+                                 f"Could not find the '{name}' column of '{table}' in the schema cache")
+        return columns
+
+    def insert(self, table, rows, on_conflict=None, merge=False, returning=False):
+        if not rows:
+            return [] if returning else 0
+        with self._cursor() as cursor:
+            self._prepare(cursor, table, rows)
+            names = ', '.join(map(_quote, dict.fromkeys(key for row in rows for key in row)))
+            # One statement per request, as PostgREST does; Postgres does the
+            # JSON-to-column conversions
+            sql = (f"INSERT INTO {_quote(table)} ({names}) SELECT {names} "
+                   f"FROM json_populate_recordset(NULL::{_quote(table)}, %s::json)")
+            sql += _conflict_sql(list(dict.fromkeys(key for row in rows for key in row)), on_conflict, merge)
+            return self._write(cursor, sql + (' RETURNING *' if returning else ''),
+                               [json.dumps(rows, default=_json_default)], returning)
+
+    def call(self, function, arguments):
+        with self._cursor() as cursor:
+            names = list(arguments)
+            cursor.execute(f"SELECT * FROM {_quote(function)}("
+                           + ', '.join(f"{_quote(name)} => %s" for name in names) + ')',
+                           [self._value(arguments[name]) for name in names])
+            rows = cursor.fetchall()
+        # A scalar function gives one column named after itself; PostgREST
+        # returns the bare value
+        if len(rows) == 1 and list(rows[0]) == [function]:
+            return rows[0][function]
+        return rows
+
+    def table_counts(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT relname, n_live_tup FROM pg_stat_user_tables ORDER BY relname")
+            return {row['relname']: row['n_live_tup'] for row in cursor.fetchall()}
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+
+def open_store(backend='memory', database=None):
+    """A store for --backend (database: SQLite path or Postgres URL)"""
+    if backend == 'sqlite':
+        return SqliteStore(database or ':memory:')
+    if backend == 'postgres':
+        return PostgresStore(database)
+    return MemoryStore()
+
+
+# -- HTTP -------------------------------------------------------------------
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in two writes; with Nagle on, the second waits
+    # for the client's delayed ACK and adds ~40 ms to every keep-alive reply
+    disable_nagle_algorithm = True
+    store = None
+    config = None
+    bucket = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _table(self):
+        path = urlsplit(self.path).path
+        prefix = '/rest/v1/'
+        return path[len(prefix):] if path.startswith(prefix) else None
+
+    def _params(self):
+        return parse_qsl(urlsplit(self.path).query, keep_blank_values=True)
+
+    def _prefer(self):
+        return {part.strip() for part in self.headers.get('Prefer', '').split(',') if part.strip()}
+
+    def _send_json(self, status, body, headers=None):
+        payload = b'' if body is None else json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, error):
+        self._send_json(error.status, error.body)
+
+    def _send_rows(self, status, rows, headers=None):
+        """rows as a JSON array, or the one object .single() asked for"""
+        if OBJECT_MEDIA_TYPE in self.headers.get('Accept', ''):
+            if len(rows) != 1:
+                return self._send_json(406, {
+                    'code': 'PGRST116', 'hint': None,
+                    'details': f"The result contains {len(rows)} rows",
+                    'message': 'JSON object requested, multiple (or no) rows returned'})
+            return self._send_json(status, rows[0], headers)
+        self._send_json(status, rows, headers)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _read_json(self):
+        body = self._read_body()
+        try:
+            if body and self.config.gzip and self.headers.get('Content-Encoding', '').lower() == 'gzip':
+                body = gzip.decompress(body)
+            return json.loads(body or b'[]')
+        except (ValueError, OSError, EOFError) as e:
+            raise QueryError(400, 'PGRST102', str(e))
+
+    def _gate(self):
+        """Apply latency and fault injection; returns False if a fault was sent"""
+        self.store.note('requests')
+        config = self.config
+        if config.latency or config.jitter:
+            time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+        if self.bucket is not None and not self.bucket.take():
+            self.store.note('throttled')
+            self._read_body()
+            self._send_json(429, {'message': 'Too Many Requests'},
+                            {'Retry-After': str(config.retry_after)})
+            return False
+        if config.error_rate and random.random() < config.error_rate:
+            self.store.note('failed')
+            self._read_body()
+            self._send_json(503, {'message': 'Service Unavailable'})
+            return False
+        return True
+
+    def _capped(self, rows):
+        """rows cut at max_rows"""
+        max_rows = self.config.max_rows
+        return rows[:max_rows] if max_rows is not None else rows
+
+    def _range(self, params):
+        """(offset, limit) from ?offset=&limit= or a 'Range: 0-24' header,
+        with the limit cut at max_rows"""
+        options = dict(params)
+        offset = int(options.get('offset', 0))
+        limit = int(options['limit']) if 'limit' in options else None
+        header = self.headers.get('Range', '')
+        match = re.fullmatch(r'\s*(\d+)-(\d*)\s*', header)
+        if match and 'limit' not in options:
+            offset = int(match.group(1))
+            if match.group(2):
+                limit = max(int(match.group(2)) - offset + 1, 0)
+        if self.config.max_rows is not None:
+            limit = self.config.max_rows if limit is None else min(limit, self.config.max_rows)
+        return offset, limit
+
+    def _handle(self, method):
+        table = self._table()
+        if not self._gate():
+            return
+        if table is None:
+            self._read_body()
+            return self._send_json(404, {'message': 'Not found'})
+        try:
+            method(table)
+        except QueryError as e:
+            self._send_error(e)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _post(self, table):
+        if table.startswith('rpc/'):
+            arguments = self._read_json()
+            result = self.store.call(table[4:], arguments if isinstance(arguments, dict) else {})
+            return self._send_json(200, result)
+        rows = self._read_json()
+        if isinstance(rows, dict):
+            rows = [rows]
+        params = dict(self._params())
+        if params.get('columns'):
+            # The row layout comes from ?columns=; absent keys are NULL
+            names = [name.strip().strip('"') for name in params['columns'].split(',')]
+            rows = [{name: row.get(name) for name in names} for row in rows]
+        prefer = self._prefer()
+        merge = 'resolution=merge-duplicates' in prefer
+        ignore = 'resolution=ignore-duplicates' in prefer
+        on_conflict = params.get('on_conflict') if (merge or ignore) else None
+        representation = 'return=representation' in prefer
+        if self.config.discard:
+            inserted = rows
+        else:
+            inserted = self.store.insert(table, rows, on_conflict, merge, returning=representation)
+        if representation:
+            return self._send_rows(201, _project(self._capped(inserted), parse_select(self._params())))
+        self._send_json(201, None)
+
+    def do_GET(self, head=False):
+        self._handle(lambda table: self._get(table, head))
+
+    def _get(self, table, head):
+        self._read_body()
+        params = self._params()
+        offset, limit = self._range(params)
+        counting = any(option.startswith('count=') for option in self._prefer())
+        rows, total = self.store.select(table, parse_filters(params), parse_order(params),
+                                        offset, limit, counting)
+        count = str(total) if counting and total is not None else '*'
+        content_range = f"{offset}-{offset + len(rows) - 1}/{count}" if rows else f"*/{count}"
+        if head:
+            self.send_response(200)
+            self.send_header('Content-Range', content_range)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_rows(200, _project(rows, parse_select(params)), {'Content-Range': content_range})
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_PATCH(self):
+        self._handle(self._patch)
+
+    def _patch(self, table):
+        values = self._read_json()
+        if not isinstance(values, dict):
+            raise QueryError(400, 'PGRST102', 'Expected a JSON object to update')
+        params = self._params()
+        representation = 'return=representation' in self._prefer()
+        updated = self.store.update(table, parse_filters(params), values, returning=representation)
+        if representation:
+            return self._send_rows(200, _project(self._capped(updated), parse_select(params)))
+        self._send_json(204, None, {'Content-Range': f"0-{updated - 1}/*" if updated else '*/*'})
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+    def _delete(self, table):
+        self._read_body()  # postgrest-py sends '{}'; left unread it would prefix the next request
+        params = self._params()
+        representation = 'return=representation' in self._prefer()
+        removed = self.store.delete(table, parse_filters(params), returning=representation)
+        if representation:
+            return self._send_rows(200, _project(self._capped(removed), parse_select(params)))
+        self._send_json(204, None, {'Content-Range': f"*/{removed}"})
+
+
+def start_stub(port=0, host='127.0.0.1', store=None, **options):
+    """Start the stub on a background thread; returns the server.
+
+    server.url is the base URL for create_client(), server.store holds the
+    data and counters (a MemoryStore unless one is given), and
+    server.config can be edited to change faults.
+    """
+    config = StubConfig(**options)
+    handler = type('BoundStubHandler', (StubHandler,), {
+        'store': store if store is not None else MemoryStore(),
+        'config': config,
+        'bucket': TokenBucket(config.rate_limit) if config.rate_limit else None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}"
+    server.store = handler.store
+    server.config = config
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def load_fixture(store, rows, seed=42, table='sales_transactions', batch_size=5000):
+    """Fill the store with a sales_fixtures file as the 'updated' profile
+    imports it (upserted on sales_id, so reloading is safe); returns the rows stored"""
+    from csv_reader import CsvChunkReader
+    from sales_fixtures import fixture_csv
+    from sales_profiles import PROFILES
+    from sales_transform import iter_record_batches
+
+    profile = PROFILES['updated']
+    stored = 0
+    for chunk in CsvChunkReader(fixture_csv(rows, seed), 50000, 'pandas', profile.dtype):
+        for _, records in iter_record_batches(profile.prepare(chunk), profile.transform, batch_size):
+            if records:
+                stored += store.insert(table, records, on_conflict=profile.key, merge=True)
+    return stored
+
+def main():
+    parser = argparse.ArgumentParser(description='Local PostgREST stand-in')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--backend', choices=BACKENDS, default='memory',
+                        help='where rows are kept (default: memory)')
+    parser.add_argument('--database', '--database-url', dest='database',
+                        help='SQLite file (default: :memory:) or Postgres URL (default: DATABASE_URL)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='+/- random latency')
+    parser.add_argument('--rate-limit', type=float, help='requests/sec before 429s')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429s (default: 1)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses')
+    parser.add_argument('--max-rows', type=int, help='most rows per response, like db-max-rows')
+    parser.add_argument('--no-gzip', action='store_true',
+                        help='do not decompress gzip request bodies (as PostgREST without a proxy)')
+    parser.add_argument('--load-fixture', type=int, metavar='ROWS',
+                        help='first load a generated sales file of ROWS rows into sales_transactions')
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.database)
+    if args.load_fixture:
+        started = time.monotonic()
+        stored = load_fixture(store, args.load_fixture)
+        print(f"Loaded {stored:,} sales from the {args.load_fixture:,}-row fixture "
+              f"in {time.monotonic() - started:.1f}s")
+    server = start_stub(port=args.port, store=store, latency=args.latency_ms / 1000,
+                        jitter=args.jitter_ms / 1000, rate_limit=args.rate_limit,
+                        retry_after=args.retry_after, error_rate=args.error_rate,
+                        max_rows=args.max_rows, gzip=not args.no_gzip)
+    print(f"PostgREST stub ({args.backend}) listening on {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"  requests: {store.requests:,} | throttled: {store.throttled:,} | "
+                  f"503s: {store.failed:,} | rows: "
+                  + ', '.join(f"{table}={rows:,}" for table, rows in store.table_counts().items()))
+    except KeyboardInterrupt:
+        server.shutdown()
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+-- Monthly repeat-sales price index per ECF neighborhood and citywide
+-- Run this in Supabase SQL Editor after updated-sales-schema.sql
+--
+-- price_index.py fits the series from repeat sales of the same parcel and
+-- upserts them here (python3 price_index.py build --publish, then update
+-- --publish after each import). One row per neighborhood and month; the
+-- whole city is ecf_neighborhood = 'CITYWIDE'. index_value is 100 in the
+-- first month of the data, so a value of 150 means prices 50% above then.
+--
+-- Reading one series (js/sales-api.js getPriceIndex()):
+--
+--   SELECT period, index_value, pairs FROM neighborhood_price_index
+--   WHERE ecf_neighborhood = 'CITYWIDE' ORDER BY period;
+
+CREATE TABLE IF NOT EXISTS neighborhood_price_index (
+    ecf_neighborhood VARCHAR(100) NOT NULL,
+    period DATE NOT NULL,                   -- first day of the month
+    index_value DECIMAL(10, 2) NOT NULL,
+    pairs INTEGER NOT NULL DEFAULT 0,       -- repeat-sale pairs starting or ending in the month
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (ecf_neighborhood, period)
+);
+
+DROP TRIGGER IF EXISTS update_neighborhood_price_index_updated_at ON neighborhood_price_index;
+CREATE TRIGGER update_neighborhood_price_index_updated_at
+    BEFORE UPDATE ON neighborhood_price_index
+    FOR EACH ROW
+    EXECUTE FUNCTION update_sales_updated_at_column();
+
+ALTER TABLE neighborhood_price_index ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow public read access" ON neighborhood_price_index;
+CREATE POLICY "Allow public read access" ON neighborhood_price_index
+    FOR SELECT USING (true);
+
+-- price_index.py publishes with the same key as the importers
+DROP POLICY IF EXISTS "Allow public inserts" ON neighborhood_price_index;
+CREATE POLICY "Allow public inserts" ON neighborhood_price_index
+    FOR INSERT TO anon
+    WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Allow public updates" ON neighborhood_price_index;
+CREATE POLICY "Allow public updates" ON neighborhood_price_index
+    FOR UPDATE TO anon
+    USING (true)
+    WITH CHECK (true);
+
+GRANT SELECT, INSERT, UPDATE ON neighborhood_price_index TO anon;
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Monthly repeat-sales price index per ECF neighborhood and citywide
+
+Average sale prices move with the mix of houses that happen to sell. A
+repeat-sales index only compares a parcel with itself: every time a parcel
+sells again, the log of the price ratio is one observation of how much the
+market moved between the two months. PriceIndex keeps those pairs and the
+fitted series:
+
+  sales     arm's-length sales (comps.py's terms and minimum price) with a
+            parcel number and date, as (sales_id, parcel key, month, log
+            price, neighborhood)
+  pairs     sort-merge: sorted by parcel and month, each sale is paired with
+            the parcel's previous one (of several in a month, the last one
+            counts); pairs further apart than MAX_RATIO either way are
+            dropped as data errors or gut rehabs. A pair belongs to the
+            neighborhood of its second sale
+  fit       per neighborhood with at least MIN_PAIRS pairs, and citywide:
+            log index b[t] by least squares on ratio = b[second] - b[first]
+            (Bailey-Muth-Nourse), with b = 0 in the first month and
+            `smoothing` times the squared month-to-month changes added,
+            which fills months without pairs and damps thin ones. The
+            normal equations are one months x months matrix, solved with
+            NumPy
+  update    only sales not seen before are added; the parcels they belong
+            to are re-paired, and each neighborhood whose pairs changed is
+            refitted from its earliest changed month on, with the months
+            before it held at their published values. Only the refitted
+            months are returned for publishing
+
+The state (sales, pairs, series) is a compressed .npz next to this script;
+the series go to the neighborhood_price_index table (price-index-schema.sql)
+as (ecf_neighborhood, period, index_value, pairs) rows, 'CITYWIDE' for the
+whole city, index 100 in the first month.
+
+Needs a snapshot: python3 market_query.py build
+
+Usage (run from backend-scripts/):
+    python3 price_index.py build --publish             # from scratch
+    python3 price_index.py update --publish            # after an import + snapshot refresh
+    python3 price_index.py show "5010 NBHD"
+
+    index = PriceIndex(PRICE_INDEX_FILE)
+    changed = index.update(repeat_sale_candidates(sales_df))
+    publish(supabase, index.rows(changed))
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from comps import ARMS_LENGTH_TERMS, MIN_PRICE
+from market_query import SALES, SNAPSHOT_DIR
+from parcel_linker import normalize_parcel_ids
+
+PRICE_INDEX_FILE = 'sales_transactions.index.npz'
+INDEX_TABLE = 'neighborhood_price_index'
+CITYWIDE = 'CITYWIDE'
+
+MIN_PAIRS = 30      # pairs a neighborhood needs for a series of its own
+SMOOTHING = 1.0     # weight of the squared month-to-month changes
+MAX_RATIO = 10.0    # pairs whose prices differ more than this are dropped
+BASE_VALUE = 100.0
+
+PUBLISH_BATCH = 1000
+
+SALE_COLUMNS = ['sales_id', 'parcel_number', 'sale_date', 'sale_price', 'terms_of_sale', 'ecf_neighborhood']
+# Field -> dtype of the sales and pairs frames
+_SALE_FIELDS = {'sales_id': np.int64, 'key': str, 'month': np.int64, 'log_price': float, 'hood': str}
+_PAIR_FIELDS = {'key': str, 'hood': str, 'first': np.int64, 'second': np.int64, 'ratio': float}
+
+
+def month_numbers(dates):
+    """Dates to months since January 1970"""
+    return pd.to_datetime(dates, errors='coerce').to_numpy(dtype='datetime64[M]').astype(np.int64)
+
+def period_start(month):
+    """Month number to 'YYYY-MM-01'"""
+    return str(np.datetime64(int(month), 'M').astype('datetime64[D]'))
+
+
+def repeat_sale_candidates(sales):
+    """The sales the index uses, as a frame of (sales_id, key, month,
+    log_price, hood); hood is '' when the sale has no neighborhood"""
+    prices = pd.to_numeric(sales['sale_price'], errors='coerce').to_numpy(dtype=float)
+    terms = sales['terms_of_sale'].astype('string').str.strip().str.upper()
+    dates = pd.to_datetime(sales['sale_date'], errors='coerce')
+    months = month_numbers(dates)
+    keys = normalize_parcel_ids(sales['parcel_number'])
+    keep = (terms.isin(ARMS_LENGTH_TERMS).fillna(False).to_numpy() & (prices >= MIN_PRICE)
+            & dates.notna().to_numpy() & pd.notna(keys)
+            & pd.to_numeric(sales['sales_id'], errors='coerce').notna().to_numpy())
+    hoods = sales['ecf_neighborhood'].astype('string').str.strip().fillna('').to_numpy(dtype=str)
+    return pd.DataFrame({
+        'sales_id': pd.to_numeric(sales['sales_id'], errors='coerce').to_numpy()[keep].astype(np.int64),
+        'key': keys[keep].astype(str),
+        'month': months[keep],
+        'log_price': np.log(prices[keep]),
+        'hood': hoods[keep],
+    })
+
+def pair_sales(sales):
+    """Consecutive sales of each parcel as (key, hood, first, second, ratio)
+    pairs; first/second are month numbers and ratio the log price change"""
+    ordered = sales.sort_values(['key', 'month', 'sales_id'], kind='stable')
+    key, month = ordered['key'].to_numpy(), ordered['month'].to_numpy()
+    # Of several sales of a parcel in one month, the last one stands for it
+    last = np.ones(len(ordered), dtype=bool)
+    last[:-1] = (key[1:] != key[:-1]) | (month[1:] != month[:-1])
+    ordered = ordered[last]
+    key, month = ordered['key'].to_numpy(), ordered['month'].to_numpy()
+    price, hood = ordered['log_price'].to_numpy(), ordered['hood'].to_numpy()
+
+    same = np.flatnonzero(key[1:] == key[:-1])
+    ratio = price[same + 1] - price[same]
+    keep = np.abs(ratio) <= np.log(MAX_RATIO)
+    first, second = same[keep], same[keep] + 1
+    return pd.DataFrame({
+        'key': key[second],
+        'hood': np.where(hood[second] != '', hood[second], hood[first]),
+        'first': month[first],
+        'second': month[second],
+        'ratio': ratio[keep],
+    })
+
+def fit_index(first, second, ratio, periods, smoothing=SMOOTHING, known=None, start=1):
+    """Log index for periods 0..periods-1 from pairs of period numbers.
+
+    Period 0 is 0 and periods before start are held at known; the rest
+    minimize the squared pair residuals plus smoothing times the squared
+    changes between consecutive periods. smoothing must be positive: it is
+    what ties months without pairs to their neighbors, and without it the
+    normal equations are singular.
+    """
+    if not smoothing > 0:
+        raise ValueError(f"smoothing must be positive, not {smoothing!r}")
+    cells = np.bincount(np.concatenate([first * periods + first, second * periods + second]),
+                        minlength=periods * periods)
+    cells = cells - np.bincount(np.concatenate([first * periods + second, second * periods + first]),
+                                minlength=periods * periods)
+    normal = cells.reshape(periods, periods).astype(float)
+    target = np.bincount(second, ratio, periods) - np.bincount(first, ratio, periods)
+    if periods > 1:
+        steps = np.arange(periods - 1)
+        normal[steps, steps] += smoothing
+        normal[steps + 1, steps + 1] += smoothing
+        normal[steps, steps + 1] -= smoothing
+        normal[steps + 1, steps] -= smoothing
+
+    log_index = np.zeros(periods)
+    start = max(start, 1)
+    if known is not None:
+        log_index[:start] = known[:start]
+    if start < periods:
+        held, free = slice(0, start), slice(start, periods)
+        log_index[free] = np.linalg.solve(normal[free, free],
+                                          target[free] - normal[free, held] @ log_index[held])
+    return log_index
+
+
+class PriceIndex:
+    """Repeat-sales pairs and the fitted monthly series, per neighborhood"""
+
+    def __init__(self, path=PRICE_INDEX_FILE, min_pairs=MIN_PAIRS, smoothing=SMOOTHING):
+        if not smoothing > 0:
+            raise ValueError(f"smoothing must be positive, not {smoothing!r}")
+        self.path = path
+        self.min_pairs = min_pairs
+        self.smoothing = smoothing
+        self.sales = pd.DataFrame({name: np.empty(0, dtype) for name, dtype in _SALE_FIELDS.items()})
+        self.pairs = pd.DataFrame({name: np.empty(0, dtype) for name, dtype in _PAIR_FIELDS.items()})
+        self.base = None      # month number of period 0
+        self.series = {}      # hood -> log index by period
+        self.skipped = 0      # sales before the first month, left out
+        if path and os.path.exists(path):
+            with np.load(path) as saved:
+                self.sales = pd.DataFrame({name: saved[f"sale_{name}"] for name in _SALE_FIELDS})
+                self.pairs = pd.DataFrame({name: saved[f"pair_{name}"] for name in _PAIR_FIELDS})
+                self.base = int(saved['base'])
+                self.series = dict(zip(saved['hoods'].tolist(), saved['log_index']))
+                self.min_pairs = int(saved['min_pairs'])
+                self.smoothing = float(saved['smoothing'])
+
+    @property
+    def periods(self):
+        """Months from the first sale to the latest one"""
+        if self.base is None or not len(self.sales):
+            return 0
+        return int(self.sales['month'].max()) - self.base + 1
+
+    def update(self, sales):
+        """Add the sales (repeat_sale_candidates() rows) not seen before and
+        refit what they change; returns {hood: first refitted period}"""
+        sales = sales[~np.isin(sales['sales_id'].to_numpy(), self.sales['sales_id'].to_numpy())]
+        sales = sales.drop_duplicates('sales_id', keep='last')
+        if self.base is None and len(sales):
+            self.base = int(sales['month'].min())
+        if self.base is not None:
+            early = sales['month'].to_numpy() < self.base
+            self.skipped += int(early.sum())
+            sales = sales[~early]
+        if not len(sales):
+            return {}
+
+        # Re-pair just the parcels the new sales belong to
+        keys = sales['key'].unique()
+        touched = self.pairs['key'].isin(keys).to_numpy()
+        before = self.pairs[touched]
+        history = self.sales[self.sales['key'].isin(keys).to_numpy()]
+        after = pair_sales(pd.concat([history, sales], ignore_index=True))
+        self.sales = pd.concat([self.sales, sales], ignore_index=True)
+        self.pairs = pd.concat([self.pairs[~touched], after], ignore_index=True)
+
+        # Pairs on one side only are the change
+        diff = before.merge(after, how='outer', on=list(_PAIR_FIELDS), indicator=True)
+        diff = diff[diff['_merge'] != 'both']
+        changed = (diff['first'] - self.base).groupby(diff['hood']).min().to_dict()
+        changed.pop('', None)
+        if len(diff):
+            changed[CITYWIDE] = (diff['first'] - self.base).min()
+        refitted = self._refit({hood: int(period) for hood, period in changed.items()})
+
+        # Series without new pairs carry their last month forward into new
+        # months, which is what a refit would give them
+        periods = self.periods
+        for hood, log_index in self.series.items():
+            if len(log_index) < periods:
+                refitted.setdefault(hood, len(log_index))
+                self.series[hood] = np.pad(log_index, (0, periods - len(log_index)), mode='edge')
+        return refitted
+
+    def _refit(self, changed):
+        periods = self.periods
+        first = self.pairs['first'].to_numpy() - self.base
+        second = self.pairs['second'].to_numpy() - self.base
+        ratio = self.pairs['ratio'].to_numpy()
+        hoods = self.pairs['hood'].to_numpy()
+        refitted = {}
+        for hood, start in changed.items():
+            rows = slice(None) if hood == CITYWIDE else hoods == hood
+            if hood != CITYWIDE and np.count_nonzero(rows) < self.min_pairs:
+                self.series.pop(hood, None)
+                continue
+            known = self.series.get(hood)
+            if known is None:
+                start = 1
+            else:
+                known = np.pad(known, (0, periods - len(known)), mode='edge')
+            self.series[hood] = fit_index(first[rows], second[rows], ratio[rows], periods,
+                                          self.smoothing, known, start)
+            refitted[hood] = max(start, 1) if known is not None else 0
+        return refitted
+
+    def rows(self, changed=None):
+        """neighborhood_price_index rows: every period of every series, or
+        from the given period on for {hood: period}"""
+        if changed is None:
+            changed = dict.fromkeys(self.series, 0)
+        first = self.pairs['first'].to_numpy() - (self.base or 0)
+        second = self.pairs['second'].to_numpy() - (self.base or 0)
+        hoods = self.pairs['hood'].to_numpy()
+        rows = []
+        for hood, start in sorted(changed.items()):
+            if hood not in self.series:
+                continue
+            log_index = self.series[hood]
+            mask = slice(None) if hood == CITYWIDE else hoods == hood
+            pairs = (np.bincount(first[mask], minlength=len(log_index))
+                     + np.bincount(second[mask], minlength=len(log_index)))
+            values = np.round(BASE_VALUE * np.exp(log_index), 2)
+            rows.extend({'ecf_neighborhood': hood, 'period': period_start(self.base + period),
+                         'index_value': float(values[period]), 'pairs': int(pairs[period])}
+                        for period in range(start, len(log_index)))
+        return rows
+
+    def save(self, path=None):
+        path = path or self.path
+        tmp = path + '.tmp.npz'
+        hoods = sorted(self.series)
+        periods = max((len(self.series[hood]) for hood in hoods), default=0)
+        arrays = {f"sale_{name}": self.sales[name].to_numpy() for name in _SALE_FIELDS}
+        arrays.update({f"pair_{name}": self.pairs[name].to_numpy() for name in _PAIR_FIELDS})
+        for name in ('sale_key', 'sale_hood', 'pair_key', 'pair_hood'):
+            arrays[name] = arrays[name].astype(str)     # fixed-width, no pickling
+        np.savez_compressed(
+            tmp, **arrays, base=np.array(self.base if self.base is not None else -1),
+            hoods=np.array(hoods, dtype=str),
+            log_index=np.array([np.pad(self.series[hood], (0, periods - len(self.series[hood])))
+                                for hood in hoods]).reshape(len(hoods), periods),
+            min_pairs=np.array(self.min_pairs), smoothing=np.array(self.smoothing))
+        os.replace(tmp, path)
+
+    def summary(self):
+        span = (f"{period_start(self.base)[:7]} to {period_start(self.base + self.periods - 1)[:7]}"
+                if self.periods else 'empty')
+        return (f"Price index: {len(self.sales):,} sales | {len(self.pairs):,} pairs | "
+                f"{len(self.series) - (CITYWIDE in self.series):,} neighborhoods + citywide | {span}")
+
+
+def load_sales(directory=SNAPSHOT_DIR):
+    """repeat_sale_candidates() of a market_query.py snapshot's sales"""
+    path = os.path.join(directory, f"{SALES}.parquet")
+    if not os.path.exists(path):
+        raise SystemExit(f"No snapshot at {directory}: run python3 market_query.py build")
+    return repeat_sale_candidates(pd.read_parquet(path, columns=SALE_COLUMNS))
+
+def publish(supabase, rows, table=INDEX_TABLE, batch_size=PUBLISH_BATCH):
+    """Upsert index rows on (ecf_neighborhood, period); returns rows sent"""
+    for start in range(0, len(rows), batch_size):
+        supabase.table(table).upsert(rows[start:start + batch_size],
+                                     on_conflict='ecf_neighborhood,period').execute()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repeat-sales price index per neighborhood')
+    parser.add_argument('command', choices=('build', 'update', 'show'))
+    parser.add_argument('neighborhood', nargs='?', default=CITYWIDE, help=f'for show (default: {CITYWIDE})')
+    parser.add_argument('--index', default=PRICE_INDEX_FILE, help=f'state file (default: {PRICE_INDEX_FILE})')
+    parser.add_argument('--snapshot', default=SNAPSHOT_DIR, help=f'market_query.py snapshot (default: {SNAPSHOT_DIR})')
+    parser.add_argument('--min-pairs', type=int, default=MIN_PAIRS,
+                        help=f'pairs a neighborhood needs for its own series (build; default: {MIN_PAIRS})')
+    parser.add_argument('--smoothing', type=float, default=SMOOTHING, help=f'above 0 (build; default: {SMOOTHING})')
+    parser.add_argument('--publish', action='store_true', help=f'upsert the new or changed rows into {INDEX_TABLE}')
+    parser.add_argument('--output', help='also write those rows as CSV')
+    args = parser.parse_args()
+    if not args.smoothing > 0:
+        parser.error('--smoothing must be positive: months without pairs take their value from it')
+
+    if args.command == 'show':
+        if not os.path.exists(args.index):
+            raise SystemExit(f"No index at {args.index}; run: python3 price_index.py build")
+        index = PriceIndex(args.index)
+        print(index.summary())
+        rows = index.rows({args.neighborhood: 0})
+        if not rows:
+            raise SystemExit(f"No series for {args.neighborhood!r} (fewer than {index.min_pairs} pairs?)")
+        for row in rows[::max(1, len(rows) // 24)] + rows[-1:]:
+            print(f"  {row['period'][:7]}  {row['index_value']:>8.2f}  {row['pairs']:>5,} pairs")
+        return
+
+    if args.command == 'build':
+        index = PriceIndex(None, args.min_pairs, args.smoothing)
+        index.path = args.index
+    else:
+        if not os.path.exists(args.index):
+            raise SystemExit(f"No index at {args.index}; run: python3 price_index.py build")
+        index = PriceIndex(args.index)
+    started = time.monotonic()
+    sales = load_sales(args.snapshot)
+    known = len(index.sales)
+    changed = index.update(sales)
+    rows = index.rows(changed)
+    index.save()
+    print(f"{len(index.sales) - known:,} new sales, {len(changed):,} series refitted, {len(rows):,} rows "
+          f"in {time.monotonic() - started:.1f}s")
+    print(index.summary())
+
+    if args.output:
+        pd.DataFrame(rows, columns=['ecf_neighborhood', 'period', 'index_value', 'pairs']).to_csv(args.output, index=False)
+        print(f"Rows written to {args.output}")
+    if args.publish and rows:
+        from dotenv import load_dotenv
+        from supabase import create_client
+
+        load_dotenv()
+        supabase = create_client(os.getenv('SUPABASE_URL', 'https://gzswtqlvffqcpifdyrnf.supabase.co'),
+                                 os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_ANON_KEY'))
+        print(f"Published {publish(supabase, rows):,} rows to {INDEX_TABLE}")
+
+if __name__ == '__main__':
+    main()
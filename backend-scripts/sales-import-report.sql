@@ -0,0 +1,96 @@
+-- Post-import verification report for sales_transactions (updated-sales-schema.sql layout)
+-- Run this in Supabase SQL Editor after updated-sales-schema.sql
+--
+-- Computes every figure sales_report.py prints inside the database and
+-- returns one small JSON document, instead of the importers fetching whole
+-- columns and counting in Python:
+--
+--   SELECT sales_import_report();          -- top 10 sellers/buyers
+--   SELECT sales_import_report(25);        -- top 25
+--
+-- Through PostgREST: supabase.rpc('sales_import_report', {'top_n': 10})
+
+CREATE OR REPLACE FUNCTION sales_import_report(top_n INTEGER DEFAULT 10)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+WITH
+totals AS (
+    SELECT
+        COUNT(*) AS total_rows,
+        COUNT(DISTINCT sales_id) AS distinct_sales_ids,
+        MIN(sale_date) AS first_sale_date,
+        MAX(sale_date) AS last_sale_date,
+        MIN(sale_price) AS min_price,
+        MAX(sale_price) AS max_price,
+        ROUND(AVG(sale_price), 2) AS avg_price,
+        percentile_cont(ARRAY[0.25, 0.5, 0.75]) WITHIN GROUP (ORDER BY sale_price) AS quartiles,
+        -- Null (or blank) counts for the columns the front end relies on
+        COUNT(*) - COUNT(sales_id) AS null_sales_id,
+        COUNT(*) - COUNT(parcel_number) AS null_parcel_number,
+        COUNT(*) - COUNT(NULLIF(grantor, '')) AS null_grantor,
+        COUNT(*) - COUNT(NULLIF(grantee, '')) AS null_grantee,
+        COUNT(*) - COUNT(terms_of_sale) AS null_terms_of_sale,
+        COUNT(*) - COUNT(ecf_neighborhood) AS null_ecf_neighborhood,
+        COUNT(*) - COUNT(property_class_code) AS null_property_class_code,
+        COUNT(*) - COUNT(x_coordinate) AS null_x_coordinate,
+        COUNT(*) - COUNT(y_coordinate) AS null_y_coordinate
+    FROM sales_transactions
+),
+histogram AS (
+    -- Bucket i covers [bounds[i], bounds[i+1]); the last one is open-ended
+    SELECT width_bucket(sale_price, ARRAY[0, 1000, 10000, 25000, 50000, 100000,
+                                          200000, 500000, 1000000]::NUMERIC[]) AS bucket,
+           COUNT(*) AS sales
+    FROM sales_transactions
+    GROUP BY 1
+),
+top_sellers AS (
+    SELECT UPPER(grantor) AS name, COUNT(*) AS sales, SUM(sale_price) AS total_value
+    FROM sales_transactions
+    WHERE grantor IS NOT NULL AND grantor != '' AND UPPER(grantor) != 'UNKNOWN SELLER'
+    GROUP BY UPPER(grantor)
+    ORDER BY sales DESC, name
+    LIMIT top_n
+),
+top_buyers AS (
+    SELECT UPPER(grantee) AS name, COUNT(*) AS sales, SUM(sale_price) AS total_value
+    FROM sales_transactions
+    WHERE grantee IS NOT NULL AND grantee != '' AND UPPER(grantee) != 'UNKNOWN BUYER'
+    GROUP BY UPPER(grantee)
+    ORDER BY sales DESC, name
+    LIMIT top_n
+)
+SELECT jsonb_build_object(
+    'total_rows', t.total_rows,
+    'distinct_sales_ids', t.distinct_sales_ids,
+    'date_range', jsonb_build_object('first', t.first_sale_date, 'last', t.last_sale_date),
+    'price', jsonb_build_object('min', t.min_price, 'max', t.max_price, 'avg', t.avg_price,
+                                'p25', t.quartiles[1], 'median', t.quartiles[2], 'p75', t.quartiles[3]),
+    'price_histogram', (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                   'min', (ARRAY[NULL, 0, 1000, 10000, 25000, 50000, 100000,
+                                 200000, 500000, 1000000]::NUMERIC[])[bucket + 1],
+                   'max', (ARRAY[0, 1000, 10000, 25000, 50000, 100000, 200000,
+                                 500000, 1000000, NULL]::NUMERIC[])[bucket + 1],
+                   'sales', sales) ORDER BY bucket), '[]'::jsonb)
+        FROM histogram),
+    'null_counts', jsonb_build_object(
+        'sales_id', t.null_sales_id,
+        'parcel_number', t.null_parcel_number,
+        'grantor', t.null_grantor,
+        'grantee', t.null_grantee,
+        'terms_of_sale', t.null_terms_of_sale,
+        'ecf_neighborhood', t.null_ecf_neighborhood,
+        'property_class_code', t.null_property_class_code,
+        'x_coordinate', t.null_x_coordinate,
+        'y_coordinate', t.null_y_coordinate),
+    'top_sellers', (SELECT COALESCE(jsonb_agg(to_jsonb(s)), '[]'::jsonb) FROM top_sellers s),
+    'top_buyers', (SELECT COALESCE(jsonb_agg(to_jsonb(b)), '[]'::jsonb) FROM top_buyers b)
+)
+FROM totals t;
+$$;
+
+-- Grant permissions
+GRANT EXECUTE ON FUNCTION sales_import_report(INTEGER) TO anon;
@@ -0,0 +1,559 @@
+-- Seller, buyer and neighborhood statistics as summary tables kept up to date on import
+-- Run this in Supabase SQL Editor after updated-sales-schema.sql (and again after
+-- re-running that file, which drops sales_transactions and its triggers)
+--
+-- seller_statistics, buyer_statistics and neighborhood_statistics used to be
+-- views that grouped the whole of sales_transactions on every request. They
+-- keep their names and columns, but now read one row of a summary table:
+--
+--   sales_party_statistics          count, value and first/last sale per
+--                                   seller ('S') or buyer ('B'), upper-cased name
+--   sales_party_years               sales per party and year (years_active)
+--   sales_party_neighborhoods       sales per party and neighborhood
+--   sales_neighborhood_statistics   count, value, min/max price per neighborhood
+--   neighborhood_monthly_sales      sales per neighborhood and month (months_with_sales)
+--   neighborhood_daily_sales        sales and value per neighborhood and day
+--                                   (avg_price_last_year, computed when read)
+--
+-- Statement-level triggers on sales_transactions apply each write:
+--
+--   INSERT            the inserted rows are added to the counts and sums
+--                     (every import batch, however it is sent)
+--   UPDATE / DELETE   the sellers, buyers and neighborhoods of rows whose
+--                     grantor, grantee, date, price or neighborhood changed are
+--                     recomputed from sales_transactions (an upsert that rewrites
+--                     a row unchanged costs nothing)
+--   TRUNCATE          the summary tables are emptied
+--
+-- copy_loader.py disables triggers for its bulk merge and does the same
+-- itself: its new rows go through the scratch tables and
+-- sales_statistics_merge(), its changed rows through
+-- sales_statistics_refresh(). To rebuild by hand:
+--
+--   SELECT rebuild_sales_statistics();
+--   SELECT check_sales_statistics();      -- rows that differ from a fresh GROUP BY
+--
+-- Both read the whole table, so neither is open to the anon key: run them
+-- here, over a direct connection, or through PostgREST with the service
+-- role key (python3 sales_statistics.py rebuild / check)
+
+-- The old views, if this database still has them
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('seller_statistics')) = 'v' THEN
+        DROP VIEW seller_statistics;
+    END IF;
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('buyer_statistics')) = 'v' THEN
+        DROP VIEW buyer_statistics;
+    END IF;
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('neighborhood_statistics')) = 'v' THEN
+        DROP VIEW neighborhood_statistics;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS sales_party_statistics (
+    side CHAR(1) NOT NULL CHECK (side IN ('S', 'B')),
+    name VARCHAR(400) NOT NULL,
+    total_sales BIGINT NOT NULL,
+    total_value DECIMAL(16, 2) NOT NULL,
+    first_sale_date DATE,
+    last_sale_date DATE,
+    years_active INTEGER NOT NULL DEFAULT 0,
+    neighborhoods INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (side, name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_party_statistics_total
+    ON sales_party_statistics(side, total_sales DESC);
+
+CREATE TABLE IF NOT EXISTS sales_party_years (
+    side CHAR(1) NOT NULL,
+    name VARCHAR(400) NOT NULL,
+    year SMALLINT NOT NULL,
+    sales BIGINT NOT NULL,
+    PRIMARY KEY (side, name, year)
+);
+
+CREATE TABLE IF NOT EXISTS sales_party_neighborhoods (
+    side CHAR(1) NOT NULL,
+    name VARCHAR(400) NOT NULL,
+    ecf_neighborhood VARCHAR(100) NOT NULL,
+    sales BIGINT NOT NULL,
+    PRIMARY KEY (side, name, ecf_neighborhood)
+);
+
+CREATE TABLE IF NOT EXISTS sales_neighborhood_statistics (
+    ecf_neighborhood VARCHAR(100) PRIMARY KEY,
+    total_sales BIGINT NOT NULL,
+    total_value DECIMAL(16, 2) NOT NULL,
+    min_sale_price DECIMAL(12, 2),
+    max_sale_price DECIMAL(12, 2),
+    months_with_sales INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS neighborhood_monthly_sales (
+    ecf_neighborhood VARCHAR(100) NOT NULL,
+    month DATE NOT NULL,
+    sales BIGINT NOT NULL,
+    PRIMARY KEY (ecf_neighborhood, month)
+);
+
+CREATE TABLE IF NOT EXISTS neighborhood_daily_sales (
+    ecf_neighborhood VARCHAR(100) NOT NULL,
+    sale_date DATE NOT NULL,
+    sales BIGINT NOT NULL,
+    total_price DECIMAL(16, 2) NOT NULL,
+    PRIMARY KEY (ecf_neighborhood, sale_date)
+);
+
+-- Same names and columns as the views they replace
+CREATE OR REPLACE VIEW seller_statistics AS
+SELECT
+    name as seller_name_normalized,
+    total_sales,
+    total_value as total_sales_value,
+    total_value / total_sales as avg_sale_price,
+    first_sale_date,
+    last_sale_date,
+    years_active,
+    neighborhoods as neighborhoods_sold_in
+FROM sales_party_statistics
+WHERE side = 'S';
+
+CREATE OR REPLACE VIEW buyer_statistics AS
+SELECT
+    name as buyer_name_normalized,
+    total_sales as total_purchases,
+    total_value as total_purchase_value,
+    total_value / total_sales as avg_purchase_price,
+    first_sale_date as first_purchase_date,
+    last_sale_date as last_purchase_date,
+    years_active,
+    neighborhoods as neighborhoods_bought_in
+FROM sales_party_statistics
+WHERE side = 'B';
+
+CREATE OR REPLACE VIEW neighborhood_statistics AS
+SELECT
+    n.ecf_neighborhood,
+    n.total_sales,
+    n.total_value / n.total_sales as avg_sale_price,
+    n.min_sale_price,
+    n.max_sale_price,
+    n.months_with_sales,
+    (SELECT SUM(d.total_price) / NULLIF(SUM(d.sales), 0)
+     FROM neighborhood_daily_sales d
+     WHERE d.ecf_neighborhood = n.ecf_neighborhood
+       AND d.sale_date >= CURRENT_DATE - INTERVAL '1 year') as avg_price_last_year
+FROM sales_neighborhood_statistics n;
+
+-- Per-session scratch tables holding the rows to add: one row per sale and
+-- side for the parties, one per sale for the neighborhoods
+CREATE OR REPLACE FUNCTION sales_statistics_delta_tables()
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF to_regclass('pg_temp.sales_party_delta') IS NULL THEN
+        CREATE TEMP TABLE sales_party_delta (
+            side CHAR(1), name VARCHAR(400), sale_date DATE, sale_price DECIMAL(12, 2),
+            ecf_neighborhood VARCHAR(100)
+        ) ON COMMIT DELETE ROWS;
+        CREATE TEMP TABLE sales_neighborhood_delta (
+            ecf_neighborhood VARCHAR(100), sale_date DATE, sale_price DECIMAL(12, 2)
+        ) ON COMMIT DELETE ROWS;
+    END IF;
+END;
+$$;
+
+-- Add the scratch tables' rows to the summary tables, then empty them.
+-- Counts and sums add up; first/last dates and min/max prices only widen, so
+-- rows taken away go through sales_statistics_refresh() instead. Distinct
+-- years, neighborhoods and months grow by the membership rows this call
+-- creates: each is claimed first with 0 sales and ON CONFLICT DO NOTHING,
+-- which waits on a concurrent import that is adding the same one, so only
+-- one of them counts it. The sales are added afterwards
+CREATE OR REPLACE FUNCTION sales_statistics_merge()
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    WITH
+    totals AS (
+        SELECT side, name, COUNT(*) AS sales, SUM(sale_price) AS value,
+               MIN(sale_date) AS first_date, MAX(sale_date) AS last_date
+        FROM sales_party_delta
+        GROUP BY 1, 2
+    ),
+    added_years AS (
+        INSERT INTO sales_party_years (side, name, year, sales)
+        SELECT DISTINCT side, name, EXTRACT(YEAR FROM sale_date), 0
+        FROM sales_party_delta
+        WHERE sale_date IS NOT NULL
+        ORDER BY 1, 2, 3
+        ON CONFLICT (side, name, year) DO NOTHING
+        RETURNING side, name
+    ),
+    added_neighborhoods AS (
+        INSERT INTO sales_party_neighborhoods (side, name, ecf_neighborhood, sales)
+        SELECT DISTINCT side, name, ecf_neighborhood, 0
+        FROM sales_party_delta
+        WHERE ecf_neighborhood IS NOT NULL
+        ORDER BY 1, 2, 3
+        ON CONFLICT (side, name, ecf_neighborhood) DO NOTHING
+        RETURNING side, name
+    ),
+    new_years AS (
+        SELECT side, name, COUNT(*) AS years FROM added_years GROUP BY 1, 2
+    ),
+    new_neighborhoods AS (
+        SELECT side, name, COUNT(*) AS neighborhoods FROM added_neighborhoods GROUP BY 1, 2
+    )
+    INSERT INTO sales_party_statistics AS t (side, name, total_sales, total_value, first_sale_date,
+                                             last_sale_date, years_active, neighborhoods)
+    SELECT side, name, sales, value, first_date, last_date,
+           COALESCE(years, 0), COALESCE(neighborhoods, 0)
+    FROM totals
+    LEFT JOIN new_years USING (side, name)
+    LEFT JOIN new_neighborhoods USING (side, name)
+    ORDER BY side, name
+    ON CONFLICT (side, name) DO UPDATE SET
+        total_sales = t.total_sales + EXCLUDED.total_sales,
+        total_value = t.total_value + EXCLUDED.total_value,
+        first_sale_date = LEAST(t.first_sale_date, EXCLUDED.first_sale_date),
+        last_sale_date = GREATEST(t.last_sale_date, EXCLUDED.last_sale_date),
+        years_active = t.years_active + EXCLUDED.years_active,
+        neighborhoods = t.neighborhoods + EXCLUDED.neighborhoods,
+        updated_at = NOW();
+
+    INSERT INTO sales_party_years AS t (side, name, year, sales)
+    SELECT side, name, EXTRACT(YEAR FROM sale_date), COUNT(*)
+    FROM sales_party_delta
+    WHERE sale_date IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (side, name, year) DO UPDATE SET sales = t.sales + EXCLUDED.sales;
+
+    INSERT INTO sales_party_neighborhoods AS t (side, name, ecf_neighborhood, sales)
+    SELECT side, name, ecf_neighborhood, COUNT(*)
+    FROM sales_party_delta
+    WHERE ecf_neighborhood IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (side, name, ecf_neighborhood) DO UPDATE SET sales = t.sales + EXCLUDED.sales;
+
+    WITH
+    totals AS (
+        SELECT ecf_neighborhood, COUNT(*) AS sales, SUM(sale_price) AS value,
+               MIN(sale_price) AS min_price, MAX(sale_price) AS max_price
+        FROM sales_neighborhood_delta
+        GROUP BY 1
+    ),
+    added_months AS (
+        INSERT INTO neighborhood_monthly_sales (ecf_neighborhood, month, sales)
+        SELECT DISTINCT ecf_neighborhood, DATE_TRUNC('month', sale_date)::DATE, 0
+        FROM sales_neighborhood_delta
+        WHERE sale_date IS NOT NULL
+        ORDER BY 1, 2
+        ON CONFLICT (ecf_neighborhood, month) DO NOTHING
+        RETURNING ecf_neighborhood
+    ),
+    new_months AS (
+        SELECT ecf_neighborhood, COUNT(*) AS months FROM added_months GROUP BY 1
+    )
+    INSERT INTO sales_neighborhood_statistics AS t (ecf_neighborhood, total_sales, total_value,
+                                                    min_sale_price, max_sale_price, months_with_sales)
+    SELECT ecf_neighborhood, sales, value, min_price, max_price, COALESCE(months, 0)
+    FROM totals
+    LEFT JOIN new_months USING (ecf_neighborhood)
+    ORDER BY ecf_neighborhood
+    ON CONFLICT (ecf_neighborhood) DO UPDATE SET
+        total_sales = t.total_sales + EXCLUDED.total_sales,
+        total_value = t.total_value + EXCLUDED.total_value,
+        min_sale_price = LEAST(t.min_sale_price, EXCLUDED.min_sale_price),
+        max_sale_price = GREATEST(t.max_sale_price, EXCLUDED.max_sale_price),
+        months_with_sales = t.months_with_sales + EXCLUDED.months_with_sales,
+        updated_at = NOW();
+
+    INSERT INTO neighborhood_monthly_sales AS t (ecf_neighborhood, month, sales)
+    SELECT ecf_neighborhood, DATE_TRUNC('month', sale_date)::DATE, COUNT(*)
+    FROM sales_neighborhood_delta
+    WHERE sale_date IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (ecf_neighborhood, month) DO UPDATE SET sales = t.sales + EXCLUDED.sales;
+
+    INSERT INTO neighborhood_daily_sales AS t (ecf_neighborhood, sale_date, sales, total_price)
+    SELECT ecf_neighborhood, sale_date, COUNT(*), SUM(sale_price)
+    FROM sales_neighborhood_delta
+    WHERE sale_date IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (ecf_neighborhood, sale_date) DO UPDATE SET
+        sales = t.sales + EXCLUDED.sales,
+        total_price = t.total_price + EXCLUDED.total_price;
+
+    TRUNCATE sales_party_delta, sales_neighborhood_delta;
+END;
+$$;
+
+-- Recompute the given sellers, buyers (upper-cased names) and neighborhoods
+-- from sales_transactions
+CREATE OR REPLACE FUNCTION sales_statistics_refresh(sellers TEXT[], buyers TEXT[], neighborhoods TEXT[])
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM sales_statistics_delta_tables();
+
+    DELETE FROM sales_party_years
+    WHERE (side = 'S' AND name = ANY(sellers)) OR (side = 'B' AND name = ANY(buyers));
+    DELETE FROM sales_party_neighborhoods
+    WHERE (side = 'S' AND name = ANY(sellers)) OR (side = 'B' AND name = ANY(buyers));
+    DELETE FROM sales_party_statistics
+    WHERE (side = 'S' AND name = ANY(sellers)) OR (side = 'B' AND name = ANY(buyers));
+    DELETE FROM neighborhood_daily_sales WHERE ecf_neighborhood = ANY(neighborhoods);
+    DELETE FROM neighborhood_monthly_sales WHERE ecf_neighborhood = ANY(neighborhoods);
+    DELETE FROM sales_neighborhood_statistics WHERE ecf_neighborhood = ANY(neighborhoods);
+
+    -- UPPER(grantor), UPPER(grantee) and UPPER(ecf_neighborhood) are indexed
+    INSERT INTO sales_party_delta
+    SELECT 'S', UPPER(grantor), sale_date, sale_price, ecf_neighborhood
+    FROM sales_transactions
+    WHERE UPPER(grantor) = ANY(sellers) AND grantor != '' AND sale_price > 0;
+    INSERT INTO sales_party_delta
+    SELECT 'B', UPPER(grantee), sale_date, sale_price, ecf_neighborhood
+    FROM sales_transactions
+    WHERE UPPER(grantee) = ANY(buyers) AND grantee != '' AND sale_price > 0;
+    INSERT INTO sales_neighborhood_delta
+    SELECT ecf_neighborhood, sale_date, sale_price
+    FROM sales_transactions
+    WHERE UPPER(ecf_neighborhood) = ANY(SELECT UPPER(n) FROM unnest(neighborhoods) n)
+      AND ecf_neighborhood = ANY(neighborhoods) AND sale_price > 0;
+
+    PERFORM sales_statistics_merge();
+END;
+$$;
+
+-- Empty and refill every summary table from sales_transactions; returns
+-- the row counts
+CREATE OR REPLACE FUNCTION rebuild_sales_statistics()
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+    PERFORM sales_statistics_delta_tables();
+    TRUNCATE sales_party_statistics, sales_party_years, sales_party_neighborhoods,
+             sales_neighborhood_statistics, neighborhood_monthly_sales, neighborhood_daily_sales;
+
+    INSERT INTO sales_party_delta
+    SELECT 'S', UPPER(grantor), sale_date, sale_price, ecf_neighborhood
+    FROM sales_transactions
+    WHERE grantor IS NOT NULL AND grantor != '' AND sale_price > 0
+    UNION ALL
+    SELECT 'B', UPPER(grantee), sale_date, sale_price, ecf_neighborhood
+    FROM sales_transactions
+    WHERE grantee IS NOT NULL AND grantee != '' AND sale_price > 0;
+    INSERT INTO sales_neighborhood_delta
+    SELECT ecf_neighborhood, sale_date, sale_price
+    FROM sales_transactions
+    WHERE ecf_neighborhood IS NOT NULL AND sale_price > 0;
+    ANALYZE sales_party_delta;
+    ANALYZE sales_neighborhood_delta;
+
+    PERFORM sales_statistics_merge();
+    RETURN jsonb_build_object(
+        'sellers', (SELECT COUNT(*) FROM sales_party_statistics WHERE side = 'S'),
+        'buyers', (SELECT COUNT(*) FROM sales_party_statistics WHERE side = 'B'),
+        'neighborhoods', (SELECT COUNT(*) FROM sales_neighborhood_statistics)
+    );
+END;
+$$;
+
+-- Rows of the three views that differ from the GROUP BY the old views ran
+-- (0s when the tables are current)
+CREATE OR REPLACE FUNCTION check_sales_statistics()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+WITH
+sellers AS (
+    SELECT UPPER(grantor) AS name, COUNT(*) AS total_sales, SUM(sale_price) AS total_value,
+           MIN(sale_date) AS first_sale_date, MAX(sale_date) AS last_sale_date,
+           COUNT(DISTINCT EXTRACT(YEAR FROM sale_date)) AS years_active,
+           COUNT(DISTINCT ecf_neighborhood) AS neighborhoods
+    FROM sales_transactions
+    WHERE grantor IS NOT NULL AND grantor != '' AND sale_price > 0
+    GROUP BY 1
+),
+buyers AS (
+    SELECT UPPER(grantee) AS name, COUNT(*) AS total_sales, SUM(sale_price) AS total_value,
+           MIN(sale_date) AS first_sale_date, MAX(sale_date) AS last_sale_date,
+           COUNT(DISTINCT EXTRACT(YEAR FROM sale_date)) AS years_active,
+           COUNT(DISTINCT ecf_neighborhood) AS neighborhoods
+    FROM sales_transactions
+    WHERE grantee IS NOT NULL AND grantee != '' AND sale_price > 0
+    GROUP BY 1
+),
+hoods AS (
+    SELECT ecf_neighborhood, COUNT(*) AS total_sales, SUM(sale_price) AS total_value,
+           MIN(sale_price) AS min_sale_price, MAX(sale_price) AS max_sale_price,
+           COUNT(DISTINCT DATE_TRUNC('month', sale_date)) AS months_with_sales,
+           AVG(CASE WHEN sale_date >= CURRENT_DATE - INTERVAL '1 year' THEN sale_price END) AS avg_price_last_year
+    FROM sales_transactions
+    WHERE sale_price > 0 AND ecf_neighborhood IS NOT NULL
+    GROUP BY 1
+),
+stored AS (
+    SELECT * FROM sales_party_statistics
+)
+SELECT jsonb_build_object(
+    'sellers', (SELECT COUNT(*) FROM sellers f FULL JOIN (SELECT * FROM stored WHERE side = 'S') s USING (name)
+                WHERE (f.total_sales, f.total_value, f.first_sale_date, f.last_sale_date, f.years_active, f.neighborhoods)
+                      IS DISTINCT FROM (s.total_sales, s.total_value, s.first_sale_date, s.last_sale_date,
+                                        s.years_active, s.neighborhoods)),
+    'buyers', (SELECT COUNT(*) FROM buyers f FULL JOIN (SELECT * FROM stored WHERE side = 'B') s USING (name)
+               WHERE (f.total_sales, f.total_value, f.first_sale_date, f.last_sale_date, f.years_active, f.neighborhoods)
+                     IS DISTINCT FROM (s.total_sales, s.total_value, s.first_sale_date, s.last_sale_date,
+                                       s.years_active, s.neighborhoods)),
+    'neighborhoods', (SELECT COUNT(*) FROM hoods f
+                      FULL JOIN (SELECT v.*, t.total_value FROM neighborhood_statistics v
+                                 JOIN sales_neighborhood_statistics t USING (ecf_neighborhood)) s
+                      USING (ecf_neighborhood)
+                      WHERE (f.total_sales, f.total_value, f.min_sale_price, f.max_sale_price, f.months_with_sales,
+                             ROUND(f.avg_price_last_year, 6))
+                            IS DISTINCT FROM (s.total_sales, s.total_value, s.min_sale_price, s.max_sale_price,
+                                              s.months_with_sales, ROUND(s.avg_price_last_year, 6)))
+);
+$$;
+
+-- Triggers on sales_transactions
+
+CREATE OR REPLACE FUNCTION sales_statistics_after_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+    PERFORM sales_statistics_delta_tables();
+    INSERT INTO sales_party_delta
+    SELECT 'S', UPPER(grantor), sale_date, sale_price, ecf_neighborhood
+    FROM inserted
+    WHERE grantor IS NOT NULL AND grantor != '' AND sale_price > 0
+    UNION ALL
+    SELECT 'B', UPPER(grantee), sale_date, sale_price, ecf_neighborhood
+    FROM inserted
+    WHERE grantee IS NOT NULL AND grantee != '' AND sale_price > 0;
+    INSERT INTO sales_neighborhood_delta
+    SELECT ecf_neighborhood, sale_date, sale_price
+    FROM inserted
+    WHERE ecf_neighborhood IS NOT NULL AND sale_price > 0;
+    PERFORM sales_statistics_merge();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION sales_statistics_after_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+DECLARE
+    sellers TEXT[];
+    buyers TEXT[];
+    neighborhoods TEXT[];
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- Only rows whose figures moved, before and after; EXCEPT rather than
+        -- a join on id, as the transition tables have no statistics to plan with
+        WITH old_rows AS (
+            SELECT id, grantor, grantee, sale_date, sale_price, ecf_neighborhood FROM removed
+        ),
+        new_rows AS (
+            SELECT id, grantor, grantee, sale_date, sale_price, ecf_neighborhood FROM inserted
+        ),
+        affected AS (
+            (SELECT * FROM old_rows EXCEPT ALL SELECT * FROM new_rows)
+            UNION ALL
+            (SELECT * FROM new_rows EXCEPT ALL SELECT * FROM old_rows)
+        )
+        SELECT array_agg(DISTINCT UPPER(grantor)) FILTER (WHERE grantor != ''),
+               array_agg(DISTINCT UPPER(grantee)) FILTER (WHERE grantee != ''),
+               array_agg(DISTINCT ecf_neighborhood) FILTER (WHERE ecf_neighborhood IS NOT NULL)
+        INTO sellers, buyers, neighborhoods
+        FROM affected;
+    ELSE
+        SELECT array_agg(DISTINCT UPPER(grantor)) FILTER (WHERE grantor != ''),
+               array_agg(DISTINCT UPPER(grantee)) FILTER (WHERE grantee != ''),
+               array_agg(DISTINCT ecf_neighborhood) FILTER (WHERE ecf_neighborhood IS NOT NULL)
+        INTO sellers, buyers, neighborhoods
+        FROM removed;
+    END IF;
+
+    IF sellers IS NOT NULL OR buyers IS NOT NULL OR neighborhoods IS NOT NULL THEN
+        PERFORM sales_statistics_refresh(COALESCE(sellers, '{}'), COALESCE(buyers, '{}'),
+                                         COALESCE(neighborhoods, '{}'));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION sales_statistics_after_truncate()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+    TRUNCATE sales_party_statistics, sales_party_years, sales_party_neighborhoods,
+             sales_neighborhood_statistics, neighborhood_monthly_sales, neighborhood_daily_sales;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sales_statistics_insert ON sales_transactions;
+DROP TRIGGER IF EXISTS sales_statistics_update ON sales_transactions;
+DROP TRIGGER IF EXISTS sales_statistics_delete ON sales_transactions;
+DROP TRIGGER IF EXISTS sales_statistics_truncate ON sales_transactions;
+
+CREATE TRIGGER sales_statistics_insert AFTER INSERT ON sales_transactions
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_statistics_after_insert();
+CREATE TRIGGER sales_statistics_update AFTER UPDATE ON sales_transactions
+    REFERENCING OLD TABLE AS removed NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_statistics_after_change();
+CREATE TRIGGER sales_statistics_delete AFTER DELETE ON sales_transactions
+    REFERENCING OLD TABLE AS removed
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_statistics_after_change();
+CREATE TRIGGER sales_statistics_truncate AFTER TRUNCATE ON sales_transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_statistics_after_truncate();
+
+-- Read-only for the site; the triggers and rebuild run as the owner
+GRANT SELECT ON sales_party_statistics, sales_neighborhood_statistics,
+                neighborhood_monthly_sales, neighborhood_daily_sales TO anon;
+GRANT SELECT ON seller_statistics TO anon;
+GRANT SELECT ON buyer_statistics TO anon;
+GRANT SELECT ON neighborhood_statistics TO anon;
+
+-- Functions are executable by PUBLIC by default; these scan or rewrite the
+-- summary tables and are for the owner and the service role only
+REVOKE EXECUTE ON FUNCTION rebuild_sales_statistics(), check_sales_statistics(),
+                           sales_statistics_merge(), sales_statistics_delta_tables(),
+                           sales_statistics_refresh(TEXT[], TEXT[], TEXT[])
+    FROM PUBLIC, anon;
+DO $$
+BEGIN
+    -- Supabase's signed-in role; a plain Postgres has only anon
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        REVOKE EXECUTE ON FUNCTION rebuild_sales_statistics(), check_sales_statistics(),
+                                   sales_statistics_merge(), sales_statistics_delta_tables(),
+                                   sales_statistics_refresh(TEXT[], TEXT[], TEXT[])
+            FROM authenticated;
+    END IF;
+END;
+$$;
+
+SELECT rebuild_sales_statistics();
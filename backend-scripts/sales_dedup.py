@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+In-stream de-duplication of sales against the file and the existing table
+
+Rerunning an importer that inserts (rather than upserts on a key) adds
+every sale a second time, and nothing stopped a file from repeating a sale
+under another identifier. DedupIndex drops such rows in the pipeline's
+select step, before they cost a request:
+
+  1. seed(): one keyset-paginated scan (id > last id, see
+     parcel_linker.iter_pages) of the key columns already in the table,
+  2. select(): every transformed row is hashed on each sale key it has a
+     value for, and dropped if any of those hashes was in the table or
+     appeared earlier in the stream; the hashes of the rows it sees are
+     added as it goes.
+
+Sale keys (a key is used when the table and the stream have its columns):
+
+  sales_id      the export's Sales ID
+  parcel_sale   Parcel Number + Sale Number
+  liber_page    Liber/Page + Parcel Number (a multi-parcel deed records one
+                liber/page for every parcel it conveys, so the page alone
+                is not a sale)
+  sale          address, date, price, seller and buyer, for the
+                seller_name/buyer_name layout, which has no identifiers
+
+Keys are 64-bit hashes (pd.util.hash_pandas_object) of the normalized
+values, numbers rounded to cents as the database stores them. HashSet
+keeps them in a sorted numpy array, 8 bytes per key; for very large runs
+BloomFilter takes about 2.4 bytes per key at a 1e-4 false-positive rate,
+and a false positive drops a row that was not a duplicate, so the rate is
+an option (--bloom-error).
+
+With an upsert profile, dropped rows are rows whose values would have been
+rewritten; use --delta there to pick up changed rows instead.
+
+Usage (run from backend-scripts/):
+
+    dedup = DedupIndex()
+    dedup.seed(supabase, 'sales_transactions')
+    pipeline = ImportPipeline(transform, select=dedup.select)
+    ...
+    print(dedup.summary())
+"""
+
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from parcel_linker import PAGE_SIZE, iter_pages
+
+DEDUP_KEYS = {
+    'sales_id': ('sales_id',),
+    'parcel_sale': ('parcel_number', 'sale_number'),
+    'liber_page': ('liber_page', 'parcel_number'),
+    'sale': ('property_address', 'sale_date', 'sale_price', 'seller_name', 'buyer_name'),
+}
+
+# Compared as numbers rounded to cents; everything else as text
+NUMERIC_FIELDS = {'sales_id', 'sale_number', 'sale_price'}
+
+FILTERS = ('set', 'bloom')
+
+# Rows hashed per batch while seeding
+_SEED_BATCH = 50000
+
+
+def key_hashes(columns, fields):
+    """(uint64 hash per row, mask of rows with a value in every field)"""
+    frame = {}
+    valid = None
+    for field in fields:
+        series = pd.Series(columns[field], dtype=object)
+        if field in NUMERIC_FIELDS:
+            values = pd.to_numeric(series, errors='coerce').astype('float64').round(2)
+            present = values.notna().to_numpy()
+        else:
+            values = series.where(series.notna(), '').map(str).str.strip()
+            present = (values != '').to_numpy()
+        frame[field] = values.reset_index(drop=True)
+        valid = present if valid is None else valid & present
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(frame), index=False).to_numpy()
+    return hashes, valid
+
+
+class HashSet:
+    """Exact set of uint64 hashes in one sorted array"""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def contains(self, hashes):
+        positions = np.searchsorted(self.keys, hashes)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == hashes[found]
+        return found
+
+    def add(self, hashes):
+        new = np.unique(hashes)
+        new = new[~self.contains(new)]
+        if len(new):
+            self.keys = np.insert(self.keys, np.searchsorted(self.keys, new), new)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes
+
+
+class BloomFilter:
+    """Bloom filter over uint64 hashes sized for `capacity` keys at
+    `error_rate` false positives; bit positions by double hashing"""
+
+    def __init__(self, capacity, error_rate=1e-4):
+        self.bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+        self.added = 0
+
+    def __len__(self):
+        return self.added
+
+    def _positions(self, hashes):
+        first = hashes.astype(np.uint64)
+        second = (first >> np.uint64(32)) | np.uint64(1)
+        bits = np.uint64(self.bits)
+        return [(first + np.uint64(i) * second) % bits for i in range(self.hashes)]
+
+    def _bytes_and_masks(self, hashes):
+        for positions in self._positions(hashes):
+            masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+            yield positions >> np.uint64(3), masks
+
+    def contains(self, hashes):
+        found = np.ones(len(hashes), dtype=bool)
+        for offsets, masks in self._bytes_and_masks(hashes):
+            found &= (self.array[offsets] & masks) != 0
+        return found
+
+    def add(self, hashes):
+        self.added += len(hashes)
+        for offsets, masks in self._bytes_and_masks(hashes):
+            np.bitwise_or.at(self.array, offsets, masks)
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+
+class DedupIndex:
+    """Seen sale keys, from the table (seed) and from this run (select)"""
+
+    def __init__(self, keys=DEDUP_KEYS, filter='set', capacity=10_000_000, error_rate=1e-4):
+        self.keys = dict(keys)
+        self.filter = filter
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.seeded = {}     # key name -> hashes already in the table
+        self.seen = {}       # key name -> hashes seen in this run
+        self.seeded_rows = 0
+        self.kept = self.in_table = self.in_stream = 0
+
+    def _new_set(self):
+        if self.filter == 'bloom':
+            return BloomFilter(self.capacity, self.error_rate)
+        return HashSet()
+
+    def _add(self, sets, name, hashes):
+        if name not in sets:
+            sets[name] = self._new_set()
+        sets[name].add(hashes)
+
+    def seed(self, supabase, table, page_size=PAGE_SIZE):
+        """Load the keys of every row already in the table; returns the row count"""
+        started = time.monotonic()
+        sample = supabase.table(table).select('*').limit(1).execute().data
+        if not sample:
+            return 0
+        names = [name for name, fields in self.keys.items() if set(fields) <= set(sample[0])]
+        fields = sorted({field for name in names for field in self.keys[name]})
+        if not names:
+            return 0
+
+        pending = []
+        for page in iter_pages(supabase, table, ','.join(['id'] + fields), page_size=page_size):
+            pending.extend(page)
+            if len(pending) >= _SEED_BATCH:
+                self._seed_rows(pending, names)
+                pending = []
+                print(f"  Seeded {self.seeded_rows:,} existing keys...", end='\r')
+        if pending:
+            self._seed_rows(pending, names)
+        print(f"Seeded dedup keys ({', '.join(names)}) from {self.seeded_rows:,} rows of {table} "
+              f"in {time.monotonic() - started:.1f}s")
+        return self.seeded_rows
+
+    def _seed_rows(self, rows, names):
+        frame = pd.DataFrame(rows, dtype=object)
+        columns = {field: frame[field].to_numpy() for field in frame.columns}
+        for name in names:
+            hashes, valid = key_hashes(columns, self.keys[name])
+            self._add(self.seeded, name, hashes[valid])
+        self.seeded_rows += len(rows)
+
+    def select(self, columns, keep):
+        """Narrow a transform's keep mask to rows not seen before"""
+        kept = np.flatnonzero(keep)
+        if not len(kept):
+            return columns, keep
+        in_table = np.zeros(len(kept), dtype=bool)
+        in_stream = np.zeros(len(kept), dtype=bool)
+        hashed = []
+        for name, fields in self.keys.items():
+            if not set(fields) <= set(columns):
+                continue
+            hashes, valid = key_hashes({field: columns[field][kept] for field in fields}, fields)
+            if name in self.seeded:
+                in_table |= valid & self.seeded[name].contains(hashes)
+            repeated = valid & pd.Series(hashes).duplicated().to_numpy()
+            if name in self.seen:
+                repeated |= valid & self.seen[name].contains(hashes)
+            in_stream |= repeated
+            hashed.append((name, hashes[valid]))
+        for name, hashes in hashed:
+            self._add(self.seen, name, hashes)
+
+        in_stream &= ~in_table
+        self.in_table += int(in_table.sum())
+        self.in_stream += int(in_stream.sum())
+        send = np.zeros(len(keep), dtype=bool)
+        send[kept] = ~(in_table | in_stream)
+        self.kept += int(send.sum())
+        return columns, send
+
+    @property
+    def nbytes(self):
+        return sum(keys.nbytes for sets in (self.seeded, self.seen) for keys in sets.values())
+
+    def summary(self):
+        return (f"Dedup: {self.kept:,} kept | {self.in_table:,} already in the table | "
+                f"{self.in_stream:,} repeated in the file | "
+                f"{self.filter} of {self.nbytes / 1e6:,.1f} MB")
+
+
+def add_dedup_arguments(parser):
+    """Add the shared --dedup options to an importer's CLI"""
+    parser.add_argument('--dedup', action='store_true',
+                        help='drop rows whose sale keys are already in the table or earlier in the file')
+    parser.add_argument('--dedup-filter', choices=FILTERS, default='set',
+                        help='exact hash set, or a Bloom filter for very large runs (default: set)')
+    parser.add_argument('--bloom-capacity', type=int, default=10_000_000,
+                        help='keys the Bloom filter is sized for (default: 10000000)')
+    parser.add_argument('--bloom-error', type=float, default=1e-4,
+                        help='Bloom filter false-positive rate; each drops a new row (default: 1e-4)')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='skip the scan of existing keys; only repeats within the file are dropped')
+    return parser
+
+def dedup_from_args(args, supabase, table):
+    """Seeded DedupIndex from add_dedup_arguments() options, or None without --dedup"""
+    if not args.dedup:
+        return None
+    dedup = DedupIndex(filter=args.dedup_filter, capacity=args.bloom_capacity,
+                       error_rate=args.bloom_error)
+    if supabase is not None and not args.no_seed:
+        dedup.seed(supabase, table)
+    return dedup
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Delta imports: upload only sales rows that are new or changed
+
+A manifest from the last import maps each row's key to a 64-bit
+fingerprint of the record that was sent for it. On the next run every
+transformed row is fingerprinted the same way. Rows whose key is new or
+whose fingerprint differs are uploaded, and the rest are skipped. Keys in
+the manifest that no longer appear in the file are reported as deletions
+but not deleted from the database.
+
+Keys are the Sales ID, or Parcel Number + Sale Number for rows without one.
+Fingerprints come from pd.util.hash_pandas_object over the transformed
+columns, so a change in cleaning rules also shows up as a change.
+
+Usage (run from backend-scripts/):
+
+    delta = DeltaManifest('import-all-sales.manifest.npz', fields)
+    columns, keep = delta.select(columns, keep)   # keep only new/changed rows
+    ...upload...
+    delta.commit(records)                         # after a batch succeeds
+    delta.save()                                  # after the run
+    print(delta.summary())
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def row_keys(columns):
+    """Key per row: 'S<sales_id>' or 'P<parcel_number>:<sale_number>'"""
+    sales_ids = columns['sales_id']
+    parcels = columns.get('parcel_number', np.full(len(sales_ids), None, dtype=object))
+    sale_numbers = columns.get('sale_number', np.full(len(sales_ids), None, dtype=object))
+    return np.array([
+        f"S{sales_id}" if sales_id is not None else f"P{parcel}:{number}"
+        for sales_id, parcel, number in zip(sales_ids.tolist(), parcels.tolist(), sale_numbers.tolist())
+    ], dtype=object)
+
+def record_key(record):
+    """row_keys() for a single record dict"""
+    if record.get('sales_id') is not None:
+        return f"S{record['sales_id']}"
+    return f"P{record.get('parcel_number')}:{record.get('sale_number')}"
+
+def fingerprints(columns, fields):
+    """uint64 hash of each row's transformed values"""
+    frame = pd.DataFrame({field: columns[field] for field in fields})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class DeltaManifest:
+    """Compare a run against the last successful import and track what landed"""
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = list(fields)
+        self.previous = {}
+        self.current = {}   # fingerprints of every row seen in this run
+        self.landed = {}    # fingerprints of rows the database acknowledged
+        self.new = self.changed = self.unchanged = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            if data['fields'].tolist() != self.fields:
+                # Different record layout; every row counts as changed
+                print(f"Manifest {self.path} was built for other fields; treating all rows as changed")
+                return
+            self.previous = dict(zip(data['keys'].tolist(), data['fingerprints'].tolist()))
+
+    @property
+    def first_run(self):
+        return not self.previous
+
+    def select(self, columns, keep):
+        """Narrow a transform's keep mask to new or changed rows"""
+        kept = np.flatnonzero(keep)
+        keys = row_keys({field: values[kept] for field, values in columns.items()})
+        prints = fingerprints({field: values[kept] for field, values in columns.items()}, self.fields)
+        send = np.zeros(len(keep), dtype=bool)
+        for position, key, fingerprint in zip(kept.tolist(), keys.tolist(), prints.tolist()):
+            self.current[key] = fingerprint
+            before = self.previous.get(key)
+            if before is None:
+                self.new += 1
+            elif before != fingerprint:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+                self.landed[key] = fingerprint
+                continue
+            send[position] = True
+        return columns, send
+
+    def commit(self, records):
+        """Mark an uploaded batch as stored"""
+        for record in records:
+            key = record_key(record)
+            self.landed[key] = self.current[key]
+
+    def deleted(self):
+        """Keys from the last import that are not in this file"""
+        return sorted(set(self.previous) - set(self.current))
+
+    def save(self, deletions_path=None, complete=True):
+        """Write the manifest for the next run; returns the deleted keys.
+
+        Rows that failed to upload keep their previous fingerprint (or stay
+        out if they were new) so the next delta run retries them. After an
+        incomplete run (interrupted before the end of the file) rows not
+        reached yet keep theirs too, and no deletions are reported.
+        """
+        carried = self.previous if not complete else self.current
+        manifest = {key: self.previous[key] for key in carried
+                    if key in self.previous and key not in self.landed}
+        manifest.update(self.landed)
+        keys = sorted(manifest)
+        tmp = self.path + '.tmp.npz'
+        np.savez_compressed(tmp, keys=np.array(keys, dtype=str),
+                            fingerprints=np.array([manifest[k] for k in keys], dtype=np.uint64),
+                            fields=np.array(self.fields, dtype=str))
+        os.replace(tmp, self.path)
+
+        deleted = self.deleted() if complete else []
+        if deletions_path and deleted:
+            pd.DataFrame({'key': deleted}).to_csv(deletions_path, index=False)
+        return deleted
+
+    def summary(self):
+        return (f"Delta: {self.new:,} new | {self.changed:,} changed | "
+                f"{self.unchanged:,} unchanged | {len(self.deleted()):,} no longer in file")
+
+
+def add_delta_arguments(parser, default_manifest):
+    """Add the shared --delta/--manifest options to an importer's CLI"""
+    parser.add_argument('--delta', action='store_true',
+                        help='upload only rows that are new or changed since the last import')
+    parser.add_argument('--manifest', default=default_manifest,
+                        help=f'fingerprint manifest for --delta (default: {default_manifest})')
+    return parser
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory dtypes for the Detroit sales export
+
+pd.read_csv() stores every text cell as a separate string, and columns
+with a handful of distinct values (Terms of Sale, Sale Instrument, ECF
+Neighborhood, ...) repeat the same value on every row. The plan here stores:
+
+    categorical      low-cardinality text: the codes plus one copy of each value
+    arrow strings    free text (addresses, names), one buffer per column
+                     instead of a Python object per cell (needs pyarrow)
+    Int32            Sales ID, Sale Number, ESRI_OID (nullable; Int64 if needed)
+    float32          x / y coordinates
+    float64          Sale Price, Property Transfer Percentage
+    datetime64       Sale Date, parsed once from '%m/%d/%Y[ time]'
+
+On 100k synthetic rows a chunk takes 185 B/row instead of 289 with pandas
+3 (whose default strings are already Arrow-backed), and 190 B/row instead
+of 791 with object strings. That leaves room for much larger
+--chunk-size values, or for the whole file (load_compact) on a small machine.
+
+The sales_transform converters take these dtypes and give the same records
+as before, with one exception. float32 holds about 7 significant digits, so
+coordinates come back as the shortest float32 form ('-83.12478' for
+'-83.124778'), about a metre off. Importers only use the plan when asked
+(--compact).
+
+Usage (run from backend-scripts/):
+
+    reader = CsvChunkReader(CSV_FILE, 50000, plan=COMPACT_PLAN)
+    for chunk in reader:
+        print(memory_line(chunk))         # '50,000 rows, 9.8 MB (196 B/row)'
+
+CLI, per-column comparison with the default read:
+    python3 sales_dtypes.py --rows 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CSV_FILE = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
+
+CATEGORY_COLUMNS = ('Street Prefix', 'Terms of Sale', 'Sale Verification', 'Sale Instrument',
+                    'Property Class Code', 'ECF Neighborhood')
+INTEGER_COLUMNS = ('Sales ID', 'Sale Number', 'ESRI_OID')
+FLOAT32_COLUMNS = ('x', 'y')
+FLOAT_COLUMNS = ('Sale Price', 'Property Transfer Percentage')
+DATE_COLUMNS = ('Sale Date',)
+TEXT_COLUMNS = ('Parcel Number', 'Street Address', 'Street Number', 'Street Name', 'Unit Number',
+                'Grantor', 'Grantee', 'Liber Page')
+
+DATE_FORMAT = '%m/%d/%Y'
+
+
+class DtypePlan:
+    """Which sales columns get which compact dtype (columns a chunk lacks are skipped)"""
+
+    def __init__(self, category=CATEGORY_COLUMNS, integer=INTEGER_COLUMNS,
+                 float32=FLOAT32_COLUMNS, float64=FLOAT_COLUMNS, dates=DATE_COLUMNS,
+                 text=TEXT_COLUMNS):
+        self.category = tuple(category)
+        self.integer = tuple(integer)
+        self.float32 = tuple(float32)
+        self.float64 = tuple(float64)
+        self.dates = tuple(dates)
+        self.text = tuple(text)
+
+    def read_dtypes(self):
+        """dtype= for pd.read_csv: categoricals are built by the parser, so
+        the per-row strings never exist"""
+        return {column: 'category' for column in self.category}
+
+    def apply(self, df):
+        """df with every planned column converted (in place, and returned)"""
+        for column in df.columns.intersection(self.category):
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        for column in df.columns.intersection(self.integer):
+            df[column] = _integers(df[column])
+        for column in df.columns.intersection(self.float32):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float32)
+        for column in df.columns.intersection(self.float64):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float64)
+        for column in df.columns.intersection(self.dates):
+            df[column] = _dates(df[column])
+        if _ARROW_STRING is not None:
+            # Only object columns: a column the parser read as numbers keeps
+            # its dtype, so str() of its cells does not change
+            for column in df.columns.intersection(self.text):
+                if df[column].dtype == object:
+                    df[column] = df[column].astype(_ARROW_STRING)
+        return df
+
+
+COMPACT_PLAN = DtypePlan()
+
+try:
+    import pyarrow  # noqa: F401  (backs the string dtype)
+    # NaN for missing values, like object columns and pandas 3's default
+    _ARROW_STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+except (ImportError, TypeError):
+    _ARROW_STRING = None
+
+
+def _integers(values):
+    """Nullable Int32 (Int64 when the values need it), or float64 if some
+    value has a fraction (which parse_number() truncates anyway)"""
+    numbers = pd.to_numeric(values, errors='coerce')
+    present = numbers.dropna()
+    if not (present == np.trunc(present)).all():
+        return numbers.astype(np.float64)
+    if present.empty or (present.min() >= -2 ** 31 and present.max() < 2 ** 31):
+        return numbers.astype('Int32')
+    if present.min() >= -2 ** 63 and present.max() < 2 ** 63:
+        return numbers.astype('Int64')
+    return numbers.astype(np.float64)
+
+def _dates(values):
+    """'%m/%d/%Y[ time]' -> datetime64, NaT where parse_date() gives None"""
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+    text = values.astype(object).where(values.notna(), None)
+    date_part = text.str.split(' ', n=1).str[0]
+    return pd.to_datetime(date_part, format=DATE_FORMAT, errors='coerce')
+
+
+def memory_bytes(df):
+    """Bytes held by a DataFrame, counting the Python strings in object columns"""
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def memory_line(df):
+    """e.g. '10,000 rows, 2.1 MB (214 B/row)'"""
+    size = memory_bytes(df)
+    per_row = size / len(df) if len(df) else 0
+    return f"{len(df):,} rows, {size / 1e6:,.1f} MB ({per_row:,.0f} B/row)"
+
+def memory_report(df, baseline=None):
+    """Per-column dtype and bytes, with the baseline frame's figures if given"""
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': df.memory_usage(deep=True, index=False),
+    })
+    if baseline is not None:
+        report['baseline_dtype'] = baseline.dtypes.astype(str)
+        report['baseline_bytes'] = baseline.memory_usage(deep=True, index=False)
+        report['ratio'] = (report['baseline_bytes'] / report['bytes']).round(1)
+    return report
+
+def load_compact(path=CSV_FILE, plan=COMPACT_PLAN, chunk_size=100000, nrows=None):
+    """The whole export in the compact dtypes, read a chunk at a time so the
+    object-dtype form of the file never exists at once"""
+    from csv_reader import CsvChunkReader
+
+    chunks = []
+    for chunk in CsvChunkReader(path, chunk_size, 'pandas', plan=plan):
+        chunks.append(chunk)
+        if nrows is not None and sum(map(len, chunks)) >= nrows:
+            break
+    if not chunks:
+        return pd.DataFrame()
+    # Each chunk has its own categories; concat would fall back to object
+    # unless they are unified first
+    combined = {}
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            combined[column] = union_categoricals([chunk[column] for chunk in chunks])
+    frame = pd.concat(chunks, ignore_index=True)
+    for column, values in combined.items():
+        frame[column] = pd.Categorical(values)
+    return frame.head(nrows) if nrows is not None else frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory of the sales export with and without the dtype plan')
+    parser.add_argument('--csv', default=CSV_FILE, help='sales export to measure')
+    parser.add_argument('--rows', type=int, default=100000, help='rows to read (default: 100000)')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    baseline = pd.read_csv(args.csv, encoding='utf-8-sig', low_memory=False, nrows=args.rows)
+    baseline_seconds = time.monotonic() - started
+    started = time.monotonic()
+    compact = load_compact(args.csv, nrows=args.rows)
+    compact_seconds = time.monotonic() - started
+
+    report = memory_report(compact, baseline)
+    with pd.option_context('display.width', 120, 'display.max_rows', None):
+        print(report.to_string())
+    total, baseline_total = memory_bytes(compact), memory_bytes(baseline)
+    print(f"\nDefault read: {memory_line(baseline)} in {baseline_seconds:.2f}s")
+    print(f"Compact plan: {memory_line(compact)} in {compact_seconds:.2f}s "
+          f"({baseline_total / total:.1f}x smaller)")
+
+if __name__ == '__main__':
+    main()
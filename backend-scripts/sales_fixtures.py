@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Synthetic Detroit sales data for the benchmarks
+
+The real export is ~477k rows and not checked in, so the benchmark scripts
+generate CSVs in the same layout, including the messy values the importers
+have to cope with (blank names, 'N/A' dates, $0/$1 transfers).
+
+  synthetic_csv()    small in-memory file from a fixed value list (the
+                     transform/COPY equivalence checks use it)
+  write_sales_csv()  realistic files of any size, generated with NumPy a block
+                     at a time: a fixed universe of parcels that resell
+                     (repeat sales), neighborhoods with their own price level
+                     and location, a price trend over the years, bulk
+                     sellers/buyers that recur (land bank, county treasurer,
+                     LLCs) and the same mess as above
+  fixture_csv()      write_sales_csv() cached under .fixtures/ by size and seed
+  synthetic_parcels()
+                     parcels rows (floor area, assessed value, ...) for the
+                     parcel numbers of a sales file
+
+Usage (run from backend-scripts/):
+
+    path = fixture_csv(1_000_000)          # ../backend-scripts/.fixtures/sales-1000000-s42.csv
+    python3 sales_fixtures.py --rows 100000 --output sample.csv
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+HEADER = ['Sales ID', 'Parcel Number', 'Sale Number', 'Street Address', 'Street Number',
+          'Street Prefix', 'Street Name', 'Unit Number', 'Sale Date', 'Sale Price',
+          'Grantor', 'Grantee', 'Liber Page', 'Terms of Sale', 'Sale Verification',
+          'Sale Instrument', 'Property Transfer Percentage', 'Property Class Code',
+          'ECF Neighborhood', 'x', 'y', 'ESRI_OID']
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fixtures')
+
+
+def synthetic_csv(rows, seed=42):
+    """Small Detroit-layout CSV with the messy values the real export has"""
+    rng = random.Random(seed)
+    streets = ['GRAND RIVER', 'W  OUTER DR', 'GLASTONBURY', 'E JEFFERSON', 'LIVERNOIS ', 'GRATIOT']
+    names = ['DETROIT LAND BANK AUTHORITY', 'SMITH, JOHN', '  WAYNE COUNTY TREASURER ',
+             'ABC PROPERTIES LLC', 'DOE  JANE', '', 'FANNIE MAE']
+    terms = ['VALID ARMS LENGTH', 'NOT ARMS LENGTH', 'PROPERTY TRANSFER AFFIDAVIT', '']
+    out = io.StringIO()
+    out.write(','.join(f'"{h}"' for h in HEADER) + '\n')
+    for i in range(rows):
+        number = rng.randint(1, 20000)
+        street = rng.choice(streets)
+        month, day, year = rng.randint(1, 12), rng.randint(1, 28), rng.randint(1995, 2025)
+        date = f'{month}/{day}/{year} 12:00:00 AM' if rng.random() < 0.9 else rng.choice(['', 'N/A'])
+        price = rng.randint(500, 400000) if rng.random() < 0.7 else rng.choice([0, 1, 100])
+        values = [
+            i + 1, f'{rng.randint(1, 22):02d}{rng.randint(0, 999999):06d}.', rng.randint(1, 6),
+            f'{number} {street}', number, rng.choice(['', 'W', 'E']), street, '',
+            date, price, rng.choice(names), rng.choice(names), f'{rng.randint(1, 60000)}:{rng.randint(1, 999)}',
+            rng.choice(terms), rng.choice(['', 'VERIFIED']), rng.choice(['WD', 'QC', 'PTA']),
+            rng.choice([100, 50, '']), rng.choice([401, 402, 201]), f'{rng.randint(1000, 9999)} NBHD',
+            round(rng.uniform(-83.28, -82.91), 6), round(rng.uniform(42.25, 42.45), 6), i + 1,
+        ]
+        out.write(','.join(f'"{v}"' for v in values) + '\n')
+    out.seek(0)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Realistic generator
+# ---------------------------------------------------------------------------
+
+STREET_NAMES = ('GRAND RIVER', 'OUTER DR', 'GLASTONBURY', 'JEFFERSON', 'LIVERNOIS', 'GRATIOT',
+                'WOODWARD', 'MACK', 'VAN DYKE', 'FENKELL', 'PLYMOUTH', 'SCHAEFER', 'WYOMING',
+                'GREENFIELD', 'EVERGREEN', 'MCNICHOLS', 'SEVEN MILE', 'CHICAGO', 'TIREMAN',
+                'WARREN', 'HARPER', 'CONANT', 'DEXTER', 'LINWOOD', 'MICHIGAN', 'VERNOR',
+                'KERCHEVAL', 'CADIEUX', 'MORANG', 'HAYES', 'KELLY', 'CHALMERS', 'ASHTON',
+                'BRAILE', 'STAHELIN', 'ARCHDALE', 'PATTON', 'ROSEMONT', 'MONTROSE', 'SORRENTO')
+STREET_SUFFIXES = ('', ' ST', ' AVE', ' RD', ' BLVD', ' DR', ' CT')
+PREFIXES = ('', '', '', 'W', 'E', 'N', 'S')
+# Bulk grantors/grantees, heavily repeated, with the export's spacing quirks
+ENTITIES = ('DETROIT LAND BANK AUTHORITY', '  WAYNE COUNTY TREASURER ', 'FANNIE MAE',
+            'FEDERAL HOME LOAN MORTGAGE CORP', 'CITY OF DETROIT', 'US BANK NATIONAL ASSN',
+            'WELLS FARGO BANK NA', 'DEUTSCHE BANK NATIONAL TRUST CO', 'HUD', 'SECRETARY OF HUD')
+FIRST_NAMES = ('JOHN', 'MARY', 'JAMES', 'PATRICIA', 'ROBERT', 'LINDA', 'MICHAEL', 'BARBARA',
+               'WILLIAM', 'ELIZABETH', 'DAVID', 'JENNIFER', 'ANDRE', 'KEISHA', 'DARNELL',
+               'LATOYA', 'MOHAMMED', 'FATIMA', 'JOSE', 'MARIA')
+LAST_NAMES = ('SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'DAVIS', 'MILLER', 'WILSON',
+              'MOORE', 'TAYLOR', 'ANDERSON', 'THOMAS', 'JACKSON', 'WHITE', 'HARRIS', 'MARTIN',
+              'THOMPSON', 'GARCIA', 'ROBINSON', 'WALKER', 'YOUNG', 'ALLEN', 'KING', 'WRIGHT',
+              'SCOTT', 'GREEN', 'BAKER', 'ADAMS', 'NELSON', 'HILL', 'CAMPBELL', 'MITCHELL')
+TERMS = ('VALID ARMS LENGTH', 'NOT ARMS LENGTH', 'PROPERTY TRANSFER AFFIDAVIT', 'FORECLOSURE',
+         'BANK SALE USED', 'QUIT CLAIM', 'ESTATE SALE', '')
+TERM_WEIGHTS = (0.34, 0.22, 0.14, 0.08, 0.06, 0.06, 0.04, 0.06)
+INSTRUMENTS = ('WD', 'QC', 'PTA', 'LC', 'SD', 'PRD')
+INSTRUMENT_WEIGHTS = (0.45, 0.25, 0.18, 0.05, 0.04, 0.03)
+CLASS_CODES = (401, 402, 201, 202, 301, 407)
+CLASS_WEIGHTS = (0.72, 0.08, 0.1, 0.04, 0.03, 0.03)
+NEIGHBORHOODS = 200
+BLOCK_ROWS = 100000
+
+
+class ParcelUniverse:
+    """Fixed parcels (address, neighborhood, location, class) that sales draw from"""
+
+    def __init__(self, count, rng):
+        self.count = count
+        hood = rng.integers(0, NEIGHBORHOODS, count)
+        # Each neighborhood sits somewhere in the city's bounding box and has
+        # its own price level (lognormal median around $40k-$250k)
+        centers_x = rng.uniform(-83.26, -82.94, NEIGHBORHOODS)
+        centers_y = rng.uniform(42.27, 42.44, NEIGHBORHOODS)
+        self.hood_level = rng.lognormal(np.log(90000), 0.6, NEIGHBORHOODS)
+        self.hood = hood
+        self.hood_code = np.array([f"{code} NBHD" for code in rng.choice(np.arange(1000, 9999), NEIGHBORHOODS,
+                                                                         replace=False)], dtype=object)
+        self.x = np.round(centers_x[hood] + rng.normal(0, 0.008, count), 6)
+        self.y = np.round(centers_y[hood] + rng.normal(0, 0.005, count), 6)
+        self.number = rng.integers(1, 20000, count)
+        self.prefix = np.array(PREFIXES, dtype=object)[rng.integers(0, len(PREFIXES), count)]
+        streets = np.array([f"{name}{suffix}" for name in STREET_NAMES for suffix in STREET_SUFFIXES], dtype=object)
+        self.street = streets[rng.integers(0, len(streets), count)]
+        self.parcel_number = np.array([f"{ward:02d}{lot:06d}." for ward, lot in
+                                       zip(rng.integers(1, 23, count), rng.integers(0, 999999, count))], dtype=object)
+        self.class_code = rng.choice(CLASS_CODES, count, p=CLASS_WEIGHTS)
+        # Larger homes sell for more within a neighborhood
+        self.quality = rng.lognormal(0, 0.35, count)
+        # Popularity: most parcels sell once or twice, a few change hands
+        # a dozen times or more
+        self.weight = rng.lognormal(0, 0.6, count)
+        self.weight /= self.weight.sum()
+        self.sale_count = np.zeros(count, dtype=np.int64)
+
+
+def _names(rng, n):
+    """Grantor/grantee column: bulk entities, LLCs, people in 'LAST, FIRST' or
+    'FIRST LAST' form, and blanks"""
+    kind = rng.choice(4, n, p=(0.22, 0.08, 0.62, 0.08))
+    entity = np.array(ENTITIES, dtype=object)[np.minimum(rng.zipf(1.6, n) - 1, len(ENTITIES) - 1)]
+    llc = np.char.add(np.char.add(np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), n)],
+                                  np.array([' HOLDINGS', ' PROPERTIES', ' INVESTMENTS', ' REALTY'])[rng.integers(0, 4, n)]),
+                      ' LLC').astype(object)
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), n)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), n)]
+    comma = rng.random(n) < 0.6
+    person = np.where(comma, last + ', ' + first, first + '  ' + last)
+    return np.select([kind == 0, kind == 1, kind == 2], [entity, llc, person], '')
+
+def generate_sales(rows, seed=42, universe=None, start_id=1, rng=None):
+    """rows synthetic sales as a DataFrame in the export's column layout (all text)"""
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    universe = universe or ParcelUniverse(max(rows * 3 // 5, 1), rng)
+    parcel = rng.choice(universe.count, rows, p=universe.weight)
+    # Sale Number counts the parcel's sales so far, across blocks
+    sale_number = universe.sale_count[parcel] + pd.Series(parcel).groupby(parcel).cumcount().to_numpy() + 1
+    np.add.at(universe.sale_count, parcel, 1)
+
+    years = rng.integers(1995, 2026, rows)
+    months = rng.integers(1, 13, rows)
+    days = rng.integers(1, 29, rows)
+    date = pd.Series(months.astype(str), dtype=object) + '/' + days.astype(str) + '/' + years.astype(str) + ' 12:00:00 AM'
+    bad_date = rng.random(rows)
+    date[bad_date < 0.02] = ''
+    date[(bad_date >= 0.02) & (bad_date < 0.03)] = 'N/A'
+
+    # Price: neighborhood level x parcel quality x ~3%/yr trend x noise;
+    # about a quarter are nominal transfers
+    trend = 1.03 ** (years - 2010)
+    price = universe.hood_level[universe.hood[parcel]] * universe.quality[parcel] * trend \
+        * rng.lognormal(0, 0.25, rows)
+    price = np.round(price / 100) * 100
+    nominal = rng.random(rows) < 0.25
+    price[nominal] = rng.choice([0, 1, 10, 100], nominal.sum())
+
+    ids = np.arange(start_id, start_id + rows)
+    street = universe.street[parcel]
+    prefix = universe.prefix[parcel]
+    number = universe.number[parcel].astype(str)
+    address = np.where(prefix == '', number + ' ' + street, number + ' ' + prefix + ' ' + street)
+    unit = np.where(rng.random(rows) < 0.03, rng.integers(1, 12, rows).astype(str), '')
+
+    return pd.DataFrame({
+        'Sales ID': ids,
+        'Parcel Number': universe.parcel_number[parcel],
+        'Sale Number': sale_number,
+        'Street Address': address,
+        'Street Number': number,
+        'Street Prefix': prefix,
+        'Street Name': street,
+        'Unit Number': unit,
+        'Sale Date': date,
+        'Sale Price': price.astype(np.int64),
+        'Grantor': _names(rng, rows),
+        'Grantee': _names(rng, rows),
+        'Liber Page': pd.Series(rng.integers(1, 60000, rows).astype(str), dtype=object) + ':'
+                      + rng.integers(1, 999, rows).astype(str),
+        'Terms of Sale': rng.choice(np.array(TERMS, dtype=object), rows, p=TERM_WEIGHTS),
+        'Sale Verification': np.where(rng.random(rows) < 0.4, 'VERIFIED', ''),
+        'Sale Instrument': rng.choice(np.array(INSTRUMENTS, dtype=object), rows, p=INSTRUMENT_WEIGHTS),
+        'Property Transfer Percentage': rng.choice(np.array(['100', '50', ''], dtype=object), rows,
+                                                   p=(0.9, 0.04, 0.06)),
+        'Property Class Code': universe.class_code[parcel],
+        'ECF Neighborhood': universe.hood_code[universe.hood[parcel]],
+        'x': universe.x[parcel],
+        'y': universe.y[parcel],
+        'ESRI_OID': ids,
+    }, columns=HEADER)
+
+def write_sales_csv(path, rows, seed=42, block_rows=BLOCK_ROWS):
+    """Write rows realistic sales to path, a block at a time, quoted like the export"""
+    rng = np.random.default_rng(seed)
+    universe = ParcelUniverse(max(rows * 3 // 5, 1), rng)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', newline='') as f:
+        for start in range(0, rows, block_rows):
+            block = generate_sales(min(block_rows, rows - start), universe=universe,
+                                   start_id=start + 1, rng=rng)
+            block.to_csv(f, index=False, header=start == 0, quoting=csv.QUOTE_ALL)
+        if rows == 0:
+            f.write(','.join(f'"{h}"' for h in HEADER) + '\n')
+    os.replace(tmp, path)
+    return path
+
+def fixture_csv(rows, seed=42, directory=FIXTURE_DIR):
+    """Path of a cached write_sales_csv() file, generating it on first use"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"sales-{rows}-s{seed}.csv")
+    if not os.path.exists(path):
+        write_sales_csv(path, rows, seed)
+    return path
+
+
+def synthetic_parcels(sales_csv, seed=42):
+    """parcels rows (schema.sql columns) for every parcel number in a fixture file"""
+    sales = pd.read_csv(sales_csv, dtype=str, usecols=['Parcel Number', 'Street Address', 'ECF Neighborhood'])
+    sales = sales.dropna(subset=['Parcel Number']).drop_duplicates('Parcel Number')
+    rng = np.random.default_rng(seed)
+    count = len(sales)
+    frame = pd.DataFrame({
+        'id': np.arange(1, count + 1),
+        'parcel_id': sales['Parcel Number'].str.rstrip('.').to_numpy(),
+        'address': sales['Street Address'].to_numpy(),
+        'neighborhood': sales['ECF Neighborhood'].to_numpy(),
+        'owner_full_name': np.where(rng.random(count) < 0.5, 'SMITH, JOHN', 'DOE, JANE'),
+        'year_built': rng.integers(1900, 2020, count),
+        'total_floor_area': rng.integers(700, 3500, count),
+        'assessed_value': np.round(rng.lognormal(np.log(60000), 0.8, count), -2),
+        'created_at': '2025-01-01T00:00:00+00:00',
+    })
+    return frame.to_dict('records')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Detroit sales CSV')
+    parser.add_argument('--rows', type=int, default=100000, help='rows to write (default: 100000)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default: 42)')
+    parser.add_argument('--output', help='CSV path (default: cached under .fixtures/)')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    path = write_sales_csv(args.output, args.rows, args.seed) if args.output else fixture_csv(args.rows, args.seed)
+    print(f"{args.rows:,} rows in {path} ({os.path.getsize(path) / 1e6:,.1f} MB, "
+          f"{time.monotonic() - started:.1f}s)")
+
+if __name__ == '__main__':
+    main()
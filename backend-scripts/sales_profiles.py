@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Declarative column-mapping profiles for the sales importers
+
+The importers in this directory each hard-coded which export columns go to
+which table columns, which rows are kept and how they are written. The
+database has two incompatible layouts for sales_transactions:
+
+  updated-sales-schema.sql       grantor / grantee / street_address / sales_id
+  sales-transactions-schema.sql  seller_name / buyer_name / property_address
+
+A MappingProfile states all of that as data, and import-sales.py runs any
+profile against any source (see sales_sources.py):
+
+  columns       (db_column, source_column, kind) tuples, as in sales_transform
+  required      db columns that must have a value
+  any_of        at least one of these must have a value
+  min_price     sale_price must be above this (after conversion)
+  defaults      value for a db column that came out empty
+  key           db column that identifies a row; rows without one are dropped
+                and the upload is an upsert on it, so replays are safe
+  prefilter     (source column, minimum) applied to the raw chunk, and
+  dedupe        the source column to de-duplicate on within a chunk
+  source        the export the profile was written for (the default input)
+  engine        CSV engine to use for --engine auto, for sources the sales
+                snapshot cannot read (see csv_reader.py)
+  na_values     cells read as missing, when text like 'NA' is a value
+
+The profile's transform() returns the (columns, keep[, omit_none]) triple
+the rest of the tooling takes. A profile can name a transform function
+instead when its rules do not fit the fields above (the Resi workbook, and
+the parcel file in parcel_transform.py).
+
+Usage (run from backend-scripts/):
+
+    profile = PROFILES['updated']
+    chunk = profile.prepare(chunk)
+    columns, keep = profile.transform(chunk)[:2]
+"""
+
+import numpy as np
+
+from sales_transform import (
+    DETAILED_SALES_COLUMNS, EXISTING_SCHEMA_COLUMNS, SIMPLIFIED_SALES_COLUMNS,
+    transform_columns, transform_resi_workbook, truthy,
+)
+from parcel_transform import PARCEL_DTYPES, transform_parcels
+
+TABLE = 'sales_transactions'
+
+SALES_CSV = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
+RESI_WORKBOOK = '../docs/2025 Resi All Transactions.xlsx'
+PARCEL_CSV = '../parcel_file_current_-3720075312525260545.csv'
+
+
+class MappingProfile:
+    """How one source layout maps onto one table layout (see module docstring)"""
+
+    def __init__(self, name, schema, columns=(), required=(), any_of=(), min_price=None,
+                 defaults=None, key=None, prefilter=None, dedupe=None, transform=None,
+                 dtype=None, table=TABLE, source=SALES_CSV, engine=None, na_values=None,
+                 description=''):
+        self.name = name
+        self.schema = schema
+        self.table = table
+        self.columns = tuple(columns)
+        self.required = tuple(required)
+        self.any_of = tuple(any_of)
+        self.min_price = min_price
+        self.defaults = dict(defaults or {})
+        self.key = key
+        self.prefilter = prefilter
+        self.dedupe = dedupe
+        self.custom_transform = transform
+        self.dtype = dict(dtype or {})
+        self.source = source
+        self.engine = engine
+        self.na_values = na_values
+        self.description = description
+
+    @property
+    def fields(self):
+        """db columns the profile writes (empty for custom transforms)"""
+        return [field for field, _, _ in self.columns]
+
+    def prepare(self, df):
+        """Source-row filters applied before the transform (cheap, in the reader)"""
+        if self.prefilter is not None:
+            column, minimum = self.prefilter
+            df = df[df[column] > minimum]
+        if self.dedupe is not None:
+            # One row per key so a batch never upserts the same key twice
+            df = df.drop_duplicates(self.dedupe, keep='last')
+        return df
+
+    def transform(self, df):
+        """(columns, keep) for a chunk; picklable, so it runs on pipeline workers"""
+        if self.custom_transform is not None:
+            return self.custom_transform(df)
+        columns = transform_columns(df, self.columns)
+        for field, default in self.defaults.items():
+            values = columns[field].copy()
+            values[np.equal(values, None)] = default
+            columns[field] = values
+
+        keep = np.ones(len(df), dtype=bool)
+        for field in self.required:
+            keep &= truthy(columns[field])
+        if self.any_of:
+            keep &= np.logical_or.reduce([truthy(columns[field]) for field in self.any_of])
+        if self.min_price is not None:
+            price = columns['sale_price']
+            keep[keep] = price[keep] > self.min_price
+        if self.key is not None:
+            keep &= np.not_equal(columns[self.key], None)
+        return columns, keep
+
+    def send(self, supabase):
+        """The upload function for a BatchUploader: upsert on key, else insert"""
+        table = supabase.table(self.table)
+        if self.key is not None:
+            return lambda records: table.upsert(records, on_conflict=self.key).execute()
+        return lambda records: table.insert(records).execute()
+
+
+_SALE_FIELDS = dict(required=('street_address', 'sale_date', 'sale_price'),
+                    any_of=('grantor', 'grantee'))
+
+PROFILES = {profile.name: profile for profile in (
+    MappingProfile(
+        'updated', 'updated-sales-schema.sql', DETAILED_SALES_COLUMNS, **_SALE_FIELDS,
+        key='sales_id', prefilter=('Sale Price', 100), dedupe='Sales ID',
+        dtype={'Sale Price': 'float64'},
+        description='Detroit sales CSV -> full grantor/grantee record, upserted on sales_id',
+    ),
+    MappingProfile(
+        'updated-basic', 'updated-sales-schema.sql', SIMPLIFIED_SALES_COLUMNS, **_SALE_FIELDS,
+        prefilter=('Sale Price', 100), dtype={'Sale Price': 'float64'},
+        description='Detroit sales CSV -> core grantor/grantee fields, inserted',
+    ),
+    MappingProfile(
+        'existing', 'sales-transactions-schema.sql', EXISTING_SCHEMA_COLUMNS,
+        required=('property_address', 'sale_date'), min_price=100,
+        defaults={'seller_name': 'UNKNOWN SELLER', 'buyer_name': 'UNKNOWN BUYER'},
+        prefilter=('Sale Price', 100), dtype={'Sale Price': 'float64'},
+        description='Detroit sales CSV -> seller_name/buyer_name layout, inserted',
+    ),
+    MappingProfile(
+        'resi-workbook', 'sales-transactions-schema.sql', transform=transform_resi_workbook,
+        source=RESI_WORKBOOK,
+        description="'2025 Resi All Transactions.xlsx' -> seller_name/buyer_name layout, inserted",
+    ),
+    MappingProfile(
+        'parcels', 'schema.sql', transform=transform_parcels, key='parcel_id',
+        dedupe='Parcel ID', dtype=PARCEL_DTYPES, table='parcels', source=PARCEL_CSV,
+        engine='pandas', na_values=('',),
+        description='city parcel file -> parcels, upserted on parcel_id',
+    ),
+)}
+
+
+def describe_profiles():
+    """One line per profile for --help"""
+    return '\n'.join(f"  {name:<14} {profile.description} ({profile.schema})"
+                     for name, profile in PROFILES.items())
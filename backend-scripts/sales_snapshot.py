@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot cache of the raw Detroit sales CSV
+
+Parsing the ~477k-row export from text takes longer than most of what the
+scripts then do with it, and samples and dry runs pay that cost every time.
+The first read converts the CSV into a typed Parquet dataset, partitioned
+by sale year (hive layout, sale_year=2019/...), in a directory named after
+the CSV's SHA-256. Later reads reuse it until the CSV's content changes.
+
+Column types follow the sales_transform specs: INTEGER and FLOAT columns are
+numeric, everything else is text, exactly as the CSV had it. Three columns
+are added: row_number (position in the CSV, so file order can be restored),
+sale_date (parsed date) and sale_year (the partition key). Readers get
+column projection and predicate pushdown, so a date range only opens the
+matching year partitions:
+
+    from sales_snapshot import read_sales
+    df = read_sales(CSV_FILE, columns=['Sales ID', 'Sale Price'],
+                    min_price=100, start_date='2020-01-01', end_date='2022-12-31')
+
+Requires pyarrow (pip install pyarrow).
+
+CLI (run from backend-scripts/):
+    python3 sales_snapshot.py build [--csv PATH]
+    python3 sales_snapshot.py info [--csv PATH]
+    python3 sales_snapshot.py query --min-price 100 --start 2020-01-01 --columns "Sales ID" "Sale Price"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+from sales_transform import (
+    DETAILED_SALES_COLUMNS, FLOAT, INTEGER, parse_date_column, parse_number_column,
+)
+
+CSV_FILE = '../docs/Property_Sales_Detroit_-4801866508954663892.csv'
+
+# Columns added to the source columns
+ROW_NUMBER = 'row_number'
+SALE_DATE = 'sale_date'
+SALE_YEAR = 'sale_year'
+EXTRA_COLUMNS = (ROW_NUMBER, SALE_DATE, SALE_YEAR)
+
+_NUMERIC_TYPES = {INTEGER: 'int64', FLOAT: 'float64'}
+_HASH_INDEX = 'hashes.json'
+_METADATA = 'snapshot.json'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise SystemExit("Sales snapshots need pyarrow: pip install pyarrow")
+
+def snapshot_root(csv_path):
+    """Cache directory: $SALES_SNAPSHOT_DIR or .snapshots/ next to the CSV"""
+    return os.getenv('SALES_SNAPSHOT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(csv_path)), '.snapshots')
+
+def content_hash(csv_path):
+    """SHA-256 of the file, remembered per (path, size, mtime) so an
+    unchanged file is not re-hashed on every run"""
+    root = snapshot_root(csv_path)
+    index_path = os.path.join(root, _HASH_INDEX)
+    stat = os.stat(csv_path)
+    key = os.path.abspath(csv_path)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    cached = index.get(key)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    os.makedirs(root, exist_ok=True)
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    return digest.hexdigest()
+
+def snapshot_dir(csv_path):
+    return os.path.join(snapshot_root(csv_path), content_hash(csv_path)[:16])
+
+def _typed_table(csv_path):
+    """The CSV as an Arrow table: numeric spec columns typed, the rest text"""
+    header = pd.read_csv(csv_path, encoding='utf-8-sig', nrows=0).columns
+    table = pa_csv.read_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                              strings_can_be_null=True),
+    )
+    kinds = {source: kind for _, source, kind in DETAILED_SALES_COLUMNS}
+    frame = table.to_pandas()
+    for name in header:
+        if kinds.get(name) in _NUMERIC_TYPES:
+            # parse_number_column(), as the pandas engine does: float()
+            # also accepts '1_000', padded and full-width digits, which
+            # pd.to_numeric() would turn into nulls
+            frame[name] = pd.Series(parse_number_column(frame[name], kinds[name] == FLOAT),
+                                    index=frame.index, dtype=float)
+            if kinds[name] == FLOAT or frame[name].notna().all():
+                frame[name] = frame[name].astype(_NUMERIC_TYPES[kinds[name]])
+
+    frame[ROW_NUMBER] = range(len(frame))
+    dates = pd.to_datetime(pd.Series(parse_date_column(frame['Sale Date'])), format='%Y-%m-%d')
+    frame[SALE_DATE] = dates.dt.date
+    frame[SALE_YEAR] = dates.dt.year.astype('Int16')
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+def build_snapshot(csv_path=CSV_FILE):
+    """Convert csv_path into its snapshot directory; returns the directory"""
+    _require_pyarrow()
+    target = snapshot_dir(csv_path)
+    started = time.monotonic()
+    table = _typed_table(csv_path)
+
+    # Write beside the target and rename, so a half-written snapshot is
+    # never picked up
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    ds.write_dataset(
+        table, staging, format='parquet',
+        partitioning=ds.partitioning(pa.schema([(SALE_YEAR, pa.int16())]), flavor='hive'),
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    metadata = {
+        'source': os.path.abspath(csv_path),
+        'sha256': content_hash(csv_path),
+        'rows': table.num_rows,
+        'columns': [name for name in table.column_names if name not in EXTRA_COLUMNS],
+        'built': datetime.now().isoformat(timespec='seconds'),
+        'build_seconds': round(time.monotonic() - started, 2),
+    }
+    with open(os.path.join(staging, _METADATA), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return target
+
+def ensure_snapshot(csv_path=CSV_FILE):
+    """Snapshot directory for csv_path, building it if missing or stale"""
+    _require_pyarrow()
+    target = snapshot_dir(csv_path)
+    if not os.path.exists(os.path.join(target, _METADATA)):
+        print(f"Building columnar snapshot of {os.path.basename(csv_path)}...")
+        build_snapshot(csv_path)
+    return target
+
+def snapshot_info(csv_path=CSV_FILE):
+    with open(os.path.join(ensure_snapshot(csv_path), _METADATA)) as f:
+        return json.load(f)
+
+def open_dataset(csv_path=CSV_FILE):
+    target = ensure_snapshot(csv_path)
+    return ds.dataset(target, format='parquet',
+                      partitioning=ds.partitioning(pa.schema([(SALE_YEAR, pa.int16())]), flavor='hive'),
+                      exclude_invalid_files=True)
+
+def _as_date(value):
+    return value if isinstance(value, date) else datetime.strptime(str(value), '%Y-%m-%d').date()
+
+def sales_filter(min_price=None, start_date=None, end_date=None, limit_rows=None):
+    """Arrow filter expression for the common importer predicates.
+
+    min_price keeps Sale Price > min_price (the importers' filter),
+    start_date/end_date are inclusive, and limit_rows keeps the first
+    limit_rows rows of the CSV (like nrows=).
+    """
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if min_price is not None:
+        add(ds.field('Sale Price') > min_price)
+    if start_date is not None:
+        start = _as_date(start_date)
+        add(ds.field(SALE_YEAR) >= start.year)  # prunes whole partitions
+        add(ds.field(SALE_DATE) >= start)
+    if end_date is not None:
+        end = _as_date(end_date)
+        add(ds.field(SALE_YEAR) <= end.year)
+        add(ds.field(SALE_DATE) <= end)
+    if limit_rows is not None:
+        add(ds.field(ROW_NUMBER) < limit_rows)
+    return expression
+
+def read_table(csv_path=CSV_FILE, columns=None, filter=None, file_order=True):
+    """Arrow table from the snapshot with projection and pushdown.
+
+    columns defaults to the CSV's own columns. With file_order the rows come
+    back in CSV order (partitions are otherwise read year by year).
+    """
+    dataset = open_dataset(csv_path)
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name not in EXTRA_COLUMNS]
+    wanted = list(columns) + ([ROW_NUMBER] if file_order and ROW_NUMBER not in columns else [])
+    table = dataset.to_table(columns=wanted, filter=filter)
+    if file_order:
+        table = table.sort_by(ROW_NUMBER)
+        if ROW_NUMBER not in columns:
+            table = table.drop_columns([ROW_NUMBER])
+    return table
+
+def read_sales(csv_path=CSV_FILE, columns=None, min_price=None, start_date=None,
+               end_date=None, nrows=None, file_order=True):
+    """DataFrame of sales from the snapshot (see sales_filter for the filters)"""
+    _require_pyarrow()
+    table = read_table(csv_path, columns,
+                       sales_filter(min_price, start_date, end_date, nrows), file_order)
+    return table.to_pandas()
+
+def load_sales(csv_path=CSV_FILE, columns=None, min_price=None, start_date=None,
+               end_date=None, nrows=None):
+    """read_sales() when pyarrow is installed, otherwise pd.read_csv() with
+    the same projection and filters applied after parsing"""
+    if pa is not None:
+        return read_sales(csv_path, columns, min_price, start_date, end_date, nrows)
+    df = pd.read_csv(csv_path, encoding='utf-8-sig', usecols=columns, nrows=nrows, low_memory=False)
+    if min_price is not None:
+        df = df[df['Sale Price'] > min_price]
+    if start_date is not None or end_date is not None:
+        dates = pd.Series(parse_date_column(df['Sale Date']), index=df.index)
+        keep = dates.notna()
+        if start_date is not None:
+            keep &= dates >= str(_as_date(start_date))
+        if end_date is not None:
+            keep &= dates <= str(_as_date(end_date))
+        df = df[keep]
+    return df
+
+def iter_chunks(csv_path=CSV_FILE, chunk_size=10000, columns=None, filter=None, skip_rows=0):
+    """DataFrame chunks of chunk_size rows in CSV order, like read_csv(chunksize=)"""
+    _require_pyarrow()
+    if skip_rows:
+        skip = ds.field(ROW_NUMBER) >= skip_rows
+        filter = skip if filter is None else filter & skip
+    table = read_table(csv_path, columns, filter)
+    for offset in range(0, table.num_rows, chunk_size):
+        frame = table.slice(offset, chunk_size).to_pandas()
+        frame.index = pd.RangeIndex(skip_rows + offset, skip_rows + offset + len(frame))
+        yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar snapshot cache of the Detroit sales CSV')
+    parser.add_argument('command', choices=('build', 'info', 'query'))
+    parser.add_argument('--csv', default=CSV_FILE)
+    parser.add_argument('--columns', nargs='+', help='columns to return (query)')
+    parser.add_argument('--min-price', type=float, help='Sale Price > this (query)')
+    parser.add_argument('--start', help='first sale date, YYYY-MM-DD (query)')
+    parser.add_argument('--end', help='last sale date, YYYY-MM-DD (query)')
+    parser.add_argument('--limit', type=int, default=10, help='rows to print (query)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.monotonic()
+        target = build_snapshot(args.csv)
+        print(f"Snapshot written to {target} in {time.monotonic() - started:.1f}s")
+    elif args.command == 'info':
+        print(json.dumps(snapshot_info(args.csv), indent=2))
+    else:
+        started = time.monotonic()
+        df = read_sales(args.csv, args.columns, args.min_price, args.start, args.end)
+        print(f"{len(df):,} rows in {time.monotonic() - started:.2f}s")
+        print(df.head(args.limit).to_string())
+
+if __name__ == '__main__':
+    main()
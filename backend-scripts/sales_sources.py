@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Source adapters for the streaming sales importer
+
+Every source is read as a sequence of DataFrame chunks of exactly
+chunk_size rows (the last may be shorter) with the same progress interface,
+so import-sales.py runs one execution core whatever the file format:
+
+    for chunk in source:          # DataFrames, column names from the header
+        ...
+    source.fraction               # share of the source read, 0.0-1.0
+    source.rows_read              # data rows so far, counting skip_rows
+    source.finished               # True once the last chunk was handed out
+    source.eta_seconds(), source.progress_line()
+
+  csv   CsvChunkReader from csv_reader.py (pandas, arrow or snapshot engine)
+  xlsx  XlsxChunkReader below: openpyxl in read-only mode, which streams the
+        sheet's XML row by row instead of loading the workbook, so memory
+        stays at one chunk like the CSV path (needs `pip install openpyxl`)
+
+Usage (run from backend-scripts/):
+
+    source = open_source('../docs/2025 Resi All Transactions.xlsx', chunk_size=5000)
+    for chunk in source:
+        print(source.progress_line())
+"""
+
+import os
+import time
+
+import pandas as pd
+
+from csv_reader import CsvChunkReader
+
+FORMATS = ('auto', 'csv', 'xlsx')
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.txt': 'csv',
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+}
+
+
+def source_format(path, format='auto'):
+    """'csv' or 'xlsx' for a path, from its extension when format is 'auto'"""
+    if format != 'auto':
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _EXTENSIONS:
+        raise ValueError(f"Cannot tell the format of {path}; pass --format csv or xlsx")
+    return _EXTENSIONS[extension]
+
+
+class XlsxChunkReader:
+    """Iterate one worksheet as DataFrame chunks without loading the workbook.
+
+    The first row is the header. Cells arrive as openpyxl gives them (dates
+    as datetime, numbers as int/float), which is what pd.read_excel()
+    produced for the workbook importer. skip_rows skips data rows after the
+    header, as in CsvChunkReader.
+    """
+
+    def __init__(self, path, chunk_size=10000, sheet=None, skip_rows=0, plan=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.sheet = sheet
+        self.skip_rows = skip_rows
+        self.plan = plan
+        self.total_bytes = os.path.getsize(path)
+        self.total_rows = None
+        self.rows_read = skip_rows
+        self.finished = False
+        self.started = None
+
+    def _open(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise SystemExit("Reading .xlsx sources needs openpyxl: pip install openpyxl")
+        return load_workbook(self.path, read_only=True, data_only=True)
+
+    def __iter__(self):
+        self.started = time.monotonic()
+        workbook = self._open()
+        try:
+            sheet = workbook[self.sheet] if self.sheet else workbook.worksheets[0]
+            # Read-only sheets know their size from the <dimension> element
+            # when the writer stored one; otherwise progress stays unknown
+            if sheet.max_row:
+                self.total_rows = max(sheet.max_row - 1, 0)
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                self.finished = True
+                return
+            columns = _header_names(header)
+            width = len(columns)
+
+            skipped = 0
+            pending = []
+            for row in rows:
+                if skipped < self.skip_rows:
+                    skipped += 1
+                    continue
+                if not any(value is not None for value in row):
+                    continue  # pd.read_excel drops rows with no values either
+                pending.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if len(pending) == self.chunk_size:
+                    yield self._frame(pending, columns)
+                    pending = []
+            if pending:
+                yield self._frame(pending, columns)
+        finally:
+            workbook.close()
+        self.finished = True
+
+    def _frame(self, rows, columns):
+        frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        frame.index = pd.RangeIndex(self.rows_read, self.rows_read + len(frame))
+        self.rows_read += len(frame)
+        frame = frame.infer_objects()
+        return self.plan.apply(frame) if self.plan is not None else frame
+
+    @property
+    def fraction(self):
+        if self.finished:
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return min(self.rows_read / self.total_rows, 1.0)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started else 0.0
+
+    def eta_seconds(self):
+        start = self.skip_rows / self.total_rows if self.total_rows else 0.0
+        done = self.fraction - start
+        if done <= 0 or self.elapsed <= 0:
+            return None
+        return self.elapsed * (1 - self.fraction) / done
+
+    def progress_line(self):
+        """e.g. '37.5% (18,750/50,000 rows) | ETA: 0.4 min'"""
+        eta = self.eta_seconds()
+        eta_text = f"{eta / 60:.1f} min" if eta is not None else '?'
+        total = f"{self.total_rows:,}" if self.total_rows else '?'
+        return f"{self.fraction * 100:.1f}% ({self.rows_read:,}/{total} rows) | ETA: {eta_text}"
+
+
+def _header_names(header):
+    """Column names like pd.read_excel gives them ('Unnamed: n' for blanks,
+    '.1' suffixes for repeats)"""
+    names, seen = [], {}
+    for position, value in enumerate(header):
+        name = f"Unnamed: {position}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def open_source(path, chunk_size=10000, format='auto', engine='auto', dtype=None,
+                skip_rows=0, sheet=None, plan=None, na_values=None):
+    """Chunked reader for a sales source file (see the module docstring)"""
+    if source_format(path, format) == 'xlsx':
+        return XlsxChunkReader(path, chunk_size, sheet=sheet, skip_rows=skip_rows, plan=plan)
+    return CsvChunkReader(path, chunk_size, engine, dtype, skip_rows=skip_rows, plan=plan,
+                          na_values=na_values)
+
+
+def add_source_arguments(parser):
+    """Add the shared --format/--sheet options to an importer's CLI"""
+    parser.add_argument('--format', choices=FORMATS, default='auto',
+                        help='source format (default: from the file extension)')
+    parser.add_argument('--sheet', help='worksheet to read from an .xlsx source (default: the first)')
+    return parser
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Column-at-a-time transforms for the Detroit sales importers
+
+The importers used to walk each DataFrame with iterrows() and call
+clean_text/parse_date/parse_number one cell at a time. The functions here do
+the same work a whole column at a time with pandas/NumPy string and array
+operations. Each vectorized converter takes a fast path for the common shapes
+of data and hands anything it does not recognise to the original scalar
+function, so the output is identical to the per-row code.
+
+Usage from an importer (run from backend-scripts/):
+
+    from sales_transform import transform_detailed, iter_record_batches
+
+    for offset, records in iter_record_batches(chunk, transform_detailed, 500):
+        supabase.table('sales_transactions').insert(records).execute()
+"""
+
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Column kinds understood by transform_columns()
+TEXT = 'text'
+DATE = 'date'
+INTEGER = 'int'
+FLOAT = 'float'
+
+# Detroit sales CSV -> updated-sales-schema.sql (grantor/grantee layout)
+DETAILED_SALES_COLUMNS = (
+    ('sales_id', 'Sales ID', INTEGER),
+    ('parcel_number', 'Parcel Number', TEXT),
+    ('sale_number', 'Sale Number', INTEGER),
+    ('street_address', 'Street Address', TEXT),
+    ('street_number', 'Street Number', TEXT),
+    ('street_prefix', 'Street Prefix', TEXT),
+    ('street_name', 'Street Name', TEXT),
+    ('unit_number', 'Unit Number', TEXT),
+    ('sale_date', 'Sale Date', DATE),
+    ('sale_price', 'Sale Price', FLOAT),
+    ('grantor', 'Grantor', TEXT),
+    ('grantee', 'Grantee', TEXT),
+    ('liber_page', 'Liber Page', TEXT),
+    ('terms_of_sale', 'Terms of Sale', TEXT),
+    ('sale_verification', 'Sale Verification', TEXT),
+    ('sale_instrument', 'Sale Instrument', TEXT),
+    ('property_transfer_percentage', 'Property Transfer Percentage', FLOAT),
+    ('property_class_code', 'Property Class Code', TEXT),
+    ('ecf_neighborhood', 'ECF Neighborhood', TEXT),
+    ('x_coordinate', 'x', FLOAT),
+    ('y_coordinate', 'y', FLOAT),
+    ('esri_oid', 'ESRI_OID', INTEGER),
+)
+
+# Subset used by import-sales-simplified.py
+SIMPLIFIED_SALES_COLUMNS = (
+    ('sales_id', 'Sales ID', INTEGER),
+    ('parcel_number', 'Parcel Number', TEXT),
+    ('street_address', 'Street Address', TEXT),
+    ('sale_date', 'Sale Date', DATE),
+    ('sale_price', 'Sale Price', FLOAT),
+    ('grantor', 'Grantor', TEXT),
+    ('grantee', 'Grantee', TEXT),
+    ('terms_of_sale', 'Terms of Sale', TEXT),
+    ('property_class_code', 'Property Class Code', TEXT),
+)
+
+# Detroit sales CSV -> sales-transactions-schema.sql (seller_name/buyer_name layout)
+EXISTING_SCHEMA_COLUMNS = (
+    ('property_address', 'Street Address', TEXT),
+    ('seller_name', 'Grantor', TEXT),
+    ('buyer_name', 'Grantee', TEXT),
+    ('sale_date', 'Sale Date', DATE),
+    ('sale_price', 'Sale Price', FLOAT),
+    ('parcel_id', 'Parcel Number', TEXT),
+    ('sale_terms', 'Terms of Sale', TEXT),
+)
+
+# Strict shapes for which the vectorized fast paths are known to agree with
+# the scalar functions. Everything else falls back to the scalar code.
+_DATE_PATTERN = r'^(1[0-2]|0[1-9]|[1-9])/(3[01]|[12][0-9]|0[1-9]|[1-9])/([0-9]{4})$'
+_NUMBER_PATTERN = r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+_YEAR_PATTERN = r'^[0-9]{4}$'
+_INT64_LIMIT = 2.0 ** 63
+
+
+# ---------------------------------------------------------------------------
+# Scalar reference functions (the original per-cell code)
+# ---------------------------------------------------------------------------
+
+def clean_text(text):
+    """Clean and standardize text fields"""
+    if pd.isna(text):
+        return None
+    text = str(text).strip()
+    text = re.sub(r'\s+', ' ', text)
+    return text if text else None
+
+def parse_date(date_value):
+    """Parse date from CSV format"""
+    if pd.isna(date_value):
+        return None
+    try:
+        date_str = str(date_value).split(' ')[0]
+        return datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
+    except:
+        return None
+
+def parse_number(value, is_float=False):
+    """Parse numeric values"""
+    if pd.isna(value):
+        return None
+    try:
+        if is_float:
+            return float(value)
+        else:
+            return int(float(value))
+    except:
+        return None
+
+def clean_address(address):
+    """Clean and standardize addresses (upper-cased, used by the xlsx importer)"""
+    if pd.isna(address):
+        return None
+    address = str(address).strip().upper()
+    address = re.sub(r'\s+', ' ', address)
+    return address
+
+def parse_excel_date(date_value):
+    """Parse the date formats found in the Resi transactions workbook"""
+    if pd.isna(date_value):
+        return None
+    try:
+        if isinstance(date_value, datetime):
+            return date_value.strftime('%Y-%m-%d')
+        elif isinstance(date_value, str):
+            for fmt in ['%m/%d/%Y', '%Y-%m-%d', '%m-%d-%Y', '%Y/%m/%d']:
+                try:
+                    return datetime.strptime(date_value, fmt).strftime('%Y-%m-%d')
+                except:
+                    continue
+        return None
+    except:
+        return None
+
+def parse_price(price_value):
+    """Parse price values, removing $ and commas"""
+    if pd.isna(price_value):
+        return None
+    try:
+        if isinstance(price_value, (int, float)):
+            return float(price_value)
+        elif isinstance(price_value, str):
+            cleaned = re.sub(r'[\$,\s]', '', price_value)
+            return float(cleaned) if cleaned else None
+    except:
+        return None
+
+def sale_year(date_value):
+    """Sale year from the raw date cell, or None if outside 1900-2100"""
+    year_str = str(date_value).split('/')[-1].split(' ')[0]
+    try:
+        year = int(year_str)
+        if 1900 <= year <= 2100:
+            return year
+    except:
+        pass
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Vectorized converters
+# ---------------------------------------------------------------------------
+
+def _as_series(values):
+    """Wrap values in a Series with a clean positional index"""
+    if isinstance(values, pd.Series):
+        return values.reset_index(drop=True)
+    return pd.Series(values, dtype=object)
+
+def _as_text(series):
+    """str() of every value, keeping string dtypes as they are"""
+    if pd.api.types.is_string_dtype(series.dtype) and series.dtype != object:
+        return series
+    return series.map(str).astype(object)
+
+def _fallback(result, series, positions, func):
+    """Run the scalar function over the positions the fast path skipped"""
+    if len(positions):
+        original = series.to_numpy(dtype=object)
+        result[positions] = [func(original[p]) for p in positions]
+
+def _unique_map(values, convert):
+    """Apply convert() to the distinct str() forms of the non-missing values
+    and scatter the results back.
+
+    Sales columns repeat heavily (names, neighborhoods, terms, dates), so the
+    string work runs once per distinct value instead of once per row.
+    convert() gets an object Series of str and returns an object array.
+    """
+    series = _as_series(values)
+    result = np.full(len(series), None, dtype=object)
+    notna = series.notna().to_numpy()
+    if notna.any():
+        codes, uniques = pd.factorize(_as_text(series[notna]))
+        converted = convert(pd.Series(np.asarray(uniques, dtype=object), dtype=object))
+        result[notna] = converted[codes]
+    return result
+
+def _clean_texts(text):
+    # str.split() splits on the same whitespace set as re's \s and drops
+    # leading/trailing runs, so this equals strip() + re.sub(r'\s+', ' ')
+    cleaned = np.array([' '.join(value.split()) for value in text], dtype=object)
+    cleaned[cleaned == ''] = None
+    return cleaned
+
+def _clean_addresses(text):
+    return np.array([' '.join(value.upper().split()) for value in text], dtype=object)
+
+def _parse_dates(text):
+    result = np.full(len(text), None, dtype=object)
+    parts = text.str.split(' ', n=1).str[0].str.extract(_DATE_PATTERN)
+    matched = parts[0].notna().to_numpy(copy=True)
+
+    if matched.any():
+        month = parts.loc[matched, 0].astype(int).to_numpy()
+        day = parts.loc[matched, 1].astype(int).to_numpy()
+        year = parts.loc[matched, 2].astype(int).to_numpy()
+        # Years below 1000 format differently through strftime; leave them
+        # (and impossible calendar dates) to the scalar path.
+        stamps = pd.to_datetime(
+            pd.DataFrame({'year': year, 'month': month, 'day': day}),
+            errors='coerce'
+        )
+        valid = stamps.notna().to_numpy() & (year >= 1000)
+        matched_positions = np.flatnonzero(matched)
+        result[matched_positions[valid]] = pd.Series(
+            stamps[valid].dt.strftime('%Y-%m-%d'), dtype=object
+        ).to_numpy()
+        matched[matched_positions[~valid]] = False
+
+    _fallback(result, text, np.flatnonzero(~matched), parse_date)
+    return result
+
+def _sale_years(text):
+    result = np.full(len(text), None, dtype=object)
+    year_text = text.str.split('/').str[-1].str.split(' ', n=1).str[0]
+    fast = year_text.str.match(_YEAR_PATTERN).to_numpy(dtype=bool)
+    if fast.any():
+        years = year_text[fast].astype(int).to_numpy()
+        in_range = (years >= 1900) & (years <= 2100)
+        result[np.flatnonzero(fast)[in_range]] = years[in_range].tolist()
+    _fallback(result, text, np.flatnonzero(~fast), sale_year)
+    return result
+
+def clean_text_column(values):
+    """Vectorized clean_text(): strip, collapse whitespace, '' -> None"""
+    return _unique_map(values, _clean_texts)
+
+def clean_address_column(values):
+    """Vectorized clean_address(): like clean_text_column() but upper-cased
+    and without the '' -> None step"""
+    return _unique_map(values, _clean_addresses)
+
+def parse_date_column(values):
+    """Vectorized parse_date(): '%m/%d/%Y[ time]' -> 'YYYY-MM-DD'.
+
+    Dates already parsed to datetime64 (see sales_dtypes.py) are formatted
+    directly.
+    """
+    series = _as_series(values)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return parse_excel_date_column(series)
+    return _unique_map(series, _parse_dates)
+
+def parse_number_column(values, is_float=False):
+    """Vectorized parse_number(): float(value) or int(float(value)), else None"""
+    series = _as_series(values)
+    result = np.full(len(series), None, dtype=object)
+    notna = series.notna().to_numpy()
+    if not notna.any():
+        return result
+
+    positions = np.flatnonzero(notna)
+    present = series[notna]
+    dtype = present.dtype
+    if dtype == np.float32:
+        # The shortest text that round-trips through float32 ('-83.12478'),
+        # not the binary value widened to float64 ('-83.12477874755859')
+        numbers = present.to_numpy().astype(str).astype(np.float64)
+        fast = np.ones(len(numbers), dtype=bool)
+    elif pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        numbers = present.to_numpy(dtype=np.float64)
+        fast = np.ones(len(numbers), dtype=bool)
+    else:
+        # Only plain ASCII decimals go through NumPy's float parser; odd forms
+        # ('1_000', ' 12', 'nan', ...) keep Python's float() semantics below.
+        fast = _as_text(present).str.match(_NUMBER_PATTERN).fillna(False).to_numpy(dtype=bool)
+        numbers = np.full(len(present), np.nan)
+        if fast.any():
+            numbers[fast] = present[fast].to_numpy(dtype=str).astype(np.float64)
+
+    if is_float:
+        result[positions[fast]] = numbers[fast].tolist()
+    else:
+        truncated = np.trunc(numbers)
+        small = fast & np.isfinite(truncated) & (np.abs(truncated) < _INT64_LIMIT)
+        result[positions[small]] = truncated[small].astype(np.int64).tolist()
+        # int(float('inf')) raises, so infinities become None like the
+        # scalar code; very large finite values become Python ints.
+        big = fast & ~small & np.isfinite(truncated)
+        result[positions[big]] = [int(v) for v in truncated[big]]
+        fast = small | big | (fast & ~np.isfinite(truncated))
+
+    _fallback(result, series, positions[~fast], lambda v: parse_number(v, is_float))
+    return result
+
+def parse_excel_date_column(values):
+    """Vectorized parse_excel_date() for workbook date cells"""
+    series = _as_series(values)
+    result = np.full(len(series), None, dtype=object)
+    notna = series.notna().to_numpy()
+    if not notna.any():
+        return result
+
+    positions = np.flatnonzero(notna)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        stamps = series[notna]
+        valid = (stamps.dt.year >= 1000).to_numpy()
+        result[positions[valid]] = pd.Series(
+            stamps[valid].dt.strftime('%Y-%m-%d'), dtype=object
+        ).to_numpy()
+        _fallback(result, series, positions[~valid], parse_excel_date)
+    else:
+        _fallback(result, series, positions, parse_excel_date)
+    return result
+
+def parse_price_column(values):
+    """Vectorized parse_price(): numbers as floats, strings without $ , or spaces"""
+    series = _as_series(values)
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        return parse_number_column(series, is_float=True)
+    if pd.api.types.is_integer_dtype(dtype):
+        # Mirrors the row loop, where int64 cells arrive as Python ints
+        return parse_number_column(series, is_float=True)
+    result = np.full(len(series), None, dtype=object)
+    _fallback(result, series, np.flatnonzero(series.notna().to_numpy()), parse_price)
+    return result
+
+def sale_year_column(values):
+    """Vectorized sale_year() over the raw 'Sale Date' column (missing -> None)"""
+    series = _as_series(values)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        result = np.full(len(series), None, dtype=object)
+        years = series.dt.year
+        in_range = (years >= 1900) & (years <= 2100)
+        result[in_range.to_numpy(dtype=bool, na_value=False)] = years[in_range].astype(int).tolist()
+        return result
+    return _unique_map(series, _sale_years)
+
+def str_column(values):
+    """str() of every cell, including 'nan' for missing values"""
+    series = _as_series(values)
+    return np.array(list(map(str, series.to_numpy(dtype=object))), dtype=object)
+
+_CONVERTERS = {
+    TEXT: clean_text_column,
+    DATE: parse_date_column,
+    INTEGER: lambda values: parse_number_column(values, is_float=False),
+    FLOAT: lambda values: parse_number_column(values, is_float=True),
+}
+
+
+# ---------------------------------------------------------------------------
+# Column batches and records
+# ---------------------------------------------------------------------------
+
+def source_column(df, name):
+    """df[name], or an all-missing column if the file does not have it
+    (row.get() returned None for missing columns)"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), dtype=object)
+
+def transform_columns(df, columns):
+    """Convert a DataFrame into {db_column: object array} using a column spec
+    of (db_column, csv_column, kind) tuples"""
+    return {
+        field: _CONVERTERS[kind](source_column(df, source))
+        for field, source, kind in columns
+    }
+
+def truthy(values):
+    """Python truthiness of transformed values (None, '', 0 and 0.0 are falsy)"""
+    values = np.asarray(values, dtype=object)
+    return np.not_equal(values, None) & np.not_equal(values, 0) & np.not_equal(values, '')
+
+def to_records(columns, keep=None, omit_none=()):
+    """Build the list of record dicts the Supabase client expects.
+
+    Fields named in omit_none are left out of a record when their value is
+    None instead of being sent as null.
+    """
+    keys = list(columns)
+    if not keys:
+        return []
+    arrays = [columns[key] if keep is None else columns[key][keep] for key in keys]
+    rows = zip(*(array.tolist() for array in arrays))
+    if not omit_none:
+        return [dict(zip(keys, row)) for row in rows]
+    return [
+        {key: value for key, value in zip(keys, row) if value is not None or key not in omit_none}
+        for row in rows
+    ]
+
+def iter_record_batches(df, transform, batch_size):
+    """Transform a whole chunk once and yield (offset, records) per batch.
+
+    Batches follow the same row boundaries as slicing the chunk with
+    df.iloc[i:i+batch_size] and calling the per-batch function, so the
+    records sent in each request are unchanged.
+    """
+    columns, keep, omit_none = _unpack(transform(df))
+    kept = np.flatnonzero(keep)
+    yield from iter_kept_batches({field: values[kept] for field, values in columns.items()},
+                                 kept, len(df), batch_size, omit_none)
+
+def iter_kept_batches(columns, positions, rows, batch_size, omit_none=(), build=to_records):
+    """(offset, records) per batch_size rows of a chunk of `rows` rows, from
+    columns that hold only the kept rows (columns[...][i] is the row at
+    positions[i] in the chunk); build(columns, keep, omit_none) makes each
+    batch (wire_format.column_batch keeps it columnar)"""
+    groups = np.asarray(positions) // batch_size
+    for offset in range(0, rows, batch_size):
+        group = offset // batch_size
+        lo, hi = np.searchsorted(groups, [group, group + 1])
+        yield offset, build(columns, slice(lo, hi), omit_none)
+
+def records_for(df, transform):
+    """All records for a DataFrame (the vectorized process_batch())"""
+    columns, keep, omit_none = _unpack(transform(df))
+    return to_records(columns, keep, omit_none)
+
+def columns_for(df, transform):
+    """Kept rows as {db_column: object array}, for columnar sinks like COPY"""
+    columns, keep, _ = _unpack(transform(df))
+    return {field: values[keep] for field, values in columns.items()}
+
+def _unpack(transformed):
+    """Transforms return (columns, keep) or (columns, keep, omit_none)"""
+    if len(transformed) == 2:
+        return transformed[0], transformed[1], ()
+    return transformed
+
+
+# ---------------------------------------------------------------------------
+# Per-importer transforms
+# ---------------------------------------------------------------------------
+
+def _has_sale_fields(columns, address_field):
+    """street address, sale date, sale price and a grantor or grantee"""
+    return (truthy(columns[address_field]) & truthy(columns['sale_date'])
+            & truthy(columns['sale_price'])
+            & (truthy(columns['grantor']) | truthy(columns['grantee'])))
+
+def transform_detailed(df):
+    """fast-import-sales.py layout (full updated-sales-schema.sql record)"""
+    columns = transform_columns(df, DETAILED_SALES_COLUMNS)
+    return columns, _has_sale_fields(columns, 'street_address')
+
+def transform_keyed(df):
+    """transform_detailed() limited to rows that have a Sales ID.
+
+    Used where rows are upserted on sales_id so a replayed chunk overwrites
+    instead of duplicating; rows without one could not be matched on replay.
+    """
+    columns, keep = transform_detailed(df)
+    return columns, keep & np.not_equal(columns['sales_id'], None)
+
+def transform_simplified(df):
+    """import-sales-simplified.py layout"""
+    columns = transform_columns(df, SIMPLIFIED_SALES_COLUMNS)
+    return columns, _has_sale_fields(columns, 'street_address')
+
+def transform_existing_schema(df, with_proxies=True):
+    """import-all-sales.py layout (seller_name/buyer_name schema).
+
+    With with_proxies the ECF neighborhood is stored in property_zip and the
+    sale year in year_built, and both are omitted when they have no value.
+    """
+    columns = transform_columns(df, EXISTING_SCHEMA_COLUMNS)
+    columns['seller_name'] = _fill_none(columns['seller_name'], 'UNKNOWN SELLER')
+    columns['buyer_name'] = _fill_none(columns['buyer_name'], 'UNKNOWN BUYER')
+
+    price = columns['sale_price']
+    above_minimum = truthy(price)
+    above_minimum[above_minimum] = price[above_minimum] > 100
+    keep = truthy(columns['property_address']) & truthy(columns['sale_date']) & above_minimum
+
+    if not with_proxies:
+        return columns, keep
+
+    neighborhood = clean_text_column(source_column(df, 'ECF Neighborhood'))
+    has_neighborhood = np.not_equal(neighborhood, None)
+    property_zip = np.full(len(neighborhood), None, dtype=object)
+    if has_neighborhood.any():
+        property_zip[has_neighborhood] = pd.Series(
+            neighborhood[has_neighborhood], dtype=object
+        ).str.slice(0, 10).to_numpy(dtype=object)
+    columns['property_zip'] = property_zip
+    columns['year_built'] = sale_year_column(source_column(df, 'Sale Date'))
+    return columns, keep, ('property_zip', 'year_built')
+
+def _fill_none(values, default):
+    """values with None replaced by default (the `or 'UNKNOWN'` idiom)"""
+    values = values.copy()
+    values[np.equal(values, None)] = default
+    return values
+
+# Optional workbook columns for import-sales-transactions.py, in the order
+# the row loop applied them (later columns overwrite earlier ones)
+RESI_OPTIONAL_COLUMNS = (
+    ('Property Type', 'property_type'),
+    ('Type', 'property_type'),
+    ('Year Built', 'year_built'),
+    ('Year', 'year_built'),
+    ('Square Feet', 'square_feet'),
+    ('Sq Ft', 'square_feet'),
+    ('Bedrooms', 'bedrooms'),
+    ('Beds', 'bedrooms'),
+    ('Bathrooms', 'bathrooms'),
+    ('Baths', 'bathrooms'),
+    ('ZIP', 'property_zip'),
+    ('Zip Code', 'property_zip'),
+    ('ECF Area', 'property_zip'),
+)
+
+def transform_resi_workbook(df):
+    """import-sales-transactions.py layout for '2025 Resi All Transactions.xlsx'"""
+    n = len(df)
+    required = ('Street Address', 'Sale Date', 'Sale Price')
+    if any(name not in df.columns for name in required):
+        # The row loop skipped every row when a required column was absent
+        return {}, np.zeros(n, dtype=bool)
+
+    columns = {
+        'property_address': clean_address_column(df['Street Address']),
+        'seller_name': np.full(n, 'PROPERTY TRANSFER', dtype=object),
+        'buyer_name': np.full(n, 'NEW OWNER', dtype=object),
+        'sale_date': parse_excel_date_column(df['Sale Date']),
+        'sale_price': parse_price_column(df['Sale Price']),
+    }
+    price = columns['sale_price']
+    keep = truthy(columns['property_address']) & truthy(columns['sale_date']) & truthy(price)
+    keep[keep] = price[keep] >= 100
+
+    if 'Parcel Number' in df.columns:
+        columns['parcel_id'] = str_column(df['Parcel Number'])
+    if 'Terms of Sale' in df.columns:
+        columns['sale_terms'] = str_column(df['Terms of Sale'])
+
+    for excel_col, db_col in RESI_OPTIONAL_COLUMNS:
+        if excel_col not in df.columns:
+            continue
+        values = df[excel_col]
+        if db_col in ('year_built', 'square_feet', 'bedrooms'):
+            converted = parse_number_column(values)
+        elif db_col == 'bathrooms':
+            # float(val) for present values; None means the key was not set,
+            # which keeps any value from an earlier bathrooms column
+            converted = parse_number_column(values, is_float=True)
+            if db_col in columns:
+                converted = np.where(np.equal(converted, None), columns[db_col], converted)
+        else:
+            converted = np.full(n, None, dtype=object)
+            notna = values.notna().to_numpy()
+            converted[notna] = str_column(values[notna])
+        columns[db_col] = converted
+
+    return columns, keep, ('bathrooms',)
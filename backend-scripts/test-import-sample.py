@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 import re
 
+from sales_snapshot import load_sales
+
 # Load environment variables
 load_dotenv()
 
@@ -64,7 +66,7 @@ def test_import():
     # Read only first 100 rows
     print("Reading first 100 rows...")
     try:
-        df = pd.read_csv(CSV_FILE, encoding='utf-8-sig', nrows=100)
+        df = load_sales(CSV_FILE, nrows=100)
         print(f"Loaded {len(df)} rows")
         print(f"Columns: {list(df.columns)}")
     except Exception as e:
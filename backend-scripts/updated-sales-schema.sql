@@ -2,7 +2,6 @@
 -- Drop existing table and recreate with new schema
 
 -- Drop dependent views first
-DROP VIEW IF EXISTS seller_statistics CASCADE;
 DROP VIEW IF EXISTS recent_sales CASCADE;
 
 -- Drop table if exists
@@ -100,39 +99,8 @@ CREATE POLICY "Allow public updates" ON sales_transactions
 
 -- Create updated views for common queries
 
--- View for seller statistics (using grantor as seller)
-CREATE OR REPLACE VIEW seller_statistics AS
-SELECT 
-    UPPER(grantor) as seller_name_normalized,
-    COUNT(*) as total_sales,
-    SUM(sale_price) as total_sales_value,
-    AVG(sale_price) as avg_sale_price,
-    MIN(sale_date) as first_sale_date,
-    MAX(sale_date) as last_sale_date,
-    COUNT(DISTINCT EXTRACT(YEAR FROM sale_date)) as years_active,
-    COUNT(DISTINCT ecf_neighborhood) as neighborhoods_sold_in
-FROM sales_transactions
-WHERE grantor IS NOT NULL 
-  AND grantor != ''
-  AND sale_price > 0
-GROUP BY UPPER(grantor);
-
--- View for buyer statistics (using grantee as buyer)
-CREATE OR REPLACE VIEW buyer_statistics AS
-SELECT 
-    UPPER(grantee) as buyer_name_normalized,
-    COUNT(*) as total_purchases,
-    SUM(sale_price) as total_purchase_value,
-    AVG(sale_price) as avg_purchase_price,
-    MIN(sale_date) as first_purchase_date,
-    MAX(sale_date) as last_purchase_date,
-    COUNT(DISTINCT EXTRACT(YEAR FROM sale_date)) as years_active,
-    COUNT(DISTINCT ecf_neighborhood) as neighborhoods_bought_in
-FROM sales_transactions
-WHERE grantee IS NOT NULL 
-  AND grantee != ''
-  AND sale_price > 0
-GROUP BY UPPER(grantee);
+-- seller_statistics, buyer_statistics and neighborhood_statistics are summary
+-- tables kept current by triggers on this table: run sales-statistics.sql next
 
 -- View for recent sales
 CREATE OR REPLACE VIEW recent_sales AS
@@ -151,24 +119,6 @@ WHERE sale_date >= CURRENT_DATE - INTERVAL '1 year'
   AND sale_price > 0
 ORDER BY sale_date DESC;
 
--- View for neighborhood statistics
-CREATE OR REPLACE VIEW neighborhood_statistics AS
-SELECT 
-    ecf_neighborhood,
-    COUNT(*) as total_sales,
-    AVG(sale_price) as avg_sale_price,
-    MIN(sale_price) as min_sale_price,
-    MAX(sale_price) as max_sale_price,
-    COUNT(DISTINCT DATE_TRUNC('month', sale_date)) as months_with_sales,
-    AVG(CASE WHEN sale_date >= CURRENT_DATE - INTERVAL '1 year' THEN sale_price END) as avg_price_last_year
-FROM sales_transactions
-WHERE sale_price > 0
-  AND ecf_neighborhood IS NOT NULL
-GROUP BY ecf_neighborhood;
-
 -- Grant permissions
 GRANT SELECT ON sales_transactions TO anon;
-GRANT SELECT ON seller_statistics TO anon;
-GRANT SELECT ON buyer_statistics TO anon;
 GRANT SELECT ON recent_sales TO anon;
-GRANT SELECT ON neighborhood_statistics TO anon;
\ No newline at end of file
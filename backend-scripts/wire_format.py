@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Compact request bodies for the import uploads
+
+Through the supabase client, every batch is built as a list of record
+dicts by the serializer, then encoded again by httpx's json.dumps() with
+every null spelled out, and sent uncompressed. JsonWriter is a send
+function for BatchUploader that posts the batch itself:
+
+  encoding     orjson (falls back to json when it is not installed) of rows
+               without their null keys. The ?columns= list still names every
+               column the client would have sent, so PostgREST writes NULL
+               for a missing key exactly as it did for an explicit null
+  batches      with ImportPipeline(columnar=True) the serializer hands out
+               ColumnBatch slices of the transformed columns instead of dict
+               lists; rows become dicts only inside the encoder, or when a
+               failed batch is split or written to the dead-letter file
+  compression  gzip (level 1 by default) for bodies of 1 KB or more. With
+               --compress auto the first compressed request finds out
+               whether the server takes gzip bodies: a 415, or a 400 because
+               the body was not JSON, turns it off and the batch is sent
+               again uncompressed
+
+JSON bytes and the bytes actually sent are counted per batch in the
+ImportMetrics ('json_bytes', and 'payload_bytes' from instrument_client()),
+and encoding and compression are part of its 'encode' stage.
+
+Usage (run from backend-scripts/):
+
+    writer = JsonWriter(supabase.postgrest.session, 'sales_transactions', on_conflict='sales_id')
+    uploader = BatchUploader(writer)
+    pipeline = ImportPipeline(transform_keyed, columnar=True)
+
+    writer = writer_from_args(args, supabase, 'sales_transactions', 'sales_id', metrics)
+"""
+
+import collections.abc
+import gzip
+import json
+
+from postgrest.exceptions import APIError
+
+from import_metrics import ImportMetrics
+from sales_transform import to_records
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPRESSION = ('auto', 'gzip', 'none')
+
+ENCODERS = ('fast', 'client')
+
+# Smaller bodies are sent as they are; gzip would save a few hundred bytes
+MIN_COMPRESS_BYTES = 1024
+
+
+def dumps(value):
+    """JSON bytes, compact, non-ASCII kept as UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+
+
+class ColumnBatch(collections.abc.Sequence):
+    """One batch of kept rows as {db column: array}, read as a sequence of
+    the record dicts to_records() would build"""
+
+    __slots__ = ('columns', 'omit_none')
+
+    def __init__(self, columns, omit_none=()):
+        self.columns = columns
+        self.omit_none = tuple(omit_none)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnBatch({field: values[index] for field, values in self.columns.items()},
+                               self.omit_none)
+        position = range(len(self))[index]
+        return to_records(self.columns, slice(position, position + 1), self.omit_none)[0]
+
+    def __iter__(self):
+        return iter(to_records(self.columns, None, self.omit_none))
+
+    @property
+    def fields(self):
+        """The ?columns= list: every column, except omit_none columns no row has"""
+        return [field for field, values in self.columns.items()
+                if field not in self.omit_none or any(value is not None for value in values)]
+
+    def to_json(self):
+        """The rows as a JSON array, null keys left out"""
+        keys = list(self.columns)
+        rows = zip(*(self.columns[key].tolist() for key in keys))
+        return dumps([{key: value for key, value in zip(keys, row) if value is not None}
+                      for row in rows])
+
+def column_batch(columns, keep=None, omit_none=()):
+    """ColumnBatch of the kept rows; takes to_records()' arguments"""
+    return ColumnBatch(columns if keep is None else
+                       {field: values[keep] for field, values in columns.items()}, omit_none)
+
+def encode_batch(records):
+    """(JSON bytes, ?columns= list) for a ColumnBatch or a list of record dicts"""
+    if isinstance(records, ColumnBatch):
+        return records.to_json(), records.fields
+    fields = list(dict.fromkeys(key for record in records for key in record))
+    return dumps([{key: value for key, value in record.items() if value is not None}
+                  for record in records]), fields
+
+
+class WriteError(APIError):
+    """A write PostgREST refused: the error body, plus the response for
+    status_of() and retry_after_of() in batch_uploader.py"""
+
+    def __init__(self, response):
+        try:
+            error = response.json()
+        except ValueError:
+            error = None
+        if not isinstance(error, dict):
+            error = {'message': response.text or response.reason_phrase}
+        error = {name: error.get(name) for name in ('message', 'code', 'hint', 'details')}
+        if error['message'] is None:
+            error['message'] = f"HTTP {response.status_code} {response.reason_phrase}"
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(error)
+
+    def __str__(self):
+        return f"{self.status_code}: {self.message}"
+
+
+def refused_gzip(response):
+    """True when a failed request looks like the server could not read a
+    gzip body: 415, or PostgREST's invalid-JSON error"""
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    try:
+        return response.json().get('code') == 'PGRST102'
+    except (ValueError, AttributeError):
+        return False
+
+
+class JsonWriter:
+    """send(records) that POSTs a batch to a PostgREST table (see the
+    module docstring); an upsert when on_conflict names the key column"""
+
+    def __init__(self, session, table, on_conflict=None, compress='auto', level=1, metrics=None):
+        if compress not in COMPRESSION:
+            raise ValueError(f"compress must be one of {COMPRESSION}, not {compress!r}")
+        self.session = session
+        self.table = table
+        self.on_conflict = on_conflict
+        self.gzip = compress != 'none'
+        self.negotiating = compress == 'auto'
+        self.level = level
+        self.metrics = metrics if metrics is not None else ImportMetrics()
+        prefer = ['return=minimal']
+        if on_conflict:
+            prefer.append('resolution=merge-duplicates')
+        self.headers = {'Content-Type': 'application/json', 'Prefer': ','.join(prefer)}
+
+    def __call__(self, records):
+        body, fields = encode_batch(records)
+        self.metrics.count('json_bytes', len(body))
+        self.metrics.observe_size('json_bytes', len(body))
+        params = {'columns': ','.join(f'"{field}"' for field in fields)}
+        if self.on_conflict:
+            params['on_conflict'] = self.on_conflict
+
+        compressed = self.gzip and len(body) >= MIN_COMPRESS_BYTES
+        response = self._post(body, params, compressed)
+        if compressed and self.negotiating:
+            if refused_gzip(response):
+                if self.gzip:
+                    print("  Server did not accept a gzip request body; sending uncompressed")
+                self.gzip = False
+                response = self._post(body, params, False)
+            elif response.is_success:
+                self.negotiating = False
+        if not response.is_success:
+            raise WriteError(response)
+        return response
+
+    def _post(self, body, params, compressed):
+        headers = self.headers
+        if compressed:
+            body = gzip.compress(body, self.level, mtime=0)
+            headers = {**headers, 'Content-Encoding': 'gzip'}
+        return self.session.post(self.table, content=body, params=params, headers=headers)
+
+
+def add_wire_arguments(parser):
+    """Add the shared --encoder/--compress options to an importer's CLI"""
+    parser.add_argument('--encoder', choices=ENCODERS, default='fast',
+                        help='request bodies from columnar batches, null keys left out (fast), '
+                             'or built by the supabase client (default: fast)')
+    parser.add_argument('--compress', choices=COMPRESSION, default='auto',
+                        help='gzip request bodies; auto stops if the server refuses them (default: auto)')
+    parser.add_argument('--compress-level', type=int, default=1, choices=range(1, 10), metavar='1-9',
+                        help='gzip level (default: 1)')
+    return parser
+
+def writer_from_args(args, supabase, table, on_conflict=None, metrics=None):
+    """JsonWriter from add_wire_arguments() options, or None for --encoder client"""
+    if args.encoder == 'client':
+        return None
+    return JsonWriter(supabase.postgrest.session, table, on_conflict, args.compress,
+                      args.compress_level, metrics)
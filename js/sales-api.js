@@ -269,6 +269,38 @@ class SalesAPIService {
         }
     }
 
+    // Get the monthly repeat-sales price index for an ECF neighborhood
+    // (backend-scripts/price_index.py); 'CITYWIDE' for the whole city
+    async getPriceIndex(neighborhood = 'CITYWIDE') {
+        if (!this.isReady()) return [];
+
+        const cacheKey = `index:${neighborhood}`;
+
+        // Check cache
+        const cached = this.getFromCache(cacheKey);
+        if (cached) return cached;
+
+        try {
+            const { data, error } = await this.client
+                .from('neighborhood_price_index')
+                .select('period, index_value, pairs')
+                .eq('ecf_neighborhood', neighborhood)
+                .order('period', { ascending: true });
+
+            if (error) {
+                console.error('Error fetching price index:', error);
+                return [];
+            }
+
+            const results = data || [];
+            this.storeInCache(cacheKey, results);
+            return results;
+        } catch (error) {
+            console.error('Error in getPriceIndex:', error);
+            return [];
+        }
+    }
+
     // Get recent sales in an area
     async getRecentSales(limit = 50) {
         if (!this.isReady()) return [];